@@ -0,0 +1,168 @@
+#! /usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Equivalence check and benchmark for the propagation of inherited access rules.
+For each given node (default: the children of the collections node) and rule type,
+the inherited rules of the subtree are removed and propagated again from the node,
+once with the former row-by-row implementation and once with the set-based one.
+Both must produce the same rules, and integrity_check_inherited_access_rules
+must not report more problems for the subtree than before.
+Everything runs in a transaction that is rolled back, the database is not changed.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.normpath(os.path.join(__file__, "..", "..")))
+
+import configargparse
+from sqlalchemy import text as sqltext
+
+from core.init import basic_init
+basic_init()
+
+import core as _core
+from core.database.postgres import DB_SCHEMA_NAME
+from core.nodecache import get_collections_node
+
+RULETYPES = ("read", "write", "data")
+
+# former implementation, updates the descendants one by one
+ROWWISE_UPDATE_CHILDREN_INHERITED_RULES = """
+CREATE OR REPLACE FUNCTION pg_temp.update_children_inherited_rules_rowwise(node_id integer, ruletype_ text)
+    RETURNS void
+    LANGUAGE plpgsql
+    SET search_path TO {schema}
+    VOLATILE
+AS $f$
+DECLARE
+    childrel record;
+BEGIN
+    IF ruletype_ IN ('read', 'data') THEN
+        IF NOT EXISTS (SELECT FROM node_to_access_rule WHERE node_to_access_rule.nid=node_id AND node_to_access_rule.ruletype=ruletype_) THEN
+            INSERT INTO node_to_access_rule SELECT * FROM _inherited_access_rules_read_type(node_id, ruletype_);
+        END IF;
+        FOR childrel IN SELECT cid, max(distance) AS distance FROM noderelation WHERE noderelation.nid=node_id GROUP BY cid ORDER BY max(distance) LOOP
+            IF NOT EXISTS (SELECT FROM node_to_access_rule WHERE node_to_access_rule.nid=childrel.cid AND node_to_access_rule.ruletype=ruletype_ AND NOT node_to_access_rule.inherited) THEN
+                DELETE FROM node_to_access_rule WHERE node_to_access_rule.nid=childrel.cid AND node_to_access_rule.ruletype=ruletype_ AND node_to_access_rule.inherited;
+                INSERT INTO node_to_access_rule SELECT * from _inherited_access_rules_read_type(childrel.cid, ruletype_);
+            END IF;
+        END LOOP;
+    ELSE
+        INSERT INTO node_to_access_rule (SELECT * from inherited_access_rules_write(node_id) EXCEPT SELECT nid, rule_id, ruletype, invert, true, blocking FROM node_to_access_rule WHERE nid=node_id);
+        FOR childrel IN SELECT cid, max(distance) AS distance FROM noderelation WHERE noderelation.nid=node_id GROUP BY cid ORDER BY max(distance) LOOP
+            DELETE FROM node_to_access_rule WHERE node_to_access_rule.nid=childrel.cid AND node_to_access_rule.ruletype=ruletype_ AND node_to_access_rule.inherited;
+            INSERT INTO node_to_access_rule
+                SELECT * from inherited_access_rules_write(childrel.cid) AS rules
+                WHERE NOT EXISTS (
+                    SELECT FROM node_to_access_rule WHERE
+                            node_to_access_rule.nid=rules.nid
+                        AND node_to_access_rule.rule_id=rules.rule_id
+                        AND node_to_access_rule.invert=rules.invert
+                        AND node_to_access_rule.ruletype=ruletype_
+                   );
+        END LOOP;
+    END IF;
+END;
+$f$;
+""".format(schema=DB_SCHEMA_NAME)
+
+IMPLEMENTATIONS = (
+    ("rowwise", "SELECT pg_temp.update_children_inherited_rules_rowwise(:nid, :ruletype)"),
+    ("set-based", "SELECT {}._update_children_inherited_rules(:nid, :ruletype)".format(DB_SCHEMA_NAME)),
+)
+
+
+def _descendant_ids(conn, nid):
+    return [cid for cid, in conn.execute(sqltext(
+            "SELECT DISTINCT cid FROM {}.noderelation WHERE nid = :nid".format(DB_SCHEMA_NAME)), nid=nid)]
+
+
+def _fingerprint(conn, ids, ruletype):
+    return tuple(conn.execute(sqltext(
+            "SELECT count(*), md5(string_agg(nid || ',' || rule_id || ',' || invert || ',' || inherited || ',' || blocking, ';' "
+            "                                ORDER BY nid, rule_id, invert, inherited, blocking)) "
+            "FROM {}.node_to_access_rule WHERE nid = ANY(:ids) AND ruletype = :ruletype".format(DB_SCHEMA_NAME)),
+            ids=ids, ruletype=ruletype).fetchone())
+
+
+def _integrity_problems(conn, ids):
+    return conn.execute(sqltext(
+            "SELECT count(*) FROM {}.integrity_check_inherited_access_rules() WHERE nid = ANY(:ids)".format(DB_SCHEMA_NAME)),
+            ids=ids).scalar()
+
+
+def _check_node(conn, nid, ruletypes):
+    ids = [nid] + _descendant_ids(conn, nid)
+    problems_before = _integrity_problems(conn, ids)
+    ok = True
+
+    for ruletype in ruletypes:
+        stored = _fingerprint(conn, ids, ruletype)
+        fingerprints = set()
+        for name, statement in IMPLEMENTATIONS:
+            savepoint = conn.begin_nested()
+            conn.execute(sqltext(
+                    "DELETE FROM {}.node_to_access_rule WHERE nid = ANY(:ids) AND ruletype = :ruletype AND inherited".format(
+                        DB_SCHEMA_NAME)),
+                    ids=ids[1:], ruletype=ruletype)
+            start = time.time()
+            conn.execute(sqltext(statement), nid=nid, ruletype=ruletype)
+            duration = time.time() - start
+            fingerprint = _fingerprint(conn, ids, ruletype)
+            fingerprints.add(fingerprint)
+            savepoint.rollback()
+            print("node {:>9} nodes {:>8} {:<5} {:<10} {:>10.3f} s rules {:>9}{}".format(
+                nid, len(ids), ruletype, name, duration, fingerprint[0],
+                "" if fingerprint == stored else " (differs from stored rules)"))
+        if len(fingerprints) != 1:
+            print("ERROR: implementations differ for node {} ruletype {}".format(nid, ruletype))
+            ok = False
+
+    # propagate all rule types set-based and compare with the integrity check
+    savepoint = conn.begin_nested()
+    for ruletype in ruletypes:
+        conn.execute(sqltext(IMPLEMENTATIONS[1][1]), nid=nid, ruletype=ruletype)
+    problems_after = _integrity_problems(conn, ids)
+    savepoint.rollback()
+    print("node {:>9} integrity check problems before {} after {}".format(nid, problems_before, problems_after))
+    if problems_after > problems_before:
+        print("ERROR: set-based propagation introduced integrity problems for node {}".format(nid))
+        ok = False
+
+    return ok
+
+
+def main():
+    parser = configargparse.ArgumentParser("mediaTUM acl_propagation_check.py")
+    parser.add_argument("nids", metavar="nid", type=int, nargs="*", help="root nodes of the checked subtrees, default: all collections")
+    parser.add_argument("--ruletypes", "-t", default=",".join(RULETYPES), help="comma separated rule types")
+    args = parser.parse_args()
+
+    nids = args.nids or [n.id for n in get_collections_node().container_children]
+    ruletypes = args.ruletypes.split(",")
+
+    ok = True
+    conn = _core.db.engine.connect()
+    trans = conn.begin()
+    try:
+        conn.execute(ROWWISE_UPDATE_CHILDREN_INHERITED_RULES)
+        for nid in nids:
+            ok = _check_node(conn, nid, ruletypes) and ok
+    finally:
+        trans.rollback()
+        conn.close()
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
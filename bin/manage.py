@@ -21,6 +21,7 @@ from collections import OrderedDict
 import logging
 import os
 import sys
+import time
 
 sys.path.append(os.path.normpath(os.path.join(__file__, "..", "..")))
 
@@ -41,6 +42,9 @@ logg = logging.getLogger("manage.py")
 import core as _core
 from core.database.init import init_database_values
 from core.database.postgres.node import Node
+import core.database.postgres.search as _postgres_search
+import core.database.postgres.sortindex as _postgres_sortindex
+import utils.derivatives
 import utils.search
 import utils.iplist
 from utils.postgres import truncate_tables, run_single_sql, vacuum_tables, vacuum_full_tables, vacuum_analyze_tables
@@ -56,6 +60,10 @@ def import_dump(s, dump_filepath):
     enable_triggers()
     _core.db.session.commit()
     logg.info("imported dump from %s", dump_filepath)
+    # triggers were disabled during import, so all trigger-maintained tables must be rebuilt
+    childcount_rebuild()
+    accessindex_rebuild()
+    tsvectors_rebuild()
 
 
 def _drop_index_for_attribute(name_or_all, index_type):
@@ -191,7 +199,13 @@ def fulltext(args):
 
     remove_versioning()
 
-    if nid_mod_or_all == "all":
+    if nid_mod_or_all == "all" and args.processes:
+        import_count, failed = utils.search.import_fulltexts_parallel(
+            args.overwrite, args.processes, args.batchsize, args.state_file)
+        logg.info("loaded fulltexts for %s nodes", import_count)
+        for first_id, last_id in failed:
+            logg.warning("import failed for node ids %s to %s, run again to retry", first_id, last_id)
+    elif nid_mod_or_all == "all":
         import_count = utils.search.import_fulltexts(args.overwrite)
         logg.info("loaded fulltexts for %s nodes", import_count)
     elif nid_mod_or_all.startswith("mod"):
@@ -212,6 +226,22 @@ def fulltext(args):
             logg.info("nothing imported for node # %s", nid)
 
 
+def derivatives(args):
+    # we must initialize all node types to process them
+    init.full_init()
+
+    remove_versioning()
+
+    nodetypes = utils.derivatives.DERIVATIVE_NODETYPES if args.type == "all" else (args.type,)
+    node_ids = utils.derivatives.select_node_ids(nodetypes, args.schema, args.subtree)
+    logg.info("generating derivatives for %s nodes", len(node_ids))
+    start_time = time.time()
+    stats = utils.derivatives.generate_derivatives(node_ids, args.processes, args.batchsize, args.force)
+    elapsed = time.time() - start_time
+    logg.info("finished in %.1fs: %s generated, %s skipped, %s failed, %.1f nodes/s", elapsed,
+              stats["generated"], stats["skipped"], stats["failed"], len(node_ids) / elapsed if elapsed else 0)
+
+
 def vacuum(args):
     action = args.action.lower() if args.action else None
 
@@ -223,6 +253,80 @@ def vacuum(args):
         vacuum_full_tables(_core.db.session, db_metadata=db_metadata)
 
 
+def childcount_rebuild():
+    rows = exec_sqlfunc(_core.db.session, mediatumfunc.rebuild_container_childcount())
+    _core.db.session.commit()
+    logg.info("rebuilt child counts for %s containers", rows)
+
+
+def childcount(args):
+    if args.action == "rebuild":
+        childcount_rebuild()
+
+
+def searchindex(args):
+    if args.action == "sync":
+        created, dropped = _postgres_search.sync_attribute_search_indexes(drop_unneeded=not args.keep)
+        logg.info("created %s attribute search indexes, dropped %s", len(created), len(dropped))
+    elif args.action == "status":
+        missing, unneeded = _postgres_search.get_attribute_search_index_changes()
+        for lang, attrname in sorted(missing.itervalues()):
+            print("missing   {:<12} {}".format(lang, attrname))
+        for indexname in sorted(unneeded):
+            print("unneeded  {}".format(indexname))
+        for stat in _postgres_search.get_attribute_search_index_stats():
+            pending = "-" if stat["pending_pages"] is None else stat["pending_pages"]
+            print("{:<12} {:<32} scans {:>10} tuples read {:>12} size {:>12} pending pages {:>6}".format(
+                stat["language"], stat["attribute"], stat["scans"], stat["tuples_read"], stat["size"], pending))
+
+
+def sortindex(args):
+    if args.action == "sync":
+        created, dropped = _postgres_sortindex.sync_sort_indexes(drop_unneeded=not args.keep)
+        logg.info("created %s sort indexes, dropped %s", len(created), len(dropped))
+    elif args.action == "status":
+        missing, unneeded = _postgres_sortindex.get_sort_index_changes()
+        for spec, nids in sorted(missing.itervalues()):
+            print("missing   {:<48} used by {} containers".format(
+                ", ".join(u"{} {}".format(name, order) for name, order in spec), len(nids)))
+        for indexname in sorted(unneeded):
+            print("unneeded  {}".format(indexname))
+        for indexname, scans, size in _postgres_sortindex.get_sort_index_stats():
+            print("{:<64} scans {:>10} size {:>12}".format(indexname, scans, size))
+
+
+def tsvectors_rebuild():
+    # store the configured search.stored_tsvectors mode first, the rebuild uses it
+    _core.db.init_fulltext_search()
+    rows = exec_sqlfunc(_core.db.session, mediatumfunc.rebuild_node_tsvectors())
+    _core.db.session.commit()
+    logg.info("stored %s tsvectors", rows)
+
+
+def tsvectors(args):
+    if args.action == "rebuild":
+        tsvectors_rebuild()
+
+
+def accessindex_rebuild():
+    rows = exec_sqlfunc(_core.db.session, mediatumfunc.rebuild_access_signatures())
+    _core.db.session.commit()
+    logg.info("rebuilt access signatures for %s node rule sets", rows)
+
+
+def accessindex(args):
+    if args.action == "rebuild":
+        accessindex_rebuild()
+    elif args.action == "check":
+        stmt = sqlalchemy.select([sqlalchemy.column("nid")]).select_from(
+            mediatumfunc.integrity_check_access_signatures().alias())
+        rows = _core.db.session.execute(stmt).fetchall()
+        if rows:
+            logg.warning("access index is out of date for %s nodes, run 'accessindex rebuild'", len(rows))
+        else:
+            logg.info("access index is up to date")
+
+
 def result_proxy_to_yaml(resultproxy):
     rows = resultproxy.fetchall()
     as_list = [OrderedDict(sorted(r.items(), key=lambda e:e[0])) for r in rows]
@@ -284,9 +388,54 @@ def main():
 
     fulltext_subparser = subparsers.add_parser("fulltext", help="import fulltext files into the database")
     fulltext_subparser.add_argument("--overwrite", "-o", action="store_true", help="overwrite existing fulltexts")
+    fulltext_subparser.add_argument("--processes", "-p", type=int,
+                                    help="import 'all' in parallel with this number of worker processes")
+    fulltext_subparser.add_argument("--batchsize", "-b", type=int, default=500,
+                                    help="nodes per transaction in parallel mode, default: 500")
+    fulltext_subparser.add_argument("--state-file", "-s",
+                                    help="record finished batches in this file in parallel mode and skip them when run again")
     fulltext_subparser.add_argument("nid_mod_or_all", help="node ID, 'all' or 'mod n i' to partition the list of node IDs")
     fulltext_subparser.set_defaults(func=fulltext)
 
+    childcount_subparser = subparsers.add_parser("childcount", help="container content count management")
+    childcount_subparser.add_argument("action", choices=["rebuild"],
+                                      help="recompute the cached content counts of all containers")
+    childcount_subparser.set_defaults(func=childcount)
+
+    accessindex_subparser = subparsers.add_parser("accessindex", help="access signature index management")
+    accessindex_subparser.add_argument("action", choices=["rebuild", "check"],
+                                       help="recompute the access signatures of all nodes | list outdated nodes")
+    accessindex_subparser.set_defaults(func=accessindex)
+
+    searchindex_subparser = subparsers.add_parser("searchindex", help="search indexes for metafields used in search masks")
+    searchindex_subparser.add_argument("action", choices=["status", "sync"],
+                                       help="show missing indexes and index usage | create missing and drop unneeded indexes")
+    searchindex_subparser.add_argument("--keep", "-k", action="store_true", help="don't drop unneeded indexes on sync")
+    searchindex_subparser.set_defaults(func=searchindex)
+
+    sortindex_subparser = subparsers.add_parser("sortindex", help="indexes for the sortfields of containers and metadatatypes")
+    sortindex_subparser.add_argument("action", choices=["status", "sync"],
+                                     help="show missing indexes and index usage | create missing and drop unneeded indexes")
+    sortindex_subparser.add_argument("--keep", "-k", action="store_true", help="don't drop unneeded indexes on sync")
+    sortindex_subparser.set_defaults(func=sortindex)
+
+    tsvectors_subparser = subparsers.add_parser("tsvectors", help="stored search tsvector management")
+    tsvectors_subparser.add_argument("action", choices=["rebuild"],
+                                     help="recompute the stored tsvectors of all nodes (see search.stored_tsvectors)")
+    tsvectors_subparser.set_defaults(func=tsvectors)
+
+    derivatives_subparser = subparsers.add_parser(
+        "derivatives",
+        help="(re)generate thumbnails, image formats and fulltexts in parallel")
+    derivatives_subparser.add_argument("--type", "-t", choices=["image", "document", "all"], default="all",
+                                       help="node type to process (image / document / all)")
+    derivatives_subparser.add_argument("--schema", "-s", help="only process nodes with this schema")
+    derivatives_subparser.add_argument("--subtree", type=int, help="only process nodes below this node ID")
+    derivatives_subparser.add_argument("--processes", "-p", type=int, help="number of worker processes, default: number of CPUs")
+    derivatives_subparser.add_argument("--batchsize", "-b", type=int, default=100, help="commit after this many nodes")
+    derivatives_subparser.add_argument("--force", "-f", action="store_true", help="regenerate files that are up to date")
+    derivatives_subparser.set_defaults(func=derivatives)
+
     sql_subparser = subparsers.add_parser(
         "sql",
         help="run a single SQL statement (use quotes if needed, for example if your query contains *)")
@@ -0,0 +1,53 @@
+#! /usr/bin/env python2
+
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+mediaTUM background worker, processes the jobs of core.jobqueue.
+Start several workers to process jobs in parallel;
+the concurrency limits of the job types hold across all of them.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import logging as _logging
+import os as _os
+import sys as _sys
+
+_sys.path.append(_os.path.abspath(_os.path.join(__file__, "..", "..")))
+
+import configargparse
+
+import core as _core
+import core.init as _
+
+_logg = _logging.getLogger("mediatum-worker.py")
+
+
+def main():
+    parser = configargparse.ArgumentParser("mediaTUM mediatum-worker.py")
+    parser.add_argument("-l", "--loglevel", help="root loglevel, sensible values: DEBUG, INFO, WARN")
+    parser.add_argument("--once", action="store_true", default=False,
+                        help="exit as soon as no job is ready to run")
+    parser.add_argument("--status", action="store_true", default=False,
+                        help="print the number of jobs per type and state and exit")
+    args = parser.parse_args()
+
+    _core.init.full_init(root_loglevel=args.loglevel)
+    import core.jobqueue as _core_jobqueue
+
+    if args.status:
+        for (job_type, state), count in sorted(_core_jobqueue.get_queue_summary().iteritems()):
+            print("{:<24} {:<8} {:>8}".format(job_type, state, count))
+        return
+
+    try:
+        _core_jobqueue.process_jobs(once=args.once)
+    except KeyboardInterrupt:
+        _logg.info("interrupted, stopping worker")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#! /usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Benchmark for recalculate_relation_subtree.
+Generates complete trees of directories with the given depths and fan-outs,
+attaches each one below a chain of directories and recalculates the connections of the subtree
+with the former row-by-row implementation and with the current set-based one.
+Both must produce the same connections.
+Everything runs in a transaction that is rolled back, the database is not changed.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.normpath(os.path.join(__file__, "..", "..")))
+
+import configargparse
+from sqlalchemy import text as sqltext
+
+from core.init import basic_init
+basic_init()
+
+import core as _core
+from core.database.postgres import DB_SCHEMA_NAME
+
+# former implementation, loops over all connections of the subtree
+ROWWISE_RECALCULATE_RELATION_SUBTREE = """
+CREATE OR REPLACE FUNCTION pg_temp.recalculate_relation_subtree_rowwise(root_id integer) RETURNS void
+    LANGUAGE plpgsql
+    SET search_path = {schema}
+    AS $f$
+DECLARE
+    rel RECORD;
+BEGIN
+FOR rel IN SELECT cid, distance FROM noderelation WHERE nid = root_id LOOP
+    DELETE FROM noderelation nr
+    WHERE nr.cid = rel.cid
+    AND nr.distance > rel.distance;
+
+    INSERT INTO noderelation
+    SELECT DISTINCT * FROM transitive_closure_for_node(rel.cid)
+    WHERE distance > rel.distance;
+END LOOP;
+
+FOR rel IN SELECT cid, max(distance) AS distance FROM noderelation WHERE nid = root_id GROUP BY cid ORDER BY max(distance) LOOP
+    PERFORM update_inherited_access_rules_for_node(rel.cid);
+END LOOP;
+END;
+$f$;
+""".format(schema=DB_SCHEMA_NAME)
+
+IMPLEMENTATIONS = (
+    ("rowwise", "SELECT pg_temp.recalculate_relation_subtree_rowwise(:root_id)"),
+    ("set-based", "SELECT {}.recalculate_relation_subtree(:root_id)".format(DB_SCHEMA_NAME)),
+)
+
+
+def _create_tree(conn, depth, fanout):
+    """
+    Creates a complete tree of directories with direct and transitive connections.
+    Returns the node ids in level order, the first one is the root.
+    """
+    count = sum(fanout ** level for level in range(depth + 1))
+    ids = [nid for nid, in conn.execute(sqltext(
+            "INSERT INTO {}.node (type, schema, name) "
+            "SELECT 'directory', 'directory', 'noderelation benchmark ' || g FROM generate_series(1, :count) g "
+            "RETURNING id".format(DB_SCHEMA_NAME)), count=count)]
+    ids.sort()
+    nids = [ids[(i - 1) // fanout] for i in range(1, count)]
+    conn.execute(sqltext(
+            "INSERT INTO {}.noderelation (nid, cid, distance) "
+            "SELECT unnest(CAST(:nids AS integer[])), unnest(CAST(:cids AS integer[])), 1".format(DB_SCHEMA_NAME)),
+            nids=nids, cids=ids[1:])
+    conn.execute(sqltext("SELECT {}.recalculate_relations(:ids)".format(DB_SCHEMA_NAME)), ids=ids[1:])
+    return ids
+
+
+def _fingerprint(conn, ids):
+    return conn.execute(sqltext(
+            "SELECT count(*), md5(string_agg(nid || ',' || cid || ',' || distance, ';' ORDER BY nid, cid, distance)) "
+            "FROM {}.noderelation WHERE cid = ANY(:ids)".format(DB_SCHEMA_NAME)), ids=ids).fetchone()
+
+
+def _bench_tree(conn, depth, fanout, anchor_depth, repeat):
+    anchor_ids = _create_tree(conn, anchor_depth, 1)
+    ids = _create_tree(conn, depth, fanout)
+    # connect the root like on_mapping_insert does before recalculating the subtree
+    conn.execute(sqltext(
+            "INSERT INTO {schema}.noderelation SELECT * FROM {schema}.extend_relation_to_parents(:nid, :cid)".format(
+                schema=DB_SCHEMA_NAME)),
+            nid=anchor_ids[-1], cid=ids[0])
+
+    fingerprints = set()
+    for name, statement in IMPLEMENTATIONS:
+        best = None
+        for _ in range(repeat):
+            savepoint = conn.begin_nested()
+            start = time.time()
+            conn.execute(sqltext(statement), root_id=ids[0])
+            duration = time.time() - start
+            fingerprint = _fingerprint(conn, ids)
+            savepoint.rollback()
+            best = duration if best is None else min(best, duration)
+        fingerprints.add(tuple(fingerprint))
+        print("depth {:>2} fanout {:>3} nodes {:>8} connections {:>9} {:<10} {:>10.3f} s".format(
+            depth, fanout, len(ids), fingerprint[0], name, best))
+
+    if len(fingerprints) != 1:
+        print("ERROR: implementations differ for depth {} fanout {}".format(depth, fanout))
+        return False
+    return True
+
+
+def main():
+    parser = configargparse.ArgumentParser("mediaTUM noderelation_benchmark.py")
+    parser.add_argument("--depths", "-d", default="2,4,6", help="comma separated tree depths")
+    parser.add_argument("--fanouts", "-f", default="2,5,10", help="comma separated numbers of children per node")
+    parser.add_argument("--max-nodes", "-m", type=int, default=200000, help="skip trees with more nodes")
+    parser.add_argument("--anchor-depth", "-a", type=int, default=3, help="depth of the directory chain the trees are attached to")
+    parser.add_argument("--repeat", "-r", type=int, default=3, help="number of runs, the best one is reported")
+    args = parser.parse_args()
+
+    ok = True
+    conn = _core.db.engine.connect()
+    trans = conn.begin()
+    try:
+        conn.execute(ROWWISE_RECALCULATE_RELATION_SUBTREE)
+        for depth in map(int, args.depths.split(",")):
+            for fanout in map(int, args.fanouts.split(",")):
+                if sum(fanout ** level for level in range(depth + 1)) > args.max_nodes:
+                    print("depth {:>2} fanout {:>3} skipped, more than {} nodes".format(depth, fanout, args.max_nodes))
+                    continue
+                ok = _bench_tree(conn, depth, fanout, args.anchor_depth, args.repeat) and ok
+    finally:
+        trans.rollback()
+        conn.close()
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#! /usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Micro-benchmark for the search query parsers in core.search.
+Parses a corpus of queries with both parsers, without and with the parse caches.
+The corpus can be given as file with one query per line, e.g. taken from the search log;
+queries that cannot be parsed by a parser are skipped for that parser.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.normpath(os.path.join(__file__, "..", "..")))
+
+import configargparse
+
+import core.search as _core_search
+from core.search.language import parser as _new_parser
+from core.search.oldparser import FtsSearchParser
+from core.search.oldtonewtree import old_searchtree_to_new
+
+# queries in the style of the simple and extended search forms and the export webservice
+DEFAULT_QUERIES = [
+    u'full = "quantum computing"',
+    u'full = graphene',
+    u'full = "Müller"',
+    u'fulltext = "machine learning" and objtype = document',
+    u'schema = diss and full = "fluid dynamics"',
+    u'(author = "Schmidt" or author-contrib = "Schmidt") and year >= 2010-00-00T00:00:00',
+    u'(title = "carbon nanotubes" or subject = "carbon nanotubes") and (year >= 2000-00-00T00:00:00 and year <= 2010-00-00T00:00:00)',
+    u'(title = "Bildverarbeitung") and (author = "Huber") and (year >= 2015-01-01T00:00:00)',
+    u'(keywords = "Finite Elemente" or keywords-en = "finite elements") and schema = lecture',
+    u'(faculty = "Informatik") and (type = "Dissertation") and (year <= 1999-12-31T00:00:00)',
+    u'objtype = image and (title = Garching or description = Garching)',
+    u'not schema = lecture and full = robotics',
+    u'(a = b or c = d) and (e = f or (g = h and i = "j k l"))',
+    u'year eq 2019',
+    u'title = "Entwicklung eines Verfahrens zur Bestimmung der Wärmeleitfähigkeit von Dämmstoffen"',
+    u'author="Müller" and year>=2000',
+    u'title="neural networks" or keywords=deep',
+    u'(schema=diss or schema=habil) and faculty="Maschinenwesen"',
+    u'updatetime>=2018-01-01',
+    u'graphene oxide',
+]
+
+
+def _parse_new(query):
+    return _new_parser.parse_string(query)
+
+
+def _parse_old_style(query):
+    return old_searchtree_to_new(FtsSearchParser().parse(query))
+
+
+def _parseable(parse, queries):
+    result = []
+    for query in queries:
+        try:
+            parse(query)
+        except Exception:
+            continue
+        result.append(query)
+    return result
+
+
+def _bench(name, parse, queries, repeat):
+    """Prints the best time of `repeat` runs over all `queries` in milliseconds per query"""
+    if not queries:
+        print("{:<24} no parseable queries".format(name))
+        return
+    timer = timeit.Timer(lambda: map(parse, queries))
+    best = min(timer.repeat(repeat=repeat, number=1))
+    print("{:<24} {:>6} queries {:>10.3f} ms/query".format(name, len(queries), best * 1000 / len(queries)))
+
+
+def main():
+    parser = configargparse.ArgumentParser("mediaTUM search_parser_benchmark.py")
+    parser.add_argument("--file", "-f", help="file with one query per line, default: built-in corpus")
+    parser.add_argument("--repeat", "-r", type=int, default=5, help="number of runs, the best one is reported")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file) as f:
+            queries = [line.decode("utf8").strip() for line in f]
+        queries = filter(None, queries)
+    else:
+        queries = DEFAULT_QUERIES
+
+    for name, uncached, cached in (
+            ("new", _parse_new, _core_search.parse_searchquery),
+            ("old_style", _parse_old_style, _core_search.parse_searchquery_old_style),
+            ):
+        parseable = _parseable(uncached, queries)
+        _bench(name + " uncached", uncached, parseable, args.repeat)
+        cached.cache_clear()
+        _bench(name + " cached", cached, parseable, args.repeat)
+
+    for name, info in sorted(_core_search.get_parse_cache_info().iteritems()):
+        print("{:<24} hits {} misses {} size {}/{}".format(name + " cache", info.hits, info.misses, info.currsize, info.maxsize))
+
+
+if __name__ == "__main__":
+    main()
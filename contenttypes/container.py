@@ -15,7 +15,6 @@ import sqlalchemy.orm.session as _
 
 from mediatumtal import tal
 
-import contenttypes as _contenttypes
 import contenttypes.data as _
 import core as _core
 import core.config as config
@@ -246,16 +245,10 @@ class Container(Data, ContainerMixin, SchemaMixin):
         logg.debug("Postprocessing node %s", self.id)
 
     def childcount(self):
-        if config.getboolean("database.use_cached_childcount"):
-            return _core.database.postgres.alchemyext.exec_sqlfunc(
-                _sqlalchemy.orm.session.object_session(self),
-                _core.database.postgres.mediatumfunc.count_content_children_for_all_subcontainers(self.id),
-                )
-        else:
-            sq = _core.database.postgres.node.subquery_subtree_distinct(self)
-            return _sqlalchemy.orm.session.object_session(self).query(_contenttypes.data.Content).filter(
-                _core.database.postgres.node.Node.id.in_(sq),
-                ).filter_by(subnode=False).count()
+        return _core.database.postgres.alchemyext.exec_sqlfunc(
+            _sqlalchemy.orm.session.object_session(self),
+            _core.database.postgres.mediatumfunc.count_content_children_for_all_subcontainers(self.id),
+            )
 
     def get_editor_menu(self, user, multiple_nodes, has_childs):
         menu = list(super(Container, self).get_editor_menu(user, multiple_nodes, has_childs))
@@ -19,6 +19,7 @@ import core as _core
 import core.webconfig as _
 from core.database.postgres.node import Node
 from core.database.postgres.node import children_rel
+import core.cachegeneration as _core_cachegeneration
 import core.config as config
 import core.translation as _core_translation
 from core.styles import get_full_style
@@ -56,6 +57,111 @@ def get_maskcache_entry(lookup_key):
     return res
 
 
+# generation of the shortview mask descriptors, bumped if masks, maskitems or metafields change
+mask_generation = _core_cachegeneration.Generation("masks")
+
+_core_cachegeneration.bump_on_commit(
+        mask_generation,
+        lambda obj: isinstance(obj, Node) and obj.type in ("metadatatype", "mask", "maskitem", "metafield"),
+    )
+
+# field descriptors that outlive the request:
+# lookup key -> (generation, mask id, field descriptors without database objects)
+_shortview_descriptors = {}
+
+
+def _build_field_descriptors(node, language, labels):
+    mask = node.metadatatype.get_mask(u"nodesmall")
+    for m in node.metadatatype.filter_masks(u"shortview", language=language):
+        mask = m
+
+    if not mask:
+        return None, None
+
+    fields = mask.getMaskFields(first_level_only=True)
+    ordered_fields = sorted([(f.orderpos, f) for f in fields])
+    field_descriptors = []
+
+    for _, maskitem in ordered_fields:
+        fd = {}  # field descriptor
+        fd['maskitem_type'] = maskitem.get('type')
+        fd['format'] = maskitem.getFormat()
+        fd['unit'] = maskitem.getUnit()
+        fd['label'] = maskitem.getLabel()
+        fd['maskitem'] = maskitem
+
+        default = maskitem.getDefault()
+        fd['default'] = default
+
+        metafield = maskitem.metafield
+        metafield_type = metafield.get('type')
+        fd['metafield'] = metafield
+        fd['metafield_type'] = metafield_type
+
+        t = getMetadataType(metafield_type)
+        fd['metatype'] = t
+
+        node_attribute = _get_node_attribute_name(maskitem)
+        fd['node_attribute'] = node_attribute
+
+        fd['template'] = _build_field_template(labels, fd)
+        long_field_descriptor = (node_attribute, fd)
+        field_descriptors.append(long_field_descriptor)
+
+    return mask, field_descriptors
+
+
+def _restore_field_descriptors(mask_id, field_descriptors):
+    """Loads the database objects referenced by field descriptors from `_shortview_descriptors`"""
+    nodes = _core.db.query(Node).filter(Node.id.in_(
+            [mask_id] + [fd[k] for _, fd in field_descriptors for k in ('maskitem', 'metafield')]
+        )).prefetch_attrs()
+    nodes = {n.id: n for n in nodes}
+
+    restored = []
+    for node_attribute, fd in field_descriptors:
+        fd = dict(fd)
+        fd['maskitem'] = nodes[fd['maskitem']]
+        fd['metafield'] = nodes[fd['metafield']]
+        fd['metatype'] = getMetadataType(fd['metafield_type'])
+        restored.append((node_attribute, fd))
+
+    return nodes[mask_id], restored
+
+
+def get_mask_field_descriptors(node, language=None, labels=0):
+    """Returns the shortview mask of `node` and its field descriptors (see `render_mask_template`).
+    Both are None if no shortview mask exists.
+    The result is cached in the request and, without the database objects, across requests.
+    """
+    lookup_key = make_lookup_key(node, language, labels)
+    mask, field_descriptors = get_maskcache_entry(lookup_key)
+    if mask is not None:
+        return mask, field_descriptors
+
+    generation = mask_generation.get()
+    cached = _shortview_descriptors.get(lookup_key)
+    if cached is not None and cached[0] == generation:
+        _, mask_id, field_descriptors = cached
+        if mask_id is None:
+            mask = None
+        else:
+            mask, field_descriptors = _restore_field_descriptors(mask_id, field_descriptors)
+    else:
+        mask, field_descriptors = _build_field_descriptors(node, language, labels)
+        if mask is None:
+            _shortview_descriptors[lookup_key] = (generation, None, None)
+        else:
+            _shortview_descriptors[lookup_key] = (generation, mask.id, [
+                (node_attribute, dict(fd, maskitem=fd['maskitem'].id, metafield=fd['metafield'].id, metatype=None))
+                for node_attribute, fd in field_descriptors
+                ])
+
+    if mask is not None:
+        _flask.g.mediatum.setdefault("maskcache", {})[lookup_key] = (mask, field_descriptors)
+    return mask, field_descriptors
+
+
 def render_mask_template(node, mask, field_descriptors, language, words=None, separator="", skip_empty_fields=True):
     res = []
 
@@ -218,60 +324,11 @@ class Data(Node):
         if not separator:
             separator = u"<br/>"
 
-        lookup_key = make_lookup_key(self, language, labels)
-
-        # if the lookup_key is already in the cache dict: render the cached mask_template
-        # else: build the mask_template
-
-        _flask.g.mediatum.setdefault("maskcache", {})
-
-        if lookup_key in _flask.g.mediatum['maskcache']:
-            mask, field_descriptors = _flask.g.mediatum['maskcache'][lookup_key]
-            res = render_mask_template(self, mask, field_descriptors, language, words=words, separator=separator)
-
-        else:
-            mask = self.metadatatype.get_mask(u"nodesmall")
-            for m in self.metadatatype.filter_masks(u"shortview", language=language):
-                mask = m
-
-            if mask:
-                fields = mask.getMaskFields(first_level_only=True)
-                ordered_fields = sorted([(f.orderpos, f) for f in fields])
-                field_descriptors = []
-
-                for _, maskitem in ordered_fields:
-                    fd = {}  # field descriptor
-                    fd['maskitem_type'] = maskitem.get('type')
-                    fd['format'] = maskitem.getFormat()
-                    fd['unit'] = maskitem.getUnit()
-                    fd['label'] = maskitem.getLabel()
-                    fd['maskitem'] = maskitem
-
-                    default = maskitem.getDefault()
-                    fd['default'] = default
-
-                    metafield = maskitem.metafield
-                    metafield_type = metafield.get('type')
-                    fd['metafield'] = metafield
-                    fd['metafield_type'] = metafield_type
-
-                    t = getMetadataType(metafield_type)
-                    fd['metatype'] = t
-
-                    node_attribute = _get_node_attribute_name(maskitem)
-                    fd['node_attribute'] = node_attribute
-
-                    fd['template'] = _build_field_template(labels, fd)
-                    long_field_descriptor = (node_attribute, fd)
-                    field_descriptors.append(long_field_descriptor)
-
-                _flask.g.mediatum["maskcache"][lookup_key] = (mask, field_descriptors)
-                res = render_mask_template(self, mask, field_descriptors, language, words=words, separator=separator)
-
-            else:
-                res = '&lt;smallview mask not defined&gt;'
+        mask, field_descriptors = get_mask_field_descriptors(self, language, labels)
+        if mask:
+            return render_mask_template(self, mask, field_descriptors, language, words=words, separator=separator)
 
-        return res
+        return '&lt;smallview mask not defined&gt;'
 
     def get_name(self):
         return self.name
@@ -80,6 +80,12 @@ def _pdfinfo(filename):
     return {k:_utils_utils.utf8_decode_escape(v.strip()) for k,v in data.iteritems()}
 
 
+def get_derivative_paths(document_path):
+    """Returns the paths of the thumbnail and the fulltext file generated for the document at `document_path`"""
+    path, ext = _utils_utils.splitfilename(document_path)
+    return u"{}.thumbnail.jpeg".format(path), u"{}.txt".format(path)
+
+
 def _process_pdf(filename, thumbnailname, fulltextname):
     name = ".".join(filename.split(".")[:-1])
     fulltext_from_pdftotext = name + ".pdftotext"  # output of pdf to text, possibly not normalized utf-8
@@ -239,9 +245,7 @@ class Document(_contenttypes_data.Content):
         if thumbnail or fulltext:
             return
 
-        path, ext = _utils_utils.splitfilename(doc.abspath)
-        thumbnailname = u"{}.thumbnail.jpeg".format(path)
-        fulltextname = u"{}.txt".format(path)
+        thumbnailname, fulltextname = get_derivative_paths(doc.abspath)
         try:
             pdfinfo = _process_pdf(doc.abspath, thumbnailname, fulltextname)
         except _PdfEncryptedError:
@@ -252,11 +256,7 @@ class Document(_contenttypes_data.Content):
             # must match error string in parsepdf.py
             raise _contenttypes_data.BadFile("image_too_big")
         else:
-            unwanted_attrs = self.get_unwanted_exif_attributes()
-            for key, value in pdfinfo.iteritems():
-                key = key.lower()
-                if key not in unwanted_attrs:
-                    self.set(u"pdf_{}".format(key), value)
+            self._set_pdf_attributes(pdfinfo)
 
         self.files.append(File(thumbnailname, "thumbnail", "image/jpeg"))
         self.files.append(File(fulltextname, "fulltext", "text/plain"))
@@ -266,6 +266,13 @@ class Document(_contenttypes_data.Content):
         _core.db.session.commit()
 
 
+    def _set_pdf_attributes(self, pdfinfo):
+        unwanted_attrs = self.get_unwanted_exif_attributes()
+        for key, value in pdfinfo.iteritems():
+            key = key.lower()
+            if key not in unwanted_attrs:
+                self.set(u"pdf_{}".format(key), value)
+
     def get_unwanted_exif_attributes(self):
             '''
             Returns a list of unwanted attributes which are not to be extracted from uploaded documents
@@ -44,6 +44,65 @@ def convert_image(src_filepath, dest_filepath, *options):
     utils.process.check_call(("gm", "convert") + options + (src_filepath, dest_filepath))
 
 
+def get_image_format_path(original_path, mimetype):
+    """Returns the path of the `image` file with `mimetype` that is generated from the original image at `original_path`"""
+    return u"{}.{}".format(os.path.splitext(original_path)[0], mimetype.split("/")[1])
+
+
+def get_convert_options(original_mimetype):
+    """Returns the options passed to convert_image when other formats are generated from an original image"""
+    if original_mimetype == u"image/svg+xml":
+        return ["-alpha", "off", "-colorspace", "RGB", "-background", "white"]
+    return []
+
+
+def get_processing_mimetype(original_mimetype):
+    """Returns the mimetype of the image file that is used for thumbnails and metadata"""
+    if original_mimetype == u"image/svg+xml":
+        return u"image/png"
+    return original_mimetype
+
+
+def get_thumbnail_path(processing_path):
+    # XXX: we really should use the correct file ending and find another way of naming
+    return u"{}.thumbnail.jpeg".format(os.path.splitext(processing_path)[0])
+
+
+def extract_image_metadata(path, size):
+    """Returns the node attributes for the image file at `path` with `size` bytes: dimensions, exif and iptc tags"""
+    with PILImage.open(path) as pic:
+        # XXX: this is a bit redundant...
+        width = pic.size[0]
+        height = pic.size[1]
+    attrs = dict(
+        origwidth=width,
+        origheight=height,
+        origsize=size,
+        width=width,
+        height=height,
+    )
+
+    # Exif
+    unwanted_attrs = Image.get_unwanted_exif_attributes()
+
+    with open(path, 'rb') as f:
+        tags = _exifread.process_file(f)
+
+    for k, v in tags.iteritems():
+        # don't set unwanted exif attributes
+        if any(tag in k for tag in unwanted_attrs) or not v:
+            continue
+        attrs["exif_{}".format(k.replace(" ", "_"))] = v.printable
+
+    # IPTC
+    iptc_metadata = lib.iptc.IPTC.get_iptc_tags(path)
+    if iptc_metadata is not None:
+        for k, v in iteritems(iptc_metadata):
+            attrs['iptc_' + k] = v
+
+    return attrs
+
+
 @check_type_arg_with_schema
 class Image(_contenttypes_data.Content):
     # image formats that should exist for each mimetype of the `original` image
@@ -161,15 +220,11 @@ class Image(_contenttypes_data.Content):
     def _generate_other_format(self, mimetype_to_generate, files=None):
         original_file, = _itertools.ifilter(lambda f: f.filetype == u"original", files)
 
-        extension = mimetype_to_generate.split("/")[1]
-        newimg_name = os.path.splitext(original_file.abspath)[0] + "." + extension
+        newimg_name = get_image_format_path(original_file.abspath, mimetype_to_generate)
 
         assert original_file.abspath != newimg_name
 
-        if original_file.mimetype == u"image/svg+xml":
-            convert_options = ["-alpha", "off", "-colorspace", "RGB", "-background", "white"]
-        else:
-            convert_options = []
+        convert_options = get_convert_options(original_file.mimetype)
 
         old_file = filter(lambda f: f.filetype == u"image" and f.mimetype == mimetype_to_generate, files)
 
@@ -234,10 +289,11 @@ class Image(_contenttypes_data.Content):
 
         original_file, = _itertools.ifilter(lambda f: f.filetype == u"original", files)
 
-        if original_file.mimetype == u"image/svg+xml":
-            original_file = filter(lambda f: f.filetype == u"image" and f.mimetype == u"image/png", files)
-            if original_file:
-                original_file, = original_file
+        processing_mimetype = get_processing_mimetype(original_file.mimetype)
+        if processing_mimetype != original_file.mimetype:
+            processing_file = filter(lambda f: f.filetype == u"image" and f.mimetype == processing_mimetype, files)
+            if processing_file:
+                original_file, = processing_file
 
         return original_file
 
@@ -247,10 +303,7 @@ class Image(_contenttypes_data.Content):
             files = self.files.all()
 
         image_file = self._find_processing_file(files)
-        path = os.path.splitext(image_file.abspath)[0]
-
-        # XXX: we really should use the correct file ending and find another way of naming
-        thumbname = u"{}.thumbnail.jpeg".format(path)
+        thumbname = get_thumbnail_path(image_file.abspath)
 
         old_thumb_files = filter(lambda f: f.filetype == u"thumbnail", files)
 
@@ -267,33 +320,8 @@ class Image(_contenttypes_data.Content):
 
     def _extract_metadata(self, files=None):
         image_file = self._find_processing_file(files)
-        with PILImage.open(image_file.abspath) as pic:
-            # XXX: this is a bit redundant...
-            width = pic.size[0]
-            height = pic.size[1]
-        self.set("origwidth", width)
-        self.set("origheight", height)
-        self.set("origsize", image_file.size)
-        self.set("width", width)
-        self.set("height", height)
-
-        # Exif
-        unwanted_attrs = Image.get_unwanted_exif_attributes()
-
-        with open(image_file.abspath, 'rb') as f:
-            tags = _exifread.process_file(f)
-
-        for k, v in tags.iteritems():
-            # don't set unwanted exif attributes
-            if any(tag in k for tag in unwanted_attrs) or not v:
-                continue
-            self.set("exif_{}".format(k.replace(" ", "_")), v.printable)
-
-        # IPTC
-        iptc_metadata = lib.iptc.IPTC.get_iptc_tags(image_file.abspath)
-        if iptc_metadata is not None:
-            for k, v in iteritems(iptc_metadata):
-                self.set('iptc_' + k, v)
+        for key, value in extract_image_metadata(image_file.abspath, image_file.size).iteritems():
+            self.set(key, value)
 
     def event_files_changed(self):
         """postprocess method for object type 'image'. called after object creation"""
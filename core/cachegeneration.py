@@ -0,0 +1,94 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Generation counters for caches that outlive a request.
+A cache remembers the generation its entries were built in
+and discards them as soon as the generation changed.
+The counters are kept in the setting table,
+so a change in one process (web workers, bin/mediatum-worker.py, manage.py) invalidates the caches of all processes.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import itertools as _itertools
+import logging as _logging
+
+import sqlalchemy.event as _sqlalchemy_event
+import sqlalchemy.orm as _sqlalchemy_orm
+from sqlalchemy import text as _sqltext
+
+import core as _core
+from core.database.postgres import DB_SCHEMA_NAME
+
+_logg = _logging.getLogger(__name__)
+
+
+class Generation(object):
+
+    def __init__(self, name):
+        self.name = name
+        self._setting_key = u"cachegeneration.{}".format(name)
+
+    def get(self):
+        value = _core.db.session.execute(_sqltext(
+                "SELECT value FROM {}.setting WHERE key = :key".format(DB_SCHEMA_NAME)),
+                {"key": self._setting_key}).scalar()
+        return value or 0
+
+    def bump(self):
+        # own transaction, the row is locked only for the increment
+        with _core.db.engine.begin() as conn:
+            conn.execute(_sqltext(
+                "INSERT INTO {schema}.setting (key, value) VALUES (:key, '1') "
+                "ON CONFLICT (key) DO UPDATE SET value = to_jsonb(CAST(setting.value AS text)::bigint + 1)".format(
+                    schema=DB_SCHEMA_NAME)),
+                {"key": self._setting_key})
+        _logg.debug("bumped cache generation %s", self.name)
+
+
+def _info_key(generation):
+    return "cachegeneration-{}".format(generation.name)
+
+
+def bump_after_commit(session, generation):
+    """
+    Bump `generation` when the current transaction of `session` is committed.
+    For changes made with plain SQL that `bump_on_commit` doesn't see.
+    `generation` must have been registered with `bump_on_commit`.
+    """
+    session.info[_info_key(generation)] = True
+
+
+def bump_on_commit(generation, predicate):
+    """
+    Bump `generation` whenever a transaction is committed
+    that inserted, updated or deleted an object for which `predicate` returns True.
+    """
+    info_key = _info_key(generation)
+
+    def after_flush(session, flush_context):
+        if info_key in session.info:
+            return
+        for obj in _itertools.chain(session.new, session.dirty, session.deleted):
+            if predicate(obj):
+                session.info[info_key] = True
+                return
+
+    def after_commit(session):
+        if session.info.pop(info_key, None):
+            generation.bump()
+
+    def after_rollback(session, previous_transaction):
+        session.info.pop(info_key, None)
+
+    _sqlalchemy_event.listen(_sqlalchemy_orm.Session, "after_flush", after_flush)
+    _sqlalchemy_event.listen(_sqlalchemy_orm.Session, "after_commit", after_commit)
+    _sqlalchemy_event.listen(_sqlalchemy_orm.Session, "after_soft_rollback", after_rollback)
+
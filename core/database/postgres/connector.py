@@ -16,12 +16,14 @@ from sqlalchemy_continuum.utils import version_class
 
 import core as _core
 import core.database.postgres.node as _
+import core.database.postgres.job as _
+import core.database.postgres.purge as _
 from core import config
 from . import db_metadata, DeclarativeBase
 from utils.postgres import schema_exists, table_exists
 import utils.process
 import sys
-from core.search.config import get_fulltext_autoindex_languages, get_attribute_autoindex_languages
+from core.search.config import get_fulltext_autoindex_languages, get_attribute_autoindex_languages, get_stored_tsvectors_mode
 
 
 CONNECTSTR_TEMPLATE = "postgresql+psycopg2://{user}:{passwd}@:{port}/{database}"
@@ -254,6 +256,18 @@ class PostgresSQLAConnector(object):
             attribute_autoindex_languages_setting = Setting(key=u"search.attribute_autoindex_languages", value=list(attribute_autoindex_languages))
             self.session.merge(attribute_autoindex_languages_setting)
 
+        stored_tsvectors_mode = get_stored_tsvectors_mode()
+        previous_setting = self.session.query(Setting).get(u"search.stored_tsvectors")
+        previous_mode = previous_setting.value if previous_setting is not None else "none"
+        if previous_mode != stored_tsvectors_mode:
+            # node_tsvector holds rows for the previous mode (or wasn't maintained with 'none'),
+            # searches fall back to the expression indexes until it is rebuilt for the new mode
+            self.session.query(Setting).filter_by(key=u"search.stored_tsvectors_built").delete()
+            if stored_tsvectors_mode != "none":
+                logg.error("search.stored_tsvectors changed from '%s' to '%s', stored tsvectors are not used for searching "
+                           "until they are rebuilt with 'bin/manage.py tsvectors rebuild'", previous_mode, stored_tsvectors_mode)
+        self.session.merge(Setting(key=u"search.stored_tsvectors", value=stored_tsvectors_mode))
+
         self.session.commit()
 
     def run_psql_command(self, command, output=False, database=None):
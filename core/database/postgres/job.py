@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+from __future__ import division
+from __future__ import print_function
+
+from sqlalchemy import DateTime, Index, Integer, Unicode, UnicodeText, func as sqlfunc
+from core.database.postgres import DeclarativeBase, TimeStamp, C, FK, integer_pk
+from core.database.postgres.node import Node
+
+
+class Job(DeclarativeBase, TimeStamp):
+
+    """Background task stored in the database, processed by bin/mediatum-worker.py (see core.jobqueue)"""
+
+    __tablename__ = "job"
+
+    id = integer_pk()
+    type = C(Unicode(64), nullable=False)
+    node_id = C(Integer, FK(Node.id, ondelete="CASCADE"))
+    #: one of queued, running, done, failed
+    state = C(Unicode(16), nullable=False, default=u"queued")
+    attempts = C(Integer, nullable=False, default=0)
+    max_attempts = C(Integer, nullable=False, default=3)
+    run_after = C(DateTime, nullable=False, default=sqlfunc.now())
+    started_at = C(DateTime)
+    finished_at = C(DateTime)
+    worker = C(Unicode(255))
+    error = C(UnicodeText)
+
+    __table_args__ = (
+        Index("ix_job_queued", type, run_after, postgresql_where=(state == u"queued")),
+        Index("ix_job_node_id", node_id),
+    )
+
+    def __repr__(self):
+        return u"Job<{}: {} node={} state={}> ({})".format(
+                self.id, self.type, self.node_id, self.state, object.__repr__(self)).encode("utf8")
@@ -17,10 +17,10 @@ import sqlalchemy_continuum as _sqlalchemy_continuum
 import sqlalchemy_continuum.plugins.flask as _
 import sqlalchemy_continuum.plugins.transaction_meta as _
 import sqlalchemy.orm as _
-from sqlalchemy import (Table, Sequence, Integer, Unicode, Boolean, sql, text, select, func)
+from sqlalchemy import (Table, Sequence, Integer, Unicode, Boolean, Text, Index, UniqueConstraint, sql, text, select, func)
 from sqlalchemy.orm import deferred, object_session
 from sqlalchemy.orm.dynamic import AppenderMixin
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR
 from sqlalchemy.ext.declarative.api import DeclarativeMeta
 from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.ext.hybrid import hybrid_property
@@ -29,6 +29,7 @@ import flask as _flask
 
 import core as _core
 import core.database.postgres as _
+from core import config
 from core.node import NodeMixin, NodeVersionMixin
 from core.database.postgres import rel, bref, C, FK
 from core.database.postgres.alchemyext import LenMixin, view, exec_sqlfunc
@@ -129,7 +130,16 @@ class MtQuery(_sqlalchemy.orm.Query):
             raise ValueError(
                 "accesstype '{}' does not exist, accesstype must be one of: read, write, data".format(accesstype))
 
-        access_filter = db_accessfunc(nodeclass.id, group_ids, ip, date)
+        if accesstype in ("read", "data") and config.getboolean("database.use_access_index", True):
+            # evaluate the rules once per query and look up the nodes with an accessible signature
+            accessible_signatures = select([_core.database.postgres.mediatumfunc.accessible_access_signatures(
+                accesstype, group_ids, ip, date)]).as_scalar()
+            nts = t_node_to_access_signature
+            access_filter = nodeclass.id.in_(select([nts.c.nid])
+                                             .where(nts.c.ruletype == accesstype)
+                                             .where(nts.c.signature_id == func.any(accessible_signatures)))
+        else:
+            access_filter = db_accessfunc(nodeclass.id, group_ids, ip, date)
         return self.filter(access_filter)
 
     def get(self, ident):
@@ -212,6 +222,40 @@ t_noderelation = Table("noderelation", _core.database.postgres.db_metadata,
                        C("distance", Integer, primary_key=True, autoincrement=False, index=True))
 
 
+# number of content nodes (without subnodes) below each container, maintained by database triggers
+t_container_childcount = Table("container_childcount", _core.database.postgres.db_metadata,
+                               C("nid", Integer, FK("node.id", ondelete="CASCADE"), primary_key=True),
+                               C("count", Integer, nullable=False))
+
+
+# distinct sets of (rule_id, invert) pairs of read and data rules, maintained by database triggers.
+# rule_ids and inverts are sorted pairwise.
+t_access_signature = Table("access_signature", _core.database.postgres.db_metadata,
+                           C("id", Integer, primary_key=True),
+                           C("ruletype", Text, nullable=False),
+                           C("rule_ids", ARRAY(Integer), nullable=False),
+                           C("inverts", ARRAY(Boolean), nullable=False),
+                           UniqueConstraint("ruletype", "rule_ids", "inverts"))
+
+
+t_node_to_access_signature = Table("node_to_access_signature", _core.database.postgres.db_metadata,
+                                   C("nid", Integer, FK("node.id", ondelete="CASCADE"), primary_key=True),
+                                   C("ruletype", Text, primary_key=True),
+                                   C("signature_id", Integer, FK("access_signature.id", ondelete="CASCADE"), nullable=False),
+                                   Index("ix_node_to_access_signature_lookup", "ruletype", "signature_id", "nid"))
+
+
+# precomputed tsvectors of node attributes and fulltexts (source 'attrs' or 'fulltext') per search config,
+# maintained by database triggers if the setting search.stored_tsvectors is not 'none'
+t_node_tsvector = Table("node_tsvector", _core.database.postgres.db_metadata,
+                        C("nid", Integer, FK("node.id", ondelete="CASCADE"), primary_key=True),
+                        C("source", Text, primary_key=True),
+                        C("config", Text, primary_key=True),
+                        C("tsvec", TSVECTOR, nullable=False),
+                        Index("ix_node_tsvector_attrs", "tsvec", postgresql_using="gin", postgresql_where=text("source = 'attrs'")),
+                        Index("ix_node_tsvector_fulltext", "tsvec", postgresql_using="gin", postgresql_where=text("source = 'fulltext'")))
+
+
 class BaseNodeMeta(DeclarativeMeta):
 
     def __init__(cls, name, bases, dct):  # @NoSelf
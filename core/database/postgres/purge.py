@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+from __future__ import division
+from __future__ import print_function
+
+from sqlalchemy import Index, Integer, Unicode, UnicodeText
+from core.database.postgres import DeclarativeBase, TimeStamp, C, FK, integer_pk
+from core.database.postgres.node import Node
+
+
+class NodePurge(DeclarativeBase, TimeStamp):
+
+    """Node marked for removal from the trash directory `trash_id`, processed by core.purge"""
+
+    __tablename__ = "node_purge"
+
+    nid = C(Integer, FK(Node.id, ondelete="CASCADE"), primary_key=True)
+    trash_id = C(Integer, FK(Node.id, ondelete="CASCADE"), nullable=False)
+
+    __table_args__ = (
+        Index("ix_node_purge_trash_id", trash_id),
+    )
+
+    def __repr__(self):
+        return u"NodePurge<{} from {}> ({})".format(self.nid, self.trash_id, object.__repr__(self)).encode("utf8")
+
+
+class FileUnlink(DeclarativeBase, TimeStamp):
+
+    """Physical file that is deleted from disk by core.purge"""
+
+    __tablename__ = "file_unlink"
+
+    id = integer_pk()
+    path = C(Unicode(4096), nullable=False)
+    #: set if unlinking failed, the file is not tried again
+    error = C(UnicodeText)
+
+    def __repr__(self):
+        return u"FileUnlink<{}: {}> ({})".format(self.id, self.path, object.__repr__(self)).encode("utf8")
@@ -14,6 +14,7 @@ import operator as _operator
 
 import logging
 import re as _re
+import time as _time
 
 import sqlalchemy as _sqlalchemy
 import sqlalchemy.orm as _
@@ -26,8 +27,10 @@ import core.database.postgres.node as _
 import utils.utils as _utils
 import utils.locks as _locks
 from core.database.postgres import DB_SCHEMA_NAME as _DB_SCHEMA_NAME
+from core.database.postgres.setting import Setting
 from core.search import SearchQueryException
-from core.search.config import get_default_search_languages
+from core.search.config import get_default_search_languages, get_stored_tsvectors_mode
+from core.search.config import get_attribute_autoindex_languages, get_fulltext_autoindex_languages
 from core.search.representation import AttributeMatch, FullMatch, SchemaMatch, FulltextMatch, AttributeCompare, TypeMatch, And, Or
 
 comparisons = {
@@ -108,12 +111,72 @@ def _make_languages_tsquery(languages, searchstring, op):
     return reduce(lambda query1, query2: query1.op("||")(query2), ts_queries)
 
 
+# (expiry time, mode) of get_searched_stored_tsvectors_mode
+_searched_stored_tsvectors_mode = (0, None)
+
+
+def get_stored_tsvectors_built_mode():
+    """Returns the mode node_tsvector was last rebuilt for, None if it wasn't rebuilt since the mode changed"""
+    setting = _core.db.query(Setting).get(u"search.stored_tsvectors_built")
+    return setting.value if setting is not None else None
+
+
+def get_searched_stored_tsvectors_mode():
+    """Returns the configured search.stored_tsvectors mode if node_tsvector was rebuilt for it, else 'none'.
+    Searches use the expression indexes until `manage.py tsvectors rebuild` was run for the current mode.
+    The result is cached for a minute.
+    """
+    global _searched_stored_tsvectors_mode
+    expiry, mode = _searched_stored_tsvectors_mode
+    if expiry < _time.time():
+        mode = get_stored_tsvectors_mode()
+        if mode != "none" and get_stored_tsvectors_built_mode() != mode:
+            mode = "none"
+        _searched_stored_tsvectors_mode = (_time.time() + 60, mode)
+    return mode
+
+
+def _make_stored_tsvec_cond(languages, source, searchstring, op="&"):
+    """Searches the tsvectors stored in node_tsvector for `source` ("attrs" or "fulltext").
+    In 'shortest' mode, each fulltext has only one tsvector, so it is searched regardless of its language.
+    In 'detected' mode, each node has one tsvector per source in its detected language,
+    it's matched with the query for that language. `languages` is ignored then.
+    :param languages: postgresql language string
+    :param source: "attrs" or "fulltext"
+    :param searchstring: string of space-separated words to search
+    :param op: operator used to join searchterms separated by space, | or &
+    """
+    node_tsvector = _core.database.postgres.node.t_node_tsvector
+    tsvec_query = _sqlalchemy.select([node_tsvector.c.nid]).where(node_tsvector.c.source == source)
+    mode = get_searched_stored_tsvectors_mode()
+    if mode == "detected":
+        if source == "fulltext":
+            node_languages = get_fulltext_autoindex_languages()
+        else:
+            node_languages = get_attribute_autoindex_languages()
+        conds = (_sqlalchemy.and_(
+                    node_tsvector.c.config == lang,
+                    node_tsvector.c.tsvec.op("@@")(_make_languages_tsquery((lang,), searchstring, op)),
+                 ) for lang in sorted(node_languages))
+        tsvec_query = tsvec_query.where(_sqlalchemy.or_(*conds))
+        return _core.database.postgres.node.Node.id.in_(tsvec_query)
+
+    ts_query = _make_languages_tsquery(languages, searchstring, op)
+    if not (source == "fulltext" and mode == "shortest"):
+        tsvec_query = tsvec_query.where(node_tsvector.c.config.in_(list(languages)))
+    tsvec_query = tsvec_query.where(node_tsvector.c.tsvec.op("@@")(ts_query))
+    return _core.database.postgres.node.Node.id.in_(tsvec_query)
+
+
 def make_fulltext_expr_tsvec(languages, searchstring, op="&"):
     """Searches fulltext column. fulltext should have a gin index.
+    Uses the stored tsvectors if search.stored_tsvectors is set and node_tsvector was rebuilt for it.
     :param languages: postgresql language string
     :param searchstring: string of space-separated words to search
     :param op: operator used to join searchterms separated by space, | or &
     """
+    if get_searched_stored_tsvectors_mode() != "none":
+        return _make_stored_tsvec_cond(languages, "fulltext", searchstring, op)
     ts_query = _make_languages_tsquery(languages, searchstring, op)
     mk_cond = lambda lang: func.to_tsvector_safe(lang, _core.database.postgres.node.Node.fulltext).op("@@")(ts_query)
     conds = _itertools.imap(mk_cond, languages)
@@ -122,10 +185,13 @@ def make_fulltext_expr_tsvec(languages, searchstring, op="&"):
 
 def _make_attrs_expr_tsvec(languages, searchstring, op="&"):
     """Searches attrs column. attrs should have a gin index.
+    Uses the stored tsvectors if search.stored_tsvectors is set and node_tsvector was rebuilt for it.
     :param languages: postgresql language string
     :param searchstring: string of space-separated words to search
     :param op: operator used to join searchterms separated by space, | or &
     """
+    if get_searched_stored_tsvectors_mode() != "none":
+        return _make_stored_tsvec_cond(languages, "attrs", searchstring, op)
     ts_query = _make_languages_tsquery(languages, searchstring, op)
     mk_cond = lambda lang: func.jsonb_object_values_to_tsvector(
         lang,
@@ -148,7 +214,8 @@ def _make_fts_expr_tsvec(languages, target, searchstring, op="&"):
 
 def _make_attribute_fts_cond(languages, target, searchstring, op="&"):
     """Searches fulltext column, building ts_vector on the fly.
-    `target` must have a gin index built with an ts_vector or this will be extremly slow.
+    `target` must have a gin index built with an ts_vector or this will be extremly slow,
+    see `sync_attribute_search_indexes`.
     :param languages: postgresql language string
     :param target: SQLAlchemy expression with type text
     :param searchstring: string of space-separated words to search
@@ -206,6 +273,20 @@ def apply_searchtree_to_query(query, searchtree, languages=None):
     return query.filter(walk(searchtree))
 
 
+def get_auto_indexes_node(index_prefix):
+    """Returns a dict mapping the names of the automatically created indexes on node with `index_prefix` to their validity.
+    Invalid indexes are left over by failed concurrent index builds.
+    """
+    index_auto_prefix = _utils.make_db_auto_prefix(index_prefix)
+    res = _core.db.session.execute(_sqlalchemy.text(
+        "SELECT c.relname, i.indisvalid FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indexrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = :schema AND i.indrelid = CAST(:table AS regclass)"),
+        {"schema": _DB_SCHEMA_NAME, "table": "{}.node".format(_DB_SCHEMA_NAME)})
+    return {indexname: valid for indexname, valid in res.fetchall() if indexname.startswith(index_auto_prefix)}
+
+
 def _check_search_indexes_node(type, languages):
     """
     checks if search indexes exists and create them if they not exists
@@ -215,16 +296,7 @@ def _check_search_indexes_node(type, languages):
     """
 
     index_prefix = "ix_{type}_node".format(type=type)
-    index_auto_prefix = _utils.make_db_auto_prefix(index_prefix)
-    current_indexnames = set()
-    res = _core.db.session.execute(
-        "SELECT indexname FROM pg_indexes WHERE schemaname = '{schema}' AND tablename = 'node'".format(
-            schema=_DB_SCHEMA_NAME,
-        ))
-    for index in res.fetchall():
-        indexname = index[0]
-        if indexname.startswith(index_auto_prefix):
-            current_indexnames.add(indexname)
+    current_indexnames = set(get_auto_indexes_node(index_prefix))
 
     wanted_indexnames = set()
     wanted_indexes_lang = {}
@@ -260,6 +332,14 @@ def check_fulltext_attrs_search_indexes_node():
     :return: None
     """
     languages = get_default_search_languages()
+    mode = get_stored_tsvectors_mode()
+    if mode != "none":
+        if get_stored_tsvectors_built_mode() == mode:
+            # searches use the stored tsvectors, the expression indexes for each language are not needed
+            languages = ()
+        else:
+            # keep the expression indexes, searches need them until node_tsvector is rebuilt for this mode
+            logg.warning("node_tsvector is not built for search.stored_tsvectors '%s', keeping the expression search indexes", mode)
     with _locks.named_lock('createsearchindices'):
         _check_search_indexes_node("attrs", languages)
         _check_search_indexes_node("fulltext", languages)
@@ -280,3 +360,118 @@ def search(node, searchquery, languages=None, filter_dbquery=lambda q: q):
         _core.database.postgres.node.t_noderelation,
         _contenttypes.data.Content.id == _core.database.postgres.node.t_noderelation.c.cid,
         ).filter_by(nid=node.id)
+
+
+ATTRIBUTE_SEARCH_INDEX_PREFIX = "ix_attrsearch_node"
+
+
+def get_searchable_attribute_names():
+    """Returns the names of all metafields that are search fields or used in a search mask"""
+    from schema.schema import Metafield
+    Node = _core.database.postgres.node.Node
+    nodemapping = _core.database.postgres.node.t_nodemapping
+    in_searchmask = Metafield.id.in_(
+        _sqlalchemy.select([nodemapping.c.cid]).where(nodemapping.c.nid.in_(
+            _sqlalchemy.select([Node.id]).where(Node.type == u"searchmaskitem"))))
+    query = _core.db.query(Metafield.name).filter(Metafield.a.opts.like(u"%s%") | in_searchmask).distinct()
+    return sorted(name for name, in query if name)
+
+
+def get_wanted_attribute_search_indexes():
+    """Returns a dict mapping index names to (language, attribute name)
+    for the indexes needed by `_make_attribute_fts_cond` for all searchable attributes.
+    """
+    wanted = {}
+    attrnames = get_searchable_attribute_names()
+    for lang in get_default_search_languages():
+        for attrname in attrnames:
+            name = _re.sub(r"[^a-zA-Z0-9_]", "_", u"{}_{}".format(lang, attrname))
+            indexname = _utils.make_db_auto_name(ATTRIBUTE_SEARCH_INDEX_PREFIX, "index", name)
+            wanted[indexname] = (lang, attrname)
+    return wanted
+
+
+def get_attribute_search_index_changes():
+    """Returns the missing (or invalid) indexes as dict like `get_wanted_attribute_search_indexes`
+    and the set of names of existing indexes that are not needed anymore.
+    """
+    wanted = get_wanted_attribute_search_indexes()
+    current = get_auto_indexes_node(ATTRIBUTE_SEARCH_INDEX_PREFIX)
+    missing = {indexname: v for indexname, v in wanted.iteritems() if not current.get(indexname)}
+    unneeded = set(current) - set(wanted)
+    return missing, unneeded
+
+
+def sync_attribute_search_indexes(drop_unneeded=True):
+    """
+    Creates missing attribute search indexes and drops unneeded ones.
+    Indexes are created and dropped concurrently, so searching and editing can go on meanwhile.
+    Returns the lists of created and dropped index names.
+    """
+    created = []
+    dropped = []
+    with _locks.named_lock('createsearchindices'):
+        missing, unneeded = get_attribute_search_index_changes()
+        _core.db.session.rollback()
+        # concurrent index operations cannot run inside a transaction block
+        conn = _core.db.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            for indexname, (lang, attrname) in sorted(missing.iteritems()):
+                logg.info("creating search index %s for attribute '%s' with config %s", indexname, attrname, lang)
+                # remove invalid leftovers of failed builds
+                conn.execute("DROP INDEX CONCURRENTLY IF EXISTS {}.{}".format(_DB_SCHEMA_NAME, indexname))
+                conn.execute(_sqlalchemy.text(
+                    "CREATE INDEX CONCURRENTLY {indexname} ON {schema}.node USING gin "
+                    "(to_tsvector(CAST(:lang AS regconfig), replace(attrs ->> :attrname, ';', ' ')))".format(
+                        indexname=indexname, schema=_DB_SCHEMA_NAME)),
+                    lang=lang, attrname=attrname)
+                created.append(indexname)
+
+            if drop_unneeded:
+                for indexname in sorted(unneeded):
+                    logg.info("dropping unneeded search index %s", indexname)
+                    conn.execute("DROP INDEX CONCURRENTLY IF EXISTS {}.{}".format(_DB_SCHEMA_NAME, indexname))
+                    dropped.append(indexname)
+        finally:
+            conn.close()
+
+    return created, dropped
+
+
+def get_attribute_search_index_stats():
+    """
+    Returns a list of dicts with usage and size information for all attribute search indexes.
+    `pending_pages` and `pending_tuples` of the GIN pending list are only available if the pgstattuple extension is installed;
+    a long pending list or a large size for few values indicates that the index should be rebuilt.
+    """
+    wanted = get_wanted_attribute_search_indexes()
+    has_pgstattuple = _core.db.session.execute(
+        "SELECT EXISTS (SELECT FROM pg_extension WHERE extname = 'pgstattuple')").scalar()
+    res = _core.db.session.execute(_sqlalchemy.text(
+        "SELECT indexrelname, idx_scan, idx_tup_read, pg_relation_size(indexrelid) AS size "
+        "FROM pg_stat_user_indexes WHERE schemaname = :schema AND indexrelname LIKE :prefix ORDER BY indexrelname"),
+        {"schema": _DB_SCHEMA_NAME, "prefix": _utils.make_db_auto_prefix(ATTRIBUTE_SEARCH_INDEX_PREFIX) + "%"})
+
+    stats = []
+    for indexname, scans, tuples_read, size in res.fetchall():
+        lang, attrname = wanted.get(indexname, (None, None))
+        stat = dict(name=indexname, language=lang, attribute=attrname, scans=scans, tuples_read=tuples_read, size=size,
+                    pending_pages=None, pending_tuples=None)
+        if has_pgstattuple:
+            stat["pending_pages"], stat["pending_tuples"] = _core.db.session.execute(_sqlalchemy.text(
+                "SELECT pending_pages, pending_tuples FROM pgstatginindex(CAST(:index AS regclass))"),
+                {"index": "{}.{}".format(_DB_SCHEMA_NAME, indexname)}).fetchone()
+        stats.append(stat)
+    return stats
+
+
+def check_attribute_search_indexes():
+    """Logs a warning for missing attribute search indexes, intended to be run at startup"""
+    missing, unneeded = get_attribute_search_index_changes()
+    if missing:
+        logg.warning("%s attribute search indexes are missing (%s), searching these attributes is slow. "
+                     "Create them with 'bin/manage.py searchindex sync'",
+                     len(missing), ", ".join(sorted(set(u"{}/{}".format(*v) for v in missing.itervalues()))))
+    if unneeded:
+        logg.info("%s attribute search indexes are not needed anymore", len(unneeded))
+    _core.db.session.rollback()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Indexes for the sort orders used by content lists.
+web.frontend.content sorts by the sortfields of a container (or the request) and the node id
+and pages with keyset conditions on these values.
+Such queries are only fast if an index matches the complete ORDER BY clause,
+so indexes are derived from the sortfields configured on containers and the sort fields of metadatatypes.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import re as _re
+
+import sqlalchemy as _sqlalchemy
+
+import core as _core
+import core.database.postgres.node as _
+import core.database.postgres.search as _postgres_search
+import utils.utils as _utils
+import utils.locks as _locks
+from core.database.postgres import DB_SCHEMA_NAME as _DB_SCHEMA_NAME
+
+logg = logging.getLogger(__name__)
+
+SORT_INDEX_PREFIX = "ix_sort_node"
+
+# sortfields that are node columns, see web.frontend.content.node_value_expression
+_COLUMN_SORTFIELDS = {
+    "node.id": "id",
+    "node.orderpos": "orderpos",
+    "node.name": "name",
+    "nodename": "name",
+}
+
+
+def sortfields_to_spec(sortfields):
+    """
+    Returns the (name, order) pairs of the ORDER BY clause web.frontend.content builds for `sortfields`,
+    a sequence of sortfield names with optional leading "-" for descending order.
+    """
+    spec = []
+    for sortfield in sortfields:
+        if sortfield.startswith("-"):
+            spec.append((sortfield[1:], "desc"))
+        else:
+            spec.append((sortfield, "asc"))
+    # like prepare_sortfields: the node id makes the order unique
+    if "node.id" not in [name for name, _ in spec]:
+        spec.append(("node.id", "desc"))
+    return tuple(spec)
+
+
+def _index_name(spec):
+    name = _re.sub(r"[^a-zA-Z0-9_]", "_", u"__".join(u"{}_{}".format(name, order) for name, order in spec))
+    return _utils.make_db_auto_name(SORT_INDEX_PREFIX, "index", name)
+
+
+def _index_columns(spec):
+    """Returns the column list of the index for `spec` and the bind parameters for attribute names"""
+    columns = []
+    params = {}
+    for pos, (name, order) in enumerate(spec):
+        if name in _COLUMN_SORTFIELDS:
+            columns.append(u"{} {}".format(_COLUMN_SORTFIELDS[name], order.upper()))
+        else:
+            # attributes are sorted with NULLS LAST in the forward direction, see apply_order_by_for_sortfields
+            params["attr{}".format(pos)] = name
+            columns.append(u"{}.jsonb_limit_to_size(attrs -> :attr{}) {} NULLS LAST".format(_DB_SCHEMA_NAME, pos, order.upper()))
+    return u", ".join(columns), params
+
+
+def get_configured_sort_specs():
+    """
+    Returns a dict mapping the sort specs (see `sortfields_to_spec`) that should be indexed
+    to the ids of the containers using them as sortfield.
+    Sort choices offered by the sort fields of metadatatypes have no containers.
+    """
+    from schema.schema import Metafield
+    Node = _core.database.postgres.node.Node
+    specs = {}
+
+    for nid, sortfield in _core.db.query(Node.id, Node.a.sortfield).filter(Node.a.sortfield != None):
+        sortfield = sortfield.strip()
+        if sortfield and sortfield != u"off":
+            specs.setdefault(sortfields_to_spec([sortfield]), []).append(nid)
+
+    for name, in _core.db.query(Metafield.name).filter(Metafield.a.opts.like(u"%o%")).distinct():
+        for sortfield in (name, u"-" + name):
+            specs.setdefault(sortfields_to_spec([sortfield]), [])
+
+    # sorting by the node id only is covered by the primary key
+    specs.pop(sortfields_to_spec([u"-node.id"]), None)
+    specs.pop(sortfields_to_spec([u"node.id"]), None)
+    return specs
+
+
+def get_sort_index_changes():
+    """
+    Returns a dict mapping the names of missing (or invalid) sort indexes to (spec, container ids)
+    and the set of names of existing sort indexes that are not needed anymore.
+    """
+    wanted = {_index_name(spec): (spec, nids) for spec, nids in get_configured_sort_specs().iteritems()}
+    current = _postgres_search.get_auto_indexes_node(SORT_INDEX_PREFIX)
+    missing = {indexname: v for indexname, v in wanted.iteritems() if not current.get(indexname)}
+    unneeded = set(current) - set(wanted)
+    return missing, unneeded
+
+
+def sync_sort_indexes(drop_unneeded=True):
+    """
+    Creates missing sort indexes and drops unneeded ones, concurrently.
+    Returns the lists of created and dropped index names.
+    """
+    created = []
+    dropped = []
+    with _locks.named_lock('createsortindices'):
+        missing, unneeded = get_sort_index_changes()
+        _core.db.session.rollback()
+        # concurrent index operations cannot run inside a transaction block
+        conn = _core.db.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            for indexname, (spec, _) in sorted(missing.iteritems()):
+                columns, params = _index_columns(spec)
+                logg.info("creating sort index %s for %s", indexname, spec)
+                # remove invalid leftovers of failed builds
+                conn.execute("DROP INDEX CONCURRENTLY IF EXISTS {}.{}".format(_DB_SCHEMA_NAME, indexname))
+                conn.execute(_sqlalchemy.text(u"CREATE INDEX CONCURRENTLY {} ON {}.node ({})".format(
+                    indexname, _DB_SCHEMA_NAME, columns)), **params)
+                created.append(indexname)
+
+            if drop_unneeded:
+                for indexname in sorted(unneeded):
+                    logg.info("dropping unneeded sort index %s", indexname)
+                    conn.execute("DROP INDEX CONCURRENTLY IF EXISTS {}.{}".format(_DB_SCHEMA_NAME, indexname))
+                    dropped.append(indexname)
+        finally:
+            conn.close()
+
+    return created, dropped
+
+
+def get_sort_index_stats():
+    """Returns a list of (index name, scans, size in bytes) for all sort indexes"""
+    res = _core.db.session.execute(_sqlalchemy.text(
+        "SELECT indexrelname, idx_scan, pg_relation_size(indexrelid) "
+        "FROM pg_stat_user_indexes WHERE schemaname = :schema AND indexrelname LIKE :prefix ORDER BY indexrelname"),
+        {"schema": _DB_SCHEMA_NAME, "prefix": _utils.make_db_auto_prefix(SORT_INDEX_PREFIX) + "%"})
+    return res.fetchall()
+
+
+def check_sort_indexes():
+    """Logs a warning for each sort order used by containers that has no index, intended to be run at startup"""
+    missing, _ = get_sort_index_changes()
+    for spec, nids in sorted(missing.itervalues()):
+        if nids:
+            logg.warning("containers %s sort by %s without index, paging is slow. "
+                         "Create sort indexes with 'bin/manage.py sortindex sync'",
+                         ", ".join(str(nid) for nid in sorted(nids)[:10]) + (", ..." if len(nids) > 10 else ""),
+                         ", ".join(u"{} {}".format(name, order) for name, order in spec))
+    _core.db.session.rollback()
@@ -29,35 +29,33 @@ END;
 $f$;
 
 
+-- Deletes the nodes `node_ids` (and all nodes below them if `recursive`).
+-- Their mappings are removed set-based with apply_mapping_changes() before the nodes are deleted.
 CREATE OR REPLACE FUNCTION delete_nodes(node_ids integer[], recursive bool = false) RETURNS integer
     LANGUAGE plpgsql
     SET search_path = :search_path
     AS $f$
 DECLARE
     deleted_nodes integer;
-    subtree_ids integer[];
     ids_to_delete integer[];
 BEGIN
 
     IF recursive THEN
-        SELECT array_agg(cid) INTO subtree_ids FROM noderelation WHERE nid IN (SELECT unnest(node_ids));
-        ids_to_delete = array_cat(subtree_ids, node_ids);
-        SET CONSTRAINTS ALL DEFERRED;
+        SELECT array_agg(DISTINCT q.id) INTO ids_to_delete
+        FROM (SELECT unnest(node_ids) AS id UNION SELECT cid FROM noderelation WHERE nid = ANY(node_ids)) q;
     ELSE
         ids_to_delete = node_ids;
     END IF;
 
-    WITH del_rel AS
-       (DELETE FROM nodemapping
-        WHERE cid IN (SELECT unnest(ids_to_delete))
-        RETURNING cid AS id),
+    PERFORM stage_mapping_changes('delete', array_agg(nid), array_agg(cid))
+    FROM noderelation
+    WHERE distance = 1
+    AND (nid = ANY(ids_to_delete) OR cid = ANY(ids_to_delete));
 
-    del_node AS
-        (DELETE FROM node
-        WHERE id IN (SELECT * FROM del_rel)
-        RETURNING *)
+    PERFORM apply_mapping_changes();
 
-    SELECT count(*) INTO deleted_nodes FROM del_node;
+    DELETE FROM node WHERE id = ANY(ids_to_delete);
+    GET DIAGNOSTICS deleted_nodes = ROW_COUNT;
     RETURN deleted_nodes;
 END;
 $f$;
@@ -368,48 +368,128 @@ END;
 $f$;
 
 
+-- Updates the inherited access rules of all `node_ids`, see _update_inherited_rules_for_nodes
+CREATE OR REPLACE FUNCTION update_inherited_access_rules_for_nodes(node_ids integer[])
+    RETURNS void
+    LANGUAGE plpgsql
+    SET search_path TO :search_path
+    VOLATILE
+AS $f$
+BEGIN
+    PERFORM _update_inherited_rules_for_nodes(node_ids, 'read');
+    PERFORM _update_inherited_rules_for_nodes(node_ids, 'write');
+    PERFORM _update_inherited_rules_for_nodes(node_ids, 'data');
+END;
+$f$;
+
+
 --- trigger functions for access rules
 
 
+-- Recomputes the inherited rules of type `ruletype_` for all `node_ids` at once.
+-- Nodes in `node_ids` inherit the recomputed rules of their ancestors in `node_ids`
+-- and the stored rules of all other ancestors.
+-- Read-type rules are inherited from the parents, unless a ruleset of the type blocks inheritance;
+-- nodes with own read-type rules are left unchanged.
+-- Write-type rules are inherited from all ancestors, except rules the node has itself.
+-- Only the difference to the stored inherited rules is deleted and inserted.
+CREATE OR REPLACE FUNCTION _update_inherited_rules_for_nodes(node_ids integer[], ruletype_ text)
+    RETURNS void
+    LANGUAGE plpgsql
+    SET search_path TO :search_path
+    VOLATILE
+AS $f$
+BEGIN
+    DROP TABLE IF EXISTS pg_temp.inherited_rules_target;
+    CREATE TEMPORARY TABLE inherited_rules_target ON COMMIT DROP AS
+    SELECT u.id,
+           EXISTS (SELECT FROM node_to_access_ruleset WHERE nid=u.id AND ruletype=ruletype_) AS has_ruleset,
+           EXISTS (SELECT FROM node_to_access_rule WHERE nid=u.id AND ruletype=ruletype_ AND NOT inherited) AS has_own_rules
+    FROM (SELECT DISTINCT unnest(node_ids) AS id) u;
+
+    IF ruletype_ IN ('read', 'data') THEN
+        DELETE FROM pg_temp.inherited_rules_target WHERE has_own_rules;
+    END IF;
+
+    ANALYZE pg_temp.inherited_rules_target;
+
+    DROP TABLE IF EXISTS pg_temp.inherited_rules_new;
+    IF ruletype_ IN ('read', 'data') THEN
+        CREATE TEMPORARY TABLE inherited_rules_new ON COMMIT DROP AS
+        WITH RECURSIVE r(nid, rule_id, invert) AS (
+            -- rules of parents that are not recomputed
+            SELECT m.cid, na.rule_id, na.invert
+            FROM pg_temp.inherited_rules_target t
+            JOIN noderelation m ON m.cid=t.id AND m.distance=1
+            JOIN node_to_access_rule na ON na.nid=m.nid AND na.ruletype=ruletype_
+            WHERE NOT t.has_ruleset
+            AND NOT EXISTS (SELECT FROM pg_temp.inherited_rules_target p WHERE p.id=m.nid)
+        UNION
+            -- rules of recomputed parents
+            SELECT m.cid, r.rule_id, r.invert
+            FROM r
+            JOIN noderelation m ON m.nid=r.nid AND m.distance=1
+            JOIN pg_temp.inherited_rules_target t ON t.id=m.cid
+            WHERE NOT t.has_ruleset
+        )
+        SELECT r.nid, r.rule_id, ruletype_ AS ruletype, r.invert, TRUE AS inherited, FALSE AS blocking
+        FROM r;
+    ELSE
+        CREATE TEMPORARY TABLE inherited_rules_new ON COMMIT DROP AS
+        SELECT DISTINCT t.id AS nid, na.rule_id, ruletype_ AS ruletype, na.invert, TRUE AS inherited, na.blocking
+        FROM pg_temp.inherited_rules_target t
+        JOIN noderelation nr ON nr.cid=t.id
+        JOIN node_to_access_rule na ON na.nid=nr.nid AND na.ruletype=ruletype_
+        -- rules inherited by recomputed ancestors are inherited from their ancestors directly
+        WHERE (NOT na.inherited OR NOT EXISTS (SELECT FROM pg_temp.inherited_rules_target a WHERE a.id=nr.nid))
+        AND NOT EXISTS (SELECT FROM node_to_access_rule o
+                        WHERE o.nid=t.id
+                        AND o.ruletype=ruletype_
+                        AND NOT o.inherited
+                        AND o.rule_id=na.rule_id
+                        AND o.invert=na.invert);
+    END IF;
+
+    DELETE FROM node_to_access_rule na
+    USING pg_temp.inherited_rules_target t
+    WHERE na.nid=t.id
+    AND na.ruletype=ruletype_
+    AND na.inherited
+    AND NOT EXISTS (SELECT FROM pg_temp.inherited_rules_new n
+                    WHERE n.nid=na.nid
+                    AND n.rule_id=na.rule_id
+                    AND n.invert=na.invert
+                    AND n.blocking IS NOT DISTINCT FROM na.blocking);
+
+    INSERT INTO node_to_access_rule (nid, rule_id, ruletype, invert, inherited, blocking)
+    SELECT n.nid, n.rule_id, n.ruletype, n.invert, n.inherited, n.blocking
+    FROM pg_temp.inherited_rules_new n
+    ON CONFLICT DO NOTHING;
+
+    DROP TABLE pg_temp.inherited_rules_new;
+    DROP TABLE pg_temp.inherited_rules_target;
+END;
+$f$;
+
+
 CREATE OR REPLACE FUNCTION _update_children_inherited_rules(node_id integer, ruletype_ text)
     RETURNS void
     LANGUAGE plpgsql
     SET search_path TO :search_path
     VOLATILE
 AS $f$
-DECLARE
-    childrel record;
-    rec node_to_access_rule;
 BEGIN
     IF ruletype_ IN ('read', 'data') THEN
         IF NOT EXISTS (SELECT FROM node_to_access_rule WHERE node_to_access_rule.nid=node_id AND node_to_access_rule.ruletype=ruletype_) THEN
             INSERT INTO node_to_access_rule SELECT * FROM _inherited_access_rules_read_type(node_id, ruletype_);
         END IF;
-        FOR childrel IN SELECT cid, max(distance) AS distance FROM noderelation WHERE noderelation.nid=node_id GROUP BY cid ORDER BY max(distance) LOOP
-            -- ignore nodes that have their own access rules
-            IF NOT EXISTS (SELECT FROM node_to_access_rule WHERE node_to_access_rule.nid=childrel.cid AND node_to_access_rule.ruletype=ruletype_ AND NOT node_to_access_rule.inherited) THEN
-                DELETE            FROM node_to_access_rule WHERE node_to_access_rule.nid=childrel.cid AND node_to_access_rule.ruletype=ruletype_ AND node_to_access_rule.inherited;
-                INSERT INTO node_to_access_rule SELECT * from _inherited_access_rules_read_type(childrel.cid, ruletype_);
-            END IF;
-        END LOOP;
     ELSE
         -- if a not-inherited rule got deleted, we might have to add its inherited
         -- pendant which was previously barred from being part of the rules
         INSERT INTO node_to_access_rule (SELECT * from inherited_access_rules_write(node_id) EXCEPT SELECT nid, rule_id, ruletype, invert, true, blocking FROM node_to_access_rule WHERE nid=node_id);
-        FOR childrel IN SELECT cid, max(distance) AS distance FROM noderelation WHERE noderelation.nid=node_id GROUP BY cid ORDER BY max(distance) LOOP
-            DELETE FROM node_to_access_rule WHERE node_to_access_rule.nid=childrel.cid AND node_to_access_rule.ruletype=ruletype_ AND node_to_access_rule.inherited;
-            INSERT INTO node_to_access_rule
-                SELECT * from inherited_access_rules_write(childrel.cid) AS rules
-                WHERE NOT EXISTS (
-                    SELECT FROM node_to_access_rule WHERE
-                            node_to_access_rule.nid=rules.nid
-                        AND node_to_access_rule.rule_id=rules.rule_id
-                        AND node_to_access_rule.invert=rules.invert
-                        AND node_to_access_rule.ruletype=ruletype_
-                   )
-               ;
-        END LOOP;
     END IF;
+
+    PERFORM _update_inherited_rules_for_nodes(ARRAY(SELECT DISTINCT cid FROM noderelation WHERE noderelation.nid=node_id), ruletype_);
 END;
 $f$;
 
@@ -859,3 +939,142 @@ BEGIN
 RETURN group_names;
 END;
 $f$;
+
+
+----
+-- access signature index for read-type rules
+--
+-- Nodes with the same set of (rule_id, invert) pairs for a ruletype share an access signature.
+-- The rules of all signatures are checked once per query instead of once per node,
+-- filtering nodes is then a semi-join on node_to_access_signature.
+----
+
+CREATE OR REPLACE FUNCTION _node_access_signatures(_nids integer[])
+    RETURNS TABLE (nid integer, ruletype text, rule_ids integer[], inverts boolean[])
+    LANGUAGE sql
+    SET search_path TO :search_path
+    STABLE
+AS $f$
+    SELECT r.nid, r.ruletype,
+           array_agg(r.rule_id ORDER BY r.rule_id, r.invert),
+           array_agg(r.invert ORDER BY r.rule_id, r.invert)
+    FROM (SELECT DISTINCT na.nid, na.ruletype, na.rule_id, na.invert
+          FROM node_to_access_rule na
+          WHERE na.ruletype IN ('read', 'data')
+          AND (_nids IS NULL OR na.nid = ANY(_nids))) r
+    GROUP BY r.nid, r.ruletype;
+$f$;
+
+
+CREATE OR REPLACE FUNCTION update_access_signatures(_nids integer[])
+    RETURNS void
+    LANGUAGE plpgsql
+    SET search_path TO :search_path
+    VOLATILE
+AS $f$
+BEGIN
+    INSERT INTO access_signature (ruletype, rule_ids, inverts)
+    SELECT DISTINCT s.ruletype, s.rule_ids, s.inverts
+    FROM _node_access_signatures(_nids) s
+    ON CONFLICT DO NOTHING;
+
+    DELETE FROM node_to_access_signature WHERE nid = ANY(_nids);
+
+    INSERT INTO node_to_access_signature (nid, ruletype, signature_id)
+    SELECT s.nid, s.ruletype, a.id
+    FROM _node_access_signatures(_nids) s
+    JOIN access_signature a ON a.ruletype = s.ruletype AND a.rule_ids = s.rule_ids AND a.inverts = s.inverts;
+END;
+$f$;
+
+
+CREATE OR REPLACE FUNCTION rebuild_access_signatures()
+    RETURNS integer
+    LANGUAGE plpgsql
+    SET search_path TO :search_path
+    VOLATILE
+AS $f$
+DECLARE
+    rows integer;
+BEGIN
+    TRUNCATE node_to_access_signature, access_signature;
+
+    INSERT INTO access_signature (ruletype, rule_ids, inverts)
+    SELECT DISTINCT s.ruletype, s.rule_ids, s.inverts
+    FROM _node_access_signatures(NULL) s;
+
+    INSERT INTO node_to_access_signature (nid, ruletype, signature_id)
+    SELECT s.nid, s.ruletype, a.id
+    FROM _node_access_signatures(NULL) s
+    JOIN access_signature a ON a.ruletype = s.ruletype AND a.rule_ids = s.rule_ids AND a.inverts = s.inverts;
+
+    GET DIAGNOSTICS rows = ROW_COUNT;
+    RETURN rows;
+END;
+$f$;
+
+
+CREATE OR REPLACE FUNCTION accessible_access_signatures(_ruletype text, _group_ids integer[] = NULL, ipaddr inet = NULL, _date date = NULL)
+    RETURNS integer[]
+    LANGUAGE plpgsql
+    SET search_path TO :search_path
+    STABLE
+AS $f$
+BEGIN
+RETURN (
+    WITH rule_results AS (
+        SELECT a.id, check_access_rule(a, _group_ids, ipaddr, _date) AS result
+        FROM access_rule a)
+    SELECT coalesce(array_agg(s.id), '{}')
+    FROM access_signature s
+    WHERE s.ruletype = _ruletype
+    AND EXISTS (
+        SELECT FROM unnest(s.rule_ids, s.inverts) AS r(rule_id, invert)
+        JOIN rule_results rr ON rr.id = r.rule_id
+        WHERE r.invert != rr.result));
+END;
+$f$;
+
+
+-- nodes whose entry in the signature index differs from their current rules, should return nothing
+CREATE OR REPLACE FUNCTION integrity_check_access_signatures()
+    RETURNS TABLE (nid integer, ruletype text)
+    LANGUAGE plpgsql
+    SET search_path TO :search_path
+    STABLE
+AS $f$
+BEGIN
+RETURN QUERY
+    SELECT s.nid, s.ruletype
+    FROM _node_access_signatures(NULL) s
+    LEFT JOIN node_to_access_signature ns ON ns.nid = s.nid AND ns.ruletype = s.ruletype
+    LEFT JOIN access_signature a ON a.id = ns.signature_id
+    WHERE a.id IS NULL OR a.rule_ids != s.rule_ids OR a.inverts != s.inverts
+    UNION ALL
+    SELECT ns.nid, ns.ruletype
+    FROM node_to_access_signature ns
+    WHERE NOT EXISTS (SELECT FROM node_to_access_rule na
+                      WHERE na.nid = ns.nid AND na.ruletype = ns.ruletype);
+END;
+$f$;
+
+
+CREATE OR REPLACE FUNCTION on_node_to_access_rule_change_signature()
+    RETURNS trigger
+    LANGUAGE plpgsql
+    SET search_path TO :search_path
+    VOLATILE
+AS $f$
+BEGIN
+IF TG_OP = 'INSERT' THEN
+    PERFORM update_access_signatures(ARRAY(SELECT DISTINCT nid FROM new_rules WHERE ruletype IN ('read', 'data')));
+ELSIF TG_OP = 'DELETE' THEN
+    PERFORM update_access_signatures(ARRAY(SELECT DISTINCT nid FROM old_rules WHERE ruletype IN ('read', 'data')));
+ELSE
+    PERFORM update_access_signatures(ARRAY(SELECT nid FROM old_rules WHERE ruletype IN ('read', 'data')
+                                           UNION
+                                           SELECT nid FROM new_rules WHERE ruletype IN ('read', 'data')));
+END IF;
+RETURN NULL;
+END;
+$f$;
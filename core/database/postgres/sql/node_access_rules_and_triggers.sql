@@ -50,3 +50,27 @@ CREATE TRIGGER access_ruleset_to_rule_delete_empty_private_rulesets
 AFTER DELETE ON :search_path.access_ruleset_to_rule
 FOR EACH ROW 
 EXECUTE PROCEDURE :search_path.on_access_ruleset_to_rule_delete_delete_empty_private_rulesets();
+
+
+DROP TRIGGER IF EXISTS node_to_access_rule_insert_signature on :search_path.node_to_access_rule;
+CREATE TRIGGER node_to_access_rule_insert_signature
+AFTER INSERT ON :search_path.node_to_access_rule
+REFERENCING NEW TABLE AS new_rules
+FOR EACH STATEMENT
+EXECUTE PROCEDURE :search_path.on_node_to_access_rule_change_signature();
+
+
+DROP TRIGGER IF EXISTS node_to_access_rule_update_signature on :search_path.node_to_access_rule;
+CREATE TRIGGER node_to_access_rule_update_signature
+AFTER UPDATE ON :search_path.node_to_access_rule
+REFERENCING OLD TABLE AS old_rules NEW TABLE AS new_rules
+FOR EACH STATEMENT
+EXECUTE PROCEDURE :search_path.on_node_to_access_rule_change_signature();
+
+
+DROP TRIGGER IF EXISTS node_to_access_rule_delete_signature on :search_path.node_to_access_rule;
+CREATE TRIGGER node_to_access_rule_delete_signature
+AFTER DELETE ON :search_path.node_to_access_rule
+REFERENCING OLD TABLE AS old_rules
+FOR EACH STATEMENT
+EXECUTE PROCEDURE :search_path.on_node_to_access_rule_change_signature();
@@ -281,55 +281,73 @@ END;
 $f$;
 
 
--- Recalculate all connections for nodes under `root_id`
-CREATE OR REPLACE FUNCTION recalculate_relation_subtree(root_id integer, OUT inserted integer, OUT deleted integer, OUT affected_relations integer) RETURNS record
+-- Recalculates the transitive connections (distance > 1) ending at the nodes `node_ids`
+-- from the direct connections, in one recursive query for all nodes.
+-- Only the difference to the existing connections is deleted and inserted.
+CREATE OR REPLACE FUNCTION recalculate_relations(node_ids integer[], OUT inserted integer, OUT deleted integer) RETURNS record
     LANGUAGE plpgsql
     SET search_path = :search_path
     AS $f$
-DECLARE
-	rel RECORD;
-	ins integer;
-	del integer;
 BEGIN
+    DROP TABLE IF EXISTS pg_temp.noderelation_recalculated;
+    CREATE TEMPORARY TABLE noderelation_recalculated ON COMMIT DROP AS
+    WITH RECURSIVE t(nid, cid, distance) AS (
+        SELECT nr.nid, nr.cid, 1
+        FROM noderelation nr
+        WHERE nr.cid = ANY(node_ids)
+        AND nr.distance = 1
+    UNION
+        SELECT nr.nid, t.cid, t.distance + 1
+        FROM t, noderelation nr
+        WHERE nr.cid = t.nid
+        AND nr.distance = 1
+    )
+    SELECT t.nid, t.cid, t.distance FROM t WHERE t.distance > 1;
 
-deleted := 0;
-inserted := 0;
-affected_relations := 0;
+    ANALYZE pg_temp.noderelation_recalculated;
 
--- LOCK TABLE noderelation IN EXCLUSIVE MODE;
+    DELETE FROM noderelation nr
+    WHERE nr.cid = ANY(node_ids)
+    AND nr.distance > 1
+    AND NOT EXISTS (SELECT FROM pg_temp.noderelation_recalculated r
+                    WHERE r.nid = nr.nid AND r.cid = nr.cid AND r.distance = nr.distance);
+    GET DIAGNOSTICS deleted = ROW_COUNT;
 
--- check all connections to children of root
-FOR rel IN SELECT cid, distance FROM noderelation WHERE nid = root_id LOOP
-    
-    -- RAISE DEBUG 'DELETE FROM noderelation nr WHERE nr.cid = % AND nr.distance > %', rel.cid, rel.distance;
+    INSERT INTO noderelation (nid, cid, distance)
+    SELECT r.nid, r.cid, r.distance
+    FROM pg_temp.noderelation_recalculated r
+    WHERE NOT EXISTS (SELECT FROM noderelation nr
+                      WHERE nr.nid = r.nid AND nr.cid = r.cid AND nr.distance = r.distance);
+    GET DIAGNOSTICS inserted = ROW_COUNT;
 
-	-- only delete tuples belonging to paths which could go through root_id
-	DELETE FROM noderelation nr 
-	WHERE nr.cid = rel.cid 
-	AND nr.distance > rel.distance
-	;
-	GET DIAGNOSTICS del = ROW_COUNT;
+    DROP TABLE pg_temp.noderelation_recalculated;
+END;
+$f$;
 
-    -- RAISE DEBUG 'INSERT INTO noderelation SELECT DISTINCT * FROM transitive_closure_for_node(%)', rel.cid;
 
-	INSERT INTO noderelation
-    SELECT DISTINCT * FROM transitive_closure_for_node(rel.cid)
-	WHERE distance > rel.distance
-    ;
-	 GET DIAGNOSTICS ins = ROW_COUNT;
+-- Recalculate all connections for nodes under `root_id`
+-- `affected_relations` is the number of connections from `root_id` to its descendants.
+CREATE OR REPLACE FUNCTION recalculate_relation_subtree(root_id integer, OUT inserted integer, OUT deleted integer, OUT affected_relations integer) RETURNS record
+    LANGUAGE plpgsql
+    SET search_path = :search_path
+    AS $f$
+DECLARE
+    descendant_ids integer[];
+BEGIN
+    inserted := 0;
+    deleted := 0;
 
-	-- RAISE DEBUG 'cid % distance %, deleted %, inserted %', rel.cid, rel.distance, del, ins;
-    
-	inserted := inserted + ins;
-	deleted := deleted + del;
-	affected_relations := affected_relations + 1;
+    SELECT array_agg(DISTINCT cid), count(*) INTO descendant_ids, affected_relations
+    FROM noderelation
+    WHERE nid = root_id;
 
-END LOOP;
+    IF descendant_ids IS NULL THEN
+        RETURN;
+    END IF;
 
-FOR rel IN SELECT cid, max(distance) AS distance FROM noderelation WHERE nid = root_id GROUP BY cid ORDER BY max(distance) LOOP
-    PERFORM update_inherited_access_rules_for_node(rel.cid);
-END LOOP;
+    SELECT r.inserted, r.deleted INTO inserted, deleted FROM recalculate_relations(descendant_ids) r;
 
+    PERFORM update_inherited_access_rules_for_nodes(descendant_ids);
 END;
 $f$;
 
@@ -353,6 +371,9 @@ IF (SELECT type IN (SELECT name FROM nodetype WHERE is_container = false) FROM n
     UPDATE node SET subnode = true WHERE id = NEW.cid;
 END IF;
 
+-- count content nodes below `cid` for the new parent and its ancestors before connecting them
+PERFORM update_container_childcount(NEW.nid, NEW.cid, 1);
+
 -- copy connections from new parent (nid)
 INSERT INTO noderelation 
 SELECT * FROM extend_relation_to_parents(NEW.nid, NEW.cid) f
@@ -392,6 +413,9 @@ SELECT DISTINCT * FROM transitive_closure_for_node(OLD.cid) WHERE distance > 1;
 PERFORM update_inherited_access_rules_for_node(OLD.cid);
 PERFORM recalculate_relation_subtree(OLD.cid);
 
+-- uncount content nodes below `cid` that aren't connected to the old parent and its ancestors anymore
+PERFORM update_container_childcount(OLD.nid, OLD.cid, -1);
+
 -- check if old parent and child are content nodes (is_container = false)
 IF (SELECT type IN (SELECT name FROM nodetype WHERE is_container = false) FROM node WHERE id=OLD.nid)
 AND (SELECT type IN (SELECT name FROM nodetype WHERE is_container = false) FROM node WHERE id=OLD.cid) THEN
@@ -407,6 +431,154 @@ END;
 $f$;
 
 
+-- Records mapping changes (`_op` 'insert' or 'delete' of parent `_nids[i]` -> child `_cids[i]`)
+-- in the transaction-local staging table nodemapping_change, to be applied by apply_mapping_changes().
+CREATE OR REPLACE FUNCTION stage_mapping_changes(_op text, _nids integer[], _cids integer[]) RETURNS void
+    LANGUAGE plpgsql
+    SET search_path = :search_path
+    AS $f$
+BEGIN
+    IF _op NOT IN ('insert', 'delete') THEN
+        RAISE EXCEPTION 'invalid mapping change operation %', _op;
+    END IF;
+
+    CREATE TEMPORARY TABLE IF NOT EXISTS nodemapping_change (
+        seq serial,
+        nid integer NOT NULL,
+        cid integer NOT NULL,
+        op text NOT NULL
+    ) ON COMMIT DROP;
+
+    INSERT INTO pg_temp.nodemapping_change (nid, cid, op)
+    SELECT u.nid, u.cid, _op FROM unnest(_nids, _cids) AS u(nid, cid);
+END;
+$f$;
+
+
+-- Applies the mapping changes staged by stage_mapping_changes() set-based, without the nodemapping triggers:
+-- the direct connections are changed, the transitive connections of all nodes below changed mappings
+-- are recalculated at once, and inherited access rules and container child counts are updated once per node.
+-- If a mapping is staged more than once, the last change wins.
+CREATE OR REPLACE FUNCTION apply_mapping_changes(OUT inserted integer, OUT deleted integer, OUT affected_nodes integer) RETURNS record
+    LANGUAGE plpgsql
+    SET search_path = :search_path
+    AS $f$
+DECLARE
+    affected integer[];
+BEGIN
+    inserted := 0;
+    deleted := 0;
+    affected_nodes := 0;
+
+    IF to_regclass('pg_temp.nodemapping_change') IS NULL THEN
+        RETURN;
+    END IF;
+
+    DROP TABLE IF EXISTS pg_temp.nodemapping_net_change;
+    CREATE TEMPORARY TABLE nodemapping_net_change ON COMMIT DROP AS
+    SELECT DISTINCT ON (c.nid, c.cid) c.nid, c.cid, c.op
+    FROM pg_temp.nodemapping_change c
+    ORDER BY c.nid, c.cid, c.seq DESC;
+
+    DELETE FROM pg_temp.nodemapping_change;
+
+    -- ignore changes that don't change anything
+    DELETE FROM pg_temp.nodemapping_net_change m
+    WHERE (m.op = 'insert') = EXISTS (SELECT FROM noderelation WHERE nid = m.nid AND cid = m.cid AND distance = 1);
+
+    IF EXISTS (SELECT FROM pg_temp.nodemapping_net_change m
+               WHERE m.op = 'insert'
+               AND (m.nid = m.cid OR EXISTS (SELECT FROM noderelation WHERE nid = m.cid AND cid = m.nid))) THEN
+        RAISE EXCEPTION 'mapping changes would create a cycle';
+    END IF;
+
+    -- the ancestors change for the children of changed mappings and their subtrees
+    SELECT array_agg(DISTINCT q.id) INTO affected
+    FROM (SELECT m.cid AS id FROM pg_temp.nodemapping_net_change m
+          UNION
+          SELECT nr.cid FROM noderelation nr JOIN pg_temp.nodemapping_net_change m ON nr.nid = m.cid) q;
+
+    IF affected IS NULL THEN
+        RETURN;
+    END IF;
+    affected_nodes := cardinality(affected);
+
+    -- content nodes added to content nodes become subnodes before they are counted
+    -- (the node trigger removes them from the child counts of their current ancestors)
+    UPDATE node SET subnode = true
+    WHERE id IN (SELECT m.cid FROM pg_temp.nodemapping_net_change m JOIN node p ON p.id = m.nid
+                 WHERE m.op = 'insert' AND p.type IN (SELECT name FROM nodetype WHERE is_container = false))
+    AND NOT subnode;
+
+    -- counted (container, content node) pairs of the affected nodes before the change
+    DROP TABLE IF EXISTS pg_temp.nodemapping_counted_before;
+    CREATE TEMPORARY TABLE nodemapping_counted_before ON COMMIT DROP AS
+    SELECT DISTINCT nr.nid, nr.cid
+    FROM noderelation nr
+    JOIN node p ON p.id = nr.nid
+    JOIN node c ON c.id = nr.cid
+    WHERE nr.cid = ANY(affected)
+    AND p.type IN (SELECT name FROM nodetype WHERE is_container = true)
+    AND c.type IN (SELECT name FROM nodetype WHERE is_container = false)
+    AND c.subnode = false;
+
+    DELETE FROM noderelation nr
+    USING pg_temp.nodemapping_net_change m
+    WHERE m.op = 'delete' AND nr.nid = m.nid AND nr.cid = m.cid AND nr.distance = 1;
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+
+    INSERT INTO noderelation (nid, cid, distance)
+    SELECT m.nid, m.cid, 1 FROM pg_temp.nodemapping_net_change m WHERE m.op = 'insert';
+    GET DIAGNOSTICS inserted = ROW_COUNT;
+
+    -- new mappings may form a cycle together that none of them forms alone
+    IF inserted > 1 AND EXISTS (
+        WITH RECURSIVE d(start_id, id) AS (
+            SELECT m.nid, m.cid FROM pg_temp.nodemapping_net_change m WHERE m.op = 'insert'
+        UNION
+            SELECT d.start_id, nr.cid
+            FROM d, noderelation nr
+            WHERE nr.nid = d.id
+            AND nr.distance = 1
+            AND d.id != d.start_id
+        )
+        SELECT FROM d WHERE d.id = d.start_id) THEN
+        RAISE EXCEPTION 'mapping changes would create a cycle';
+    END IF;
+
+    -- recalculate all transitive connections ending at affected nodes from the direct connections
+    PERFORM recalculate_relations(affected);
+
+    -- apply the difference of counted pairs to the container child counts
+    INSERT INTO container_childcount AS cc (nid, count)
+    SELECT q.nid, sum(q.d)
+    FROM (SELECT DISTINCT nr.nid, nr.cid, 1 AS d
+          FROM noderelation nr
+          JOIN node p ON p.id = nr.nid
+          JOIN node c ON c.id = nr.cid
+          WHERE nr.cid = ANY(affected)
+          AND p.type IN (SELECT name FROM nodetype WHERE is_container = true)
+          AND c.type IN (SELECT name FROM nodetype WHERE is_container = false)
+          AND c.subnode = false
+          UNION ALL
+          SELECT b.nid, b.cid, -1 FROM pg_temp.nodemapping_counted_before b) q
+    GROUP BY q.nid
+    HAVING sum(q.d) != 0
+    ON CONFLICT (nid) DO UPDATE SET count = cc.count + EXCLUDED.count;
+
+    -- orphaned content subnodes are counted again (by the node trigger)
+    UPDATE node SET subnode = false
+    WHERE id IN (SELECT m.cid FROM pg_temp.nodemapping_net_change m JOIN node p ON p.id = m.nid
+                 WHERE m.op = 'delete' AND p.type IN (SELECT name FROM nodetype WHERE is_container = false))
+    AND subnode
+    AND type IN (SELECT name FROM nodetype WHERE is_container = false)
+    AND NOT EXISTS (SELECT FROM noderelation WHERE cid = node.id AND distance = 1);
+
+    PERFORM update_inherited_access_rules_for_nodes(affected);
+END;
+$f$;
+
+
 CREATE OR REPLACE FUNCTION is_descendant_of(descendant_id integer, node_id integer) RETURNS bool
     LANGUAGE plpgsql
     SET search_path = :search_path
@@ -138,3 +138,154 @@ BEGIN
 RETURN;
 END;
 $$;
+
+
+----
+-- stored tsvectors
+--
+-- node_tsvector holds the tsvectors of node attributes and fulltexts for the autoindex languages,
+-- so searching doesn't have to recompute them for every matching node.
+-- The setting search.stored_tsvectors selects what is stored:
+-- 'none': nothing, 'all': one tsvector per language, 'shortest': only the shortest fulltext tsvector,
+-- 'detected': only the tsvectors of the attribute and fulltext language detected by detect_tsconfig.
+-- The setting search.stored_tsvectors_built holds the mode node_tsvector was last rebuilt for,
+-- searches only use node_tsvector if it matches the current mode.
+----
+
+CREATE OR REPLACE FUNCTION get_stored_tsvectors_mode() RETURNS text
+    LANGUAGE sql
+    SET search_path = :search_path
+    STABLE
+    AS $$
+    SELECT coalesce((SELECT value #>> '{}' FROM setting WHERE key = 'search.stored_tsvectors'), 'none');
+$$;
+
+
+-- Returns the config of `_configs` that reduces a sample of `_text` to the fewest lexemes.
+-- Stop word removal and stemming work best for the language of the text, so that is the detected language.
+-- Ties are resolved by the order of `_configs`. NULL if the text is too short.
+CREATE OR REPLACE FUNCTION detect_tsconfig(_configs text[], _text text) RETURNS text
+    LANGUAGE sql
+    SET search_path = :search_path
+    STABLE
+    AS $$
+    SELECT c.config
+    FROM unnest(_configs) WITH ORDINALITY AS c(config, pos),
+         to_tsvector_safe(c.config::regconfig, left(_text, 20000)) AS t(tsvec)
+    WHERE t.tsvec IS NOT NULL
+    ORDER BY length(t.tsvec), c.pos
+    LIMIT 1;
+$$;
+
+
+CREATE OR REPLACE FUNCTION _node_tsvectors(_nids integer[], _sources text[], _mode text)
+    RETURNS TABLE (nid integer, source text, config text, tsvec tsvector)
+    LANGUAGE sql
+    SET search_path = :search_path
+    STABLE
+    AS $$
+    -- in 'detected' mode, only the tsvector of the detected language is stored, see detect_tsconfig
+    SELECT q.nid, 'attrs', q.config, q.tsvec
+    FROM (SELECT n.id AS nid, l AS config, jsonb_object_values_to_tsvector(l::regconfig, n.attrs) AS tsvec
+          FROM node n,
+               unnest(CASE WHEN _mode = 'detected'
+                           THEN ARRAY[coalesce(detect_tsconfig(get_attribute_autoindex_languages(),
+                                                               (SELECT string_agg(v, ' ') FROM jsonb_each_text(n.attrs) AS a(k, v))),
+                                               (get_attribute_autoindex_languages())[1])]
+                           ELSE get_attribute_autoindex_languages() END) l
+          WHERE (_nids IS NULL OR n.id = ANY(_nids))) q
+    WHERE 'attrs' = ANY(_sources)
+    AND _mode != 'none'
+    AND length(q.tsvec) > 0
+
+    UNION ALL
+
+    -- in 'shortest' mode, keep only the tsvector of the language that stems best
+    (SELECT DISTINCT ON (q.nid, CASE WHEN _mode = 'shortest' THEN NULL ELSE q.config END)
+            q.nid, 'fulltext', q.config, q.tsvec
+     FROM (SELECT n.id AS nid, l AS config, to_tsvector_safe(l::regconfig, n.fulltext) AS tsvec
+           FROM node n,
+                unnest(CASE WHEN _mode = 'detected'
+                            THEN ARRAY[detect_tsconfig(get_fulltext_autoindex_languages(), n.fulltext)]
+                            ELSE get_fulltext_autoindex_languages() END) l
+           WHERE (_nids IS NULL OR n.id = ANY(_nids))
+           AND n.fulltext IS NOT NULL) q
+     WHERE 'fulltext' = ANY(_sources)
+     AND _mode != 'none'
+     AND q.config IS NOT NULL
+     AND q.tsvec IS NOT NULL
+     ORDER BY q.nid, CASE WHEN _mode = 'shortest' THEN NULL ELSE q.config END, length(q.tsvec));
+$$;
+
+
+CREATE OR REPLACE FUNCTION refresh_node_tsvectors(_nids integer[], _sources text[]) RETURNS void
+    LANGUAGE plpgsql
+    SET search_path = :search_path
+    VOLATILE
+    AS $$
+BEGIN
+    DELETE FROM node_tsvector WHERE nid = ANY(_nids) AND source = ANY(_sources);
+
+    INSERT INTO node_tsvector (nid, source, config, tsvec)
+    SELECT * FROM _node_tsvectors(_nids, _sources, get_stored_tsvectors_mode());
+END;
+$$;
+
+
+CREATE OR REPLACE FUNCTION rebuild_node_tsvectors() RETURNS integer
+    LANGUAGE plpgsql
+    SET search_path = :search_path
+    VOLATILE
+    AS $$
+DECLARE
+    rows integer;
+BEGIN
+    TRUNCATE node_tsvector;
+
+    INSERT INTO node_tsvector (nid, source, config, tsvec)
+    SELECT * FROM _node_tsvectors(NULL, '{attrs,fulltext}', get_stored_tsvectors_mode());
+
+    GET DIAGNOSTICS rows = ROW_COUNT;
+
+    INSERT INTO setting (key, value) VALUES ('search.stored_tsvectors_built', to_jsonb(get_stored_tsvectors_mode()))
+    ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value;
+
+    RETURN rows;
+END;
+$$;
+
+
+CREATE OR REPLACE FUNCTION on_node_update_tsvectors() RETURNS trigger
+    LANGUAGE plpgsql
+    SET search_path = :search_path
+    VOLATILE
+    AS $$
+DECLARE
+    sources text[] = '{}';
+BEGIN
+    -- bulk imports set mediatum.defer_tsvectors for their transaction and refresh the tsvectors set-based
+    IF get_stored_tsvectors_mode() = 'none' OR current_setting('mediatum.defer_tsvectors', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'INSERT' OR OLD.attrs IS DISTINCT FROM NEW.attrs THEN
+        sources = sources || 'attrs'::text;
+    END IF;
+
+    IF TG_OP = 'INSERT' OR OLD.fulltext IS DISTINCT FROM NEW.fulltext THEN
+        sources = sources || 'fulltext'::text;
+    END IF;
+
+    IF cardinality(sources) > 0 THEN
+        PERFORM refresh_node_tsvectors(ARRAY[NEW.id], sources);
+    END IF;
+RETURN NULL;
+END;
+$$;
+
+
+DROP TRIGGER IF EXISTS update_node_tsvectors ON :search_path.node;
+CREATE TRIGGER update_node_tsvectors
+AFTER INSERT OR UPDATE OF attrs, fulltext ON :search_path.node
+FOR EACH ROW
+EXECUTE PROCEDURE :search_path.on_node_update_tsvectors();
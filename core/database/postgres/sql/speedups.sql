@@ -32,29 +32,255 @@ END;
 $f$;
 
 
-CREATE MATERIALIZED VIEW IF NOT EXISTS :search_path.container_info AS
-SELECT
-    id AS nid
-    ,(SELECT count(*) FROM :search_path.node JOIN :search_path.noderelation nr ON (id=cid)
-      WHERE nid=no.id
-      AND subnode=false
-      AND type IN (SELECT name FROM nodetype WHERE is_container=false)) AS count_content_children_for_all_subcontainers
+-- Returns the ids of content nodes (without subnodes) in the subtree of `node_id`, including `node_id` itself
+CREATE OR REPLACE FUNCTION content_ids_in_subtree(node_id integer) RETURNS SETOF integer
+    LANGUAGE plpgsql
+    SET search_path = :search_path
+    STABLE
+    AS $f$
+BEGIN
+RETURN QUERY
+    SELECT id FROM node
+    WHERE id IN (SELECT node_id UNION SELECT cid FROM noderelation WHERE nid = node_id)
+    AND subnode = false
+    AND type IN (SELECT name FROM nodetype WHERE is_container = false);
+END;
+$f$;
+
+
+-- Adds `sign` (1 or -1) to the content child counts of `parent_id` and all its container ancestors
+-- for each content node in the subtree of `child_id` that is not connected to the ancestor.
+-- Must be called before the connections from `parent_id` to `child_id` are added (sign = 1)
+-- or after they have been removed (sign = -1).
+CREATE OR REPLACE FUNCTION update_container_childcount(parent_id integer, child_id integer, sign integer) RETURNS void
+    LANGUAGE plpgsql
+    SET search_path = :search_path
+    AS $f$
+BEGIN
+    INSERT INTO container_childcount AS cc (nid, count)
+    SELECT a.id, sign * count(*)
+    FROM (SELECT parent_id AS id UNION SELECT nid FROM noderelation WHERE cid = parent_id) a
+    JOIN node ON node.id = a.id
+    CROSS JOIN content_ids_in_subtree(child_id) c(id)
+    WHERE node.type IN (SELECT name FROM nodetype WHERE is_container = true)
+    AND NOT EXISTS (SELECT FROM noderelation WHERE nid = a.id AND cid = c.id)
+    GROUP BY a.id
+    ON CONFLICT (nid) DO UPDATE SET count = cc.count + EXCLUDED.count;
+END;
+$f$;
+
+
+-- Adds `sign` (1 or -1) to the content child counts of all container ancestors of `node_id`
+CREATE OR REPLACE FUNCTION update_container_childcount_of_ancestors(node_id integer, sign integer) RETURNS void
+    LANGUAGE plpgsql
+    SET search_path = :search_path
+    AS $f$
+BEGIN
+    INSERT INTO container_childcount AS cc (nid, count)
+    SELECT DISTINCT nr.nid, sign
+    FROM noderelation nr
+    JOIN node ON node.id = nr.nid
+    WHERE nr.cid = node_id
+    AND node.type IN (SELECT name FROM nodetype WHERE is_container = true)
+    ON CONFLICT (nid) DO UPDATE SET count = cc.count + EXCLUDED.count;
+END;
+$f$;
+
+
+CREATE OR REPLACE FUNCTION on_node_update_childcount() RETURNS trigger
+    LANGUAGE plpgsql
+    SET search_path = :search_path
+    AS $f$
+DECLARE
+    old_counted boolean;
+    new_counted boolean;
+BEGIN
+    old_counted := NOT OLD.subnode AND OLD.type IN (SELECT name FROM nodetype WHERE is_container = false);
+    new_counted := NOT NEW.subnode AND NEW.type IN (SELECT name FROM nodetype WHERE is_container = false);
+    IF old_counted AND NOT new_counted THEN
+        PERFORM update_container_childcount_of_ancestors(NEW.id, -1);
+    ELSIF new_counted AND NOT old_counted THEN
+        PERFORM update_container_childcount_of_ancestors(NEW.id, 1);
+    END IF;
+    RETURN NEW;
+END;
+$f$;
+
+
+CREATE OR REPLACE FUNCTION on_node_delete_childcount() RETURNS trigger
+    LANGUAGE plpgsql
+    SET search_path = :search_path
+    AS $f$
+BEGIN
+    IF NOT OLD.subnode AND OLD.type IN (SELECT name FROM nodetype WHERE is_container = false) THEN
+        PERFORM update_container_childcount_of_ancestors(OLD.id, -1);
+    END IF;
+    RETURN OLD;
+END;
+$f$;
+
 
-FROM :search_path.node no WHERE no.type IN (SELECT name FROM nodetype WHERE is_container=true);
+DROP TRIGGER IF EXISTS node_update_childcount ON :search_path.node;
+CREATE TRIGGER node_update_childcount
+    AFTER UPDATE OF type, subnode ON :search_path.node
+    FOR EACH ROW
+    WHEN (OLD.type IS DISTINCT FROM NEW.type OR OLD.subnode IS DISTINCT FROM NEW.subnode)
+    EXECUTE PROCEDURE :search_path.on_node_update_childcount();
+
+DROP TRIGGER IF EXISTS node_delete_childcount ON :search_path.node;
+CREATE TRIGGER node_delete_childcount
+    BEFORE DELETE ON :search_path.node
+    FOR EACH ROW
+    EXECUTE PROCEDURE :search_path.on_node_delete_childcount();
+
+
+-- Recalculates all content child counts from scratch.
+-- Blocks changes of noderelation while running, so no concurrent update is lost.
+CREATE OR REPLACE FUNCTION rebuild_container_childcount() RETURNS integer
+    LANGUAGE plpgsql
+    SET search_path = :search_path
+    AS $f$
+DECLARE
+    rows integer;
+BEGIN
+    LOCK TABLE noderelation IN SHARE MODE;
+    DELETE FROM container_childcount;
+    INSERT INTO container_childcount (nid, count)
+    SELECT nr.nid, count(DISTINCT nr.cid)
+    FROM noderelation nr
+    JOIN node p ON p.id = nr.nid
+    JOIN node c ON c.id = nr.cid
+    WHERE p.type IN (SELECT name FROM nodetype WHERE is_container = true)
+    AND c.type IN (SELECT name FROM nodetype WHERE is_container = false)
+    AND c.subnode = false
+    GROUP BY nr.nid;
+    GET DIAGNOSTICS rows = ROW_COUNT;
+    RETURN rows;
+END;
+$f$;
 
--- needed to refresh container_info concurrently
-CREATE UNIQUE INDEX ON container_info (nid);
 
 CREATE OR REPLACE FUNCTION count_content_children_for_all_subcontainers(container_id integer)
     RETURNS integer
     LANGUAGE plpgsql
     SET search_path = :search_path
-    IMMUTABLE
+    STABLE
     AS $f$
 DECLARE
     cc integer;
 BEGIN
-    SELECT count_content_children_for_all_subcontainers INTO cc FROM container_info WHERE nid=container_id;
-    RETURN cc;
+    SELECT count INTO cc FROM container_childcount WHERE nid=container_id;
+    RETURN coalesce(cc, 0);
+END;
+$f$;
+
+
+-- Notifies the listeners of channel mediatum_node_change (see core.nodesnapshots) that the nodes `node_ids` changed.
+-- The payload is a comma separated list of node ids, or '*' if there are too many ids for one notification.
+-- Notifications are delivered on commit, identical notifications of one transaction are sent only once.
+CREATE OR REPLACE FUNCTION notify_node_change(node_ids integer[]) RETURNS void
+    LANGUAGE plpgsql
+    SET search_path = :search_path
+    AS $f$
+BEGIN
+    IF coalesce(cardinality(node_ids), 0) = 0 THEN
+        RETURN;
+    ELSIF cardinality(node_ids) > 500 THEN
+        PERFORM pg_notify('mediatum_node_change', '*');
+    ELSE
+        PERFORM pg_notify('mediatum_node_change', array_to_string(node_ids, ','));
+    END IF;
+END;
+$f$;
+
+
+-- Statement trigger for node, node_to_file, file and noderelation,
+-- collects the ids of the nodes whose cached snapshots are outdated
+CREATE OR REPLACE FUNCTION on_node_change_notify() RETURNS trigger
+    LANGUAGE plpgsql
+    SET search_path = :search_path
+    AS $f$
+BEGIN
+    IF TG_TABLE_NAME = 'node' THEN
+        -- updates and deletes, new nodes cannot be cached yet
+        PERFORM notify_node_change(ARRAY(SELECT id FROM old_rows));
+    ELSIF TG_TABLE_NAME = 'node_to_file' THEN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM notify_node_change(ARRAY(SELECT DISTINCT nid FROM new_rows));
+        ELSIF TG_OP = 'UPDATE' THEN
+            PERFORM notify_node_change(ARRAY(SELECT nid FROM old_rows UNION SELECT nid FROM new_rows));
+        ELSE
+            PERFORM notify_node_change(ARRAY(SELECT DISTINCT nid FROM old_rows));
+        END IF;
+    ELSIF TG_TABLE_NAME = 'file' THEN
+        -- updates, deleted files are unlinked from their nodes before
+        PERFORM notify_node_change(ARRAY(SELECT DISTINCT nid FROM node_to_file WHERE file_id IN (SELECT id FROM old_rows)));
+    ELSIF TG_TABLE_NAME = 'noderelation' THEN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM notify_node_change(ARRAY(SELECT nid FROM new_rows WHERE distance = 1
+                                             UNION SELECT cid FROM new_rows WHERE distance = 1));
+        ELSE
+            PERFORM notify_node_change(ARRAY(SELECT nid FROM old_rows WHERE distance = 1
+                                             UNION SELECT cid FROM old_rows WHERE distance = 1));
+        END IF;
+    END IF;
+    RETURN NULL;
 END;
 $f$;
+
+
+DROP TRIGGER IF EXISTS node_update_notify ON :search_path.node;
+CREATE TRIGGER node_update_notify
+    AFTER UPDATE ON :search_path.node
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE :search_path.on_node_change_notify();
+
+DROP TRIGGER IF EXISTS node_delete_notify ON :search_path.node;
+CREATE TRIGGER node_delete_notify
+    AFTER DELETE ON :search_path.node
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE :search_path.on_node_change_notify();
+
+DROP TRIGGER IF EXISTS node_to_file_insert_notify ON :search_path.node_to_file;
+CREATE TRIGGER node_to_file_insert_notify
+    AFTER INSERT ON :search_path.node_to_file
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE :search_path.on_node_change_notify();
+
+DROP TRIGGER IF EXISTS node_to_file_update_notify ON :search_path.node_to_file;
+CREATE TRIGGER node_to_file_update_notify
+    AFTER UPDATE ON :search_path.node_to_file
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE :search_path.on_node_change_notify();
+
+DROP TRIGGER IF EXISTS node_to_file_delete_notify ON :search_path.node_to_file;
+CREATE TRIGGER node_to_file_delete_notify
+    AFTER DELETE ON :search_path.node_to_file
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE :search_path.on_node_change_notify();
+
+DROP TRIGGER IF EXISTS file_update_notify ON :search_path.file;
+CREATE TRIGGER file_update_notify
+    AFTER UPDATE ON :search_path.file
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE :search_path.on_node_change_notify();
+
+DROP TRIGGER IF EXISTS noderelation_insert_notify ON :search_path.noderelation;
+CREATE TRIGGER noderelation_insert_notify
+    AFTER INSERT ON :search_path.noderelation
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE :search_path.on_node_change_notify();
+
+DROP TRIGGER IF EXISTS noderelation_delete_notify ON :search_path.noderelation;
+CREATE TRIGGER noderelation_delete_notify
+    AFTER DELETE ON :search_path.noderelation
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE :search_path.on_node_change_notify();
@@ -328,6 +328,8 @@ def basic_init(
 def _additional_init():
     from core.database import validity
     from core.database.postgres.search import check_fulltext_attrs_search_indexes_node as _check_fulltext_attrs_search_indexes_node
+    from core.database.postgres.search import check_attribute_search_indexes as _check_attribute_search_indexes
+    from core.database.postgres.sortindex import check_sort_indexes as _check_sort_indexes
     enable_startup_checks = config.getboolean("config.enable_startup_checks", True)
     if enable_startup_checks:
         _core.db.check_db_structure_validity()
@@ -344,10 +346,13 @@ def _additional_init():
         map(_filehandlers.add_web_root, webroots)
     if enable_startup_checks:
         check_undefined_nodeclasses()
+        _check_sort_indexes()
     update_nodetypes_in_db()
     if config.getboolean("search.activate", True):
         init_fulltext_search()
         _check_fulltext_attrs_search_indexes_node()
+        if enable_startup_checks:
+            _check_attribute_search_indexes()
     tal_setup()
     _core_webconfig.init_theme()
     _core.db.session.rollback()
@@ -0,0 +1,234 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Persistent queue for slow tasks that should not block a web request,
+e.g. the generation of thumbnails and fulltexts after an upload.
+Jobs are stored in the job table and processed by bin/mediatum-worker.py.
+Each job type has a concurrency limit that holds across all worker processes,
+failed jobs are retried with increasing delay until `max_attempts` is reached.
+While a worker runs a job, it holds an advisory lock for the job on a connection of its own,
+so jobs of workers that died can be told from jobs that just run for a long time.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import collections as _collections
+import datetime as _datetime
+import logging as _logging
+import os as _os
+import socket as _socket
+import time as _time
+import traceback as _traceback
+
+import sqlalchemy as _sqlalchemy
+
+import core as _core
+import core.config as _core_config
+import core.database.postgres.node as _core_database_postgres_node
+from core.database.postgres.job import Job
+
+_logg = _logging.getLogger(__name__)
+
+JobType = _collections.namedtuple("JobType", "name func concurrency max_attempts retry_delay")
+
+_job_types = _collections.OrderedDict()
+
+
+def register_job_type(name, func, concurrency=1, max_attempts=3, retry_delay=60):
+    """
+    Register `func` as handler for jobs of type `name`; `func` is called with the node of the job.
+    At most `concurrency` jobs of this type run at the same time,
+    the config key `jobqueue.concurrency_<name>` overrides the default.
+    """
+    _job_types[name] = JobType(name, func, concurrency, max_attempts, retry_delay)
+
+
+def is_active():
+    """True if jobs are processed by workers, False if they should be run in the request"""
+    return _core_config.getboolean("jobqueue.activate", False)
+
+
+def enqueue(name, node):
+    """
+    Add a job of type `name` for `node` to the current session.
+    The job becomes visible to the workers when the session is committed.
+    """
+    job_type = _job_types[name]
+    if node.id is None:
+        _core.db.session.flush()
+    job = Job(type=name, node_id=node.id, max_attempts=job_type.max_attempts)
+    _core.db.session.add(job)
+    return job
+
+
+def run_or_enqueue(name, node):
+    """Enqueue a job if the queue is active, else run the handler directly. Returns the job or None."""
+    if is_active():
+        return enqueue(name, node)
+    _job_types[name].func(node)
+
+
+def get_error_summary(error):
+    """
+    Returns the exception class of the traceback `error` (see Job.error), without details,
+    so it can be shown to users. The traceback itself is only logged and stored in the job.
+    """
+    if not error:
+        return None
+    return error.strip().splitlines()[-1].split(u":", 1)[0]
+
+
+def get_job_states(job_ids, parent=None):
+    """
+    Returns a dict mapping job ids to dicts with state, attempts and the last error of the job (see get_error_summary).
+    If `parent` is given, only jobs for children of `parent` are considered.
+    """
+    if not job_ids:
+        return {}
+    jobs = _core.db.query(Job).filter(Job.id.in_(job_ids))
+    if parent is not None:
+        nodemapping = _core_database_postgres_node.t_nodemapping
+        jobs = jobs.join(nodemapping, nodemapping.c.cid == Job.node_id).filter(nodemapping.c.nid == parent.id)
+    return {job.id: dict(state=job.state, attempts=job.attempts, error=get_error_summary(job.error)) for job in jobs}
+
+
+def get_queue_summary():
+    """Returns a dict mapping (job type, state) pairs to the number of jobs"""
+    rows = _core.db.query(Job.type, Job.state, _sqlalchemy.func.count(Job.id)).group_by(Job.type, Job.state)
+    return {(job_type, state): count for job_type, state, count in rows}
+
+
+def _claim_job(worker):
+    s = _core.db.session
+    for job_type in _job_types.itervalues():
+        # serialize counting and claiming per job type so the concurrency limit holds,
+        # the advisory lock is released at the end of the transaction
+        locked = s.query(_sqlalchemy.func.pg_try_advisory_xact_lock(
+                _sqlalchemy.func.hashtext(u"mediatum-job-{}".format(job_type.name)))).scalar()
+        if not locked:
+            s.rollback()
+            continue
+        running = s.query(Job).filter_by(type=job_type.name, state=u"running").count()
+        concurrency = _core_config.getint("jobqueue.concurrency_{}".format(job_type.name), job_type.concurrency)
+        job = None
+        if running < concurrency:
+            job = (s.query(Job)
+                   .filter_by(type=job_type.name, state=u"queued")
+                   .filter(Job.run_after <= _sqlalchemy.func.now())
+                   .order_by(Job.run_after, Job.id)
+                   .with_for_update(skip_locked=True)
+                   .first())
+        if job is None:
+            s.rollback()
+            continue
+        job.state = u"running"
+        job.attempts += 1
+        job.started_at = _sqlalchemy.func.now()
+        job.worker = worker
+        s.commit()
+        return job
+
+
+def _run_lock(job_id):
+    return _sqlalchemy.func.hashtext(u"mediatum-job-run"), job_id
+
+
+def _run_job(job):
+    job_id = job.id
+    # the lock is held as long as the worker is alive, see requeue_stale_jobs
+    lock_conn = _core.db.engine.connect()
+    try:
+        lock_conn.execute(_sqlalchemy.select([_sqlalchemy.func.pg_advisory_lock(*_run_lock(job_id))]))
+        _run_locked_job(job)
+    finally:
+        try:
+            lock_conn.execute(_sqlalchemy.select([_sqlalchemy.func.pg_advisory_unlock(*_run_lock(job_id))]))
+        finally:
+            lock_conn.close()
+
+
+def _run_locked_job(job):
+    s = _core.db.session
+    job_id = job.id
+    _logg.info("running job %s (type %s) for node %s, attempt %s", job_id, job.type, job.node_id, job.attempts)
+    try:
+        node = s.query(_core_database_postgres_node.Node).get(job.node_id)
+        if node is not None:
+            _job_types[job.type].func(node)
+        s.commit()
+    except Exception:
+        s.rollback()
+        _logg.exception("job %s failed", job_id)
+        job = s.query(Job).get(job_id)
+        job.error = _traceback.format_exc().decode("utf8", "replace")
+        if job.attempts >= job.max_attempts:
+            job.state = u"failed"
+            job.finished_at = _sqlalchemy.func.now()
+        else:
+            delay = _job_types[job.type].retry_delay * 2 ** (job.attempts - 1)
+            job.state = u"queued"
+            job.run_after = _sqlalchemy.func.now() + _datetime.timedelta(seconds=delay)
+    else:
+        job = s.query(Job).get(job_id)
+        job.state = u"done"
+        job.finished_at = _sqlalchemy.func.now()
+    s.commit()
+
+
+def requeue_stale_jobs(timeout):
+    """
+    Put jobs back into the queue that are running for more than `timeout` seconds
+    and whose worker died, i.e. doesn't hold the run lock of the job anymore.
+    """
+    s = _core.db.session
+    candidates = (s.query(Job)
+                  .filter_by(state=u"running")
+                  .filter(Job.started_at < _sqlalchemy.func.now() - _datetime.timedelta(seconds=timeout))
+                  .with_for_update(skip_locked=True)
+                  .all())
+    stale = 0
+    for job in candidates:
+        # released at the end of the transaction
+        if not s.query(_sqlalchemy.func.pg_try_advisory_xact_lock(*_run_lock(job.id))).scalar():
+            continue
+        _logg.warning("worker %s of job %s is gone", job.worker, job.id)
+        job.error = u"worker gone"
+        job.state = u"failed" if job.attempts >= job.max_attempts else u"queued"
+        stale += 1
+    s.commit()
+    return stale
+
+
+def process_jobs(once=False, poll_interval=None, timeout=None):
+    """
+    Claim and run jobs until interrupted.
+    If `once` is True, return as soon as no job is ready to run.
+    """
+    if poll_interval is None:
+        poll_interval = _core_config.getfloat("jobqueue.poll_interval", 2)
+    if timeout is None:
+        timeout = _core_config.getint("jobqueue.timeout", 3600)
+    worker = u"{}:{}".format(_socket.gethostname(), _os.getpid())
+    _logg.info("worker %s processing job types %s", worker, ", ".join(_job_types))
+    last_requeue = 0
+    while True:
+        if _time.time() - last_requeue > min(timeout, 60):
+            requeue_stale_jobs(timeout)
+            last_requeue = _time.time()
+        job = _claim_job(worker)
+        if job is not None:
+            _run_job(job)
+            continue
+        if once:
+            return
+        _time.sleep(poll_interval)
+
+
+register_job_type("files_changed", lambda node: node.event_files_changed())
@@ -0,0 +1,292 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Read-through cache for node snapshots (column values, attrs, system_attrs and file list)
+that outlives a request, so frequently requested nodes are not loaded from the database again and again.
+Each process keeps its own LRU-bounded cache.
+Triggers on node, node_to_file, file and noderelation send the ids of changed nodes
+on the channel mediatum_node_change, see speedups.sql,
+and a listener thread per process drops their snapshots.
+Snapshots are only used while the listener is connected.
+The cache is inactive unless `nodesnapshots.activate` is set;
+under uwsgi, the workers need `enable-threads` for the listener thread.
+Changes made with plain SQL in the current transaction are not seen by snapshots before they are committed.
+Each process logs its cache statistics (see get_stats) every `nodesnapshots.stats_interval` lookups.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import collections as _collections
+import copy as _copy
+import logging as _logging
+import os as _os
+import select as _select
+import threading as _threading
+import time as _time
+
+import psycopg2.extensions as _psycopg2_extensions
+import sqlalchemy as _sqlalchemy
+import sqlalchemy.event as _sqlalchemy_event
+import sqlalchemy.orm as _sqlalchemy_orm
+import sqlalchemy.pool as _sqlalchemy_pool
+
+import core as _core
+import core.config as _core_config
+from core.database.postgres.file import File
+from core.database.postgres.node import Node
+
+_logg = _logging.getLogger(__name__)
+
+CHANNEL = "mediatum_node_change"
+
+# node id -> snapshot, least recently used first
+_entries = _collections.OrderedDict()
+_lock = _threading.Lock()
+# incremented for each processed notification, snapshots loaded before are not stored
+_invalidation_count = 0
+_listening = False
+_listener_pid = None
+_stats = _collections.Counter()
+
+_session_info_key = "nodesnapshots-flushed"
+
+
+def is_active():
+    return _core_config.getboolean("nodesnapshots.activate", False)
+
+
+def _node_column_keys():
+    # fulltext is deferred and rarely needed, it is loaded on access
+    return [p.key for p in _sqlalchemy.inspect(Node).column_attrs if p.key != "fulltext"]
+
+
+def _file_column_keys():
+    return [p.key for p in _sqlalchemy.inspect(File).column_attrs]
+
+
+def _copy_values(obj_or_values, keys):
+    """Copies the values, JSON dicts are copied deeply so changes of nodes in a session don't reach the cache"""
+    get = obj_or_values.get if isinstance(obj_or_values, dict) else lambda key: getattr(obj_or_values, key)
+    values = {}
+    for key in keys:
+        value = get(key)
+        values[key] = _copy.deepcopy(dict(value)) if isinstance(value, dict) else value
+    return values
+
+
+def _make_snapshot(node):
+    return dict(
+        columns=_copy_values(node, _node_column_keys()),
+        files=[_copy_values(f, _file_column_keys()) for f in node.file_objects],
+       )
+
+
+def _identity_key(cls, pk):
+    return _sqlalchemy.inspect(cls).identity_key_from_primary_key([pk])
+
+
+def _make_detached(cls, values):
+    obj = _sqlalchemy.inspect(cls).class_manager.new_instance()
+    for key, value in _copy_values(values, values.keys()).iteritems():
+        setattr(obj, key, value)
+    _sqlalchemy_orm.make_transient_to_detached(obj)
+    return obj
+
+
+def _node_from_snapshot(snapshot):
+    """Returns a new node in the current session, built from `snapshot` without a database query"""
+    session = _core.db.session
+    columns = snapshot["columns"]
+    nodeclass = Node.__mapper__.polymorphic_map[columns["type"]].class_
+    node = _make_detached(nodeclass, columns)
+    session.add(node)
+
+    files = []
+    for values in snapshot["files"]:
+        f = session.identity_map.get(_identity_key(File, values["id"]))
+        if f is None:
+            f = _make_detached(File, values)
+            session.add(f)
+        files.append(f)
+    _sqlalchemy_orm.attributes.set_committed_value(node, "file_objects", files)
+    return node
+
+
+def _load_node(nid):
+    return (_core.db.query(Node)
+            .options(_sqlalchemy_orm.undefer(Node.attrs),
+                     _sqlalchemy_orm.undefer(Node.system_attrs),
+                     _sqlalchemy_orm.joinedload(Node.file_objects))
+            .get(nid))
+
+
+def _get_or_load_node(nid):
+    with _lock:
+        snapshot = _entries.pop(nid, None)
+        if snapshot is not None:
+            _entries[nid] = snapshot
+            _stats["hits"] += 1
+        else:
+            _stats["misses"] += 1
+        invalidation_count = _invalidation_count
+        lookups = _stats["hits"] + _stats["misses"]
+
+    stats_interval = _core_config.getint("nodesnapshots.stats_interval", 10000)
+    if stats_interval > 0 and lookups % stats_interval == 0:
+        _log_stats()
+
+    if snapshot is not None:
+        return _node_from_snapshot(snapshot)
+
+    node = _load_node(nid)
+    # uncommitted changes of this session must not end up in the cache
+    if node is not None and not _core.db.session.info.get(_session_info_key):
+        _store(nid, _make_snapshot(node), invalidation_count)
+    return node
+
+
+def get_node(nid, nodeclass=Node):
+    """
+    Returns the node with id `nid` like `_core.db.query(nodeclass).get(nid)`,
+    built from a cached snapshot if possible.
+    """
+    if not is_active():
+        return _core.db.query(nodeclass).get(nid)
+    _ensure_listener()
+
+    nid = int(nid)
+    node = _core.db.session.identity_map.get(_identity_key(Node, nid))
+    if node is None:
+        if not _listening:
+            return _core.db.query(nodeclass).get(nid)
+        node = _get_or_load_node(nid)
+    return node if isinstance(node, nodeclass) else None
+
+
+def _store(nid, snapshot, invalidation_count):
+    size = _core_config.getint("nodesnapshots.size", 10000)
+    with _lock:
+        if invalidation_count != _invalidation_count or not _listening:
+            # a notification arrived while the node was loaded, the snapshot may be outdated
+            _stats["discarded"] += 1
+            return
+        _entries[nid] = snapshot
+        while len(_entries) > size:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def _invalidate(payloads):
+    global _invalidation_count
+    with _lock:
+        _invalidation_count += 1
+        _stats["notifications"] += len(payloads)
+        if "*" in payloads:
+            _stats["invalidations"] += len(_entries)
+            _entries.clear()
+            return
+        for payload in payloads:
+            for nid in payload.split(","):
+                if _entries.pop(int(nid), None) is not None:
+                    _stats["invalidations"] += 1
+
+
+def _set_listening(listening):
+    global _listening, _invalidation_count
+    with _lock:
+        _listening = listening
+        # notifications may have been missed while not listening
+        _invalidation_count += 1
+        _entries.clear()
+
+
+def _listen():
+    engine = _sqlalchemy.create_engine(
+        _core.db.connectstr,
+        poolclass=_sqlalchemy_pool.NullPool,
+        connect_args=dict(host=_core.db.host, application_name="nodesnapshots({})".format(_os.getpid())),
+    )
+    reconnect_delay = _core_config.getint("nodesnapshots.reconnect_delay", 5)
+    while True:
+        raw_conn = None
+        try:
+            raw_conn = engine.raw_connection()
+            conn = raw_conn.connection
+            conn.set_isolation_level(_psycopg2_extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute("LISTEN {}".format(CHANNEL))
+            _set_listening(True)
+            _logg.info("listening for node changes on channel %s", CHANNEL)
+            while True:
+                if _select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                payloads = set()
+                while conn.notifies:
+                    payloads.add(conn.notifies.pop(0).payload)
+                if payloads:
+                    _invalidate(payloads)
+        except Exception:
+            _logg.exception("node change listener failed, reconnecting in %s seconds", reconnect_delay)
+            _set_listening(False)
+            if raw_conn is not None:
+                raw_conn.invalidate()
+            _time.sleep(reconnect_delay)
+
+
+def _ensure_listener():
+    """Starts the listener thread, once per process (uwsgi workers are forked after the app is loaded)"""
+    global _listener_pid
+    pid = _os.getpid()
+    if _listener_pid == pid:
+        return
+    with _lock:
+        if _listener_pid == pid:
+            return
+        _listener_pid = pid
+    _set_listening(False)
+    thread = _threading.Thread(target=_listen, name="nodesnapshots-listener")
+    thread.daemon = True
+    thread.start()
+
+
+def get_stats():
+    """Returns the counters of the snapshot cache of this process, with the current size and the hit rate"""
+    with _lock:
+        stats = dict(_stats, size=len(_entries), listening=_listening)
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    stats["hit_rate"] = stats.get("hits", 0) / lookups if lookups else None
+    return stats
+
+
+def _log_stats():
+    stats = get_stats()
+    _logg.info("node snapshots of process %s: %s entries, %s hits, %s misses, hit rate %.2f, "
+               "%s invalidations, %s evictions, %s discarded, %s notifications, listening: %s",
+               _os.getpid(), stats["size"], stats.get("hits", 0), stats.get("misses", 0), stats["hit_rate"] or 0,
+               stats.get("invalidations", 0), stats.get("evictions", 0), stats.get("discarded", 0),
+               stats.get("notifications", 0), stats["listening"])
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def _after_flush(session, flush_context):
+    session.info[_session_info_key] = True
+
+
+def _after_transaction_end(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_session_info_key, None)
+
+
+_sqlalchemy_event.listen(_sqlalchemy_orm.Session, "after_flush", _after_flush)
+_sqlalchemy_event.listen(_sqlalchemy_orm.Session, "after_transaction_end", _after_transaction_end)
@@ -0,0 +1,168 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Background purge of trash directories.
+Clearing a trash directory only marks its children (table node_purge) and starts a purge_trash job,
+see core.jobqueue. The job removes the marked nodes from the trash in batches,
+deletes the nodes that are not reachable from the root node anymore with the `delete_nodes` database function
+and puts their files into a durable queue (table file_unlink).
+Files are unlinked from disk afterwards, at most `purge.unlink_rate` files per second in a worker.
+Without `jobqueue.activate`, the purge runs in the request and files are unlinked without throttling.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import errno as _errno
+import logging as _logging
+import os as _os
+import time as _time
+
+from sqlalchemy import text as _sqltext
+
+import core as _core
+import core.config as _core_config
+import core.jobqueue as _core_jobqueue
+import core.nodecache as _core_nodecache
+import core.tree as _core_tree
+from core.database.postgres import DB_SCHEMA_NAME
+from core.database.postgres.job import Job
+from core.database.postgres.purge import NodePurge, FileUnlink
+
+_logg = _logging.getLogger(__name__)
+
+
+def purge_trash(trashdir):
+    """
+    Marks all children of `trashdir` for purging and starts the purge.
+    Returns the job if the purge runs in the background, else None.
+    The caller commits the transaction.
+    """
+    s = _core.db.session
+    marked = s.execute(_sqltext(
+            "INSERT INTO {schema}.node_purge (nid, trash_id, created_at) "
+            "SELECT cid, nid, now() FROM {schema}.nodemapping WHERE nid = :trash_id "
+            "ON CONFLICT DO NOTHING".format(schema=DB_SCHEMA_NAME)),
+            {"trash_id": trashdir.id}).rowcount
+    _logg.info("marked %s nodes in trash %s for purging", marked, trashdir.id)
+    return _core_jobqueue.run_or_enqueue("purge_trash", trashdir)
+
+
+def _purge_batch(trash_id, batch_size):
+    """Purges up to `batch_size` marked nodes of `trash_id` and commits. Returns the number of processed nodes."""
+    s = _core.db.session
+    nids = [nid for nid, in s.query(NodePurge.nid)
+            .filter_by(trash_id=trash_id)
+            .order_by(NodePurge.nid)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)]
+    if not nids:
+        s.rollback()
+        return 0
+
+    _core_tree.bulk_delete((trash_id, nid) for nid in nids)
+
+    # nodes that are still reachable, e.g. because they were also mapped somewhere else, survive
+    params = {"nids": nids, "root_id": _core_nodecache.get_root_node().id}
+    delete_ids = [nid for nid, in s.execute(_sqltext(
+            "SELECT q.id FROM (SELECT unnest(CAST(:nids AS integer[])) AS id "
+            "                  UNION SELECT cid FROM {schema}.noderelation WHERE nid = ANY(:nids)) q "
+            "WHERE q.id != :root_id "
+            "AND NOT EXISTS (SELECT FROM {schema}.noderelation WHERE cid = q.id AND nid = :root_id)".format(
+                schema=DB_SCHEMA_NAME)),
+            params)]
+
+    if delete_ids:
+        # files that are not used by surviving nodes are unlinked later
+        params = {"ids": delete_ids}
+        files = s.execute(_sqltext(
+                "SELECT f.id, f.path FROM {schema}.file f "
+                "WHERE f.id IN (SELECT file_id FROM {schema}.node_to_file WHERE nid = ANY(:ids)) "
+                "AND NOT EXISTS (SELECT FROM {schema}.node_to_file o WHERE o.file_id = f.id AND o.nid != ALL(:ids))".format(
+                    schema=DB_SCHEMA_NAME)),
+                params).fetchall()
+        s.add_all(FileUnlink(path=path) for _, path in files)
+        s.flush()
+        deleted = s.execute(_sqltext("SELECT {}.delete_nodes(:ids)".format(DB_SCHEMA_NAME)), params).scalar()
+        if files:
+            s.execute(_sqltext("DELETE FROM {}.file WHERE id = ANY(:file_ids)".format(DB_SCHEMA_NAME)),
+                      {"file_ids": [file_id for file_id, _ in files]})
+        _logg.info("purged %s nodes from trash %s, %s files queued for unlinking", deleted, trash_id, len(files))
+
+    s.query(NodePurge).filter(NodePurge.nid.in_(nids)).delete(synchronize_session=False)
+    s.commit()
+    return len(nids)
+
+
+def unlink_queued_files(limit=None, throttle=True):
+    """
+    Deletes the files in the unlink queue from disk,
+    at most `purge.unlink_rate` files per second if `throttle` is set.
+    Returns the number of unlinked files.
+    """
+    s = _core.db.session
+    rate = _core_config.getfloat("purge.unlink_rate", 20) if throttle else 0
+    batch_size = _core_config.getint("purge.unlink_batch_size", 100)
+    unlinked = 0
+    while limit is None or unlinked < limit:
+        entries = (s.query(FileUnlink)
+                   .filter(FileUnlink.error.is_(None))
+                   .order_by(FileUnlink.id)
+                   .limit(batch_size if limit is None else min(batch_size, limit - unlinked))
+                   .with_for_update(skip_locked=True)
+                   .all())
+        if not entries:
+            s.rollback()
+            break
+        for entry in entries:
+            start = _time.time()
+            try:
+                _os.unlink(_core_config.resolve_datadir_path(entry.path))
+            except OSError as e:
+                if e.errno != _errno.ENOENT:
+                    _logg.warning("could not unlink %s: %s", entry.path, e)
+                    entry.error = unicode(e)
+                    continue
+                _logg.warning("tried to unlink missing physical file %s, ignored", entry.path)
+            s.delete(entry)
+            unlinked += 1
+            if rate > 0:
+                _time.sleep(max(0, 1 / rate - (_time.time() - start)))
+        s.commit()
+    return unlinked
+
+
+def _purge_trash_job(trashdir):
+    batch_size = _core_config.getint("purge.batch_size", 500)
+    while _purge_batch(trashdir.id, batch_size):
+        pass
+    # the throttle protects the storage from a background worker, a request must not wait for it
+    unlink_queued_files(throttle=_core_jobqueue.is_active())
+
+
+def get_purge_progress(trashdir):
+    """
+    Returns a dict with the number of nodes of `trashdir` that still have to be purged,
+    the number of files of all purges waiting to be unlinked (the queue is global),
+    the state of the last purge job ("queued", "running", "done", "failed" or None)
+and the summary of its last error (see core.jobqueue.get_error_summary).
+    """
+    job = (_core.db.query(Job)
+           .filter_by(type=u"purge_trash", node_id=trashdir.id)
+           .order_by(Job.id.desc())
+           .first())
+    return dict(
+        nodes=_core.db.query(NodePurge).filter_by(trash_id=trashdir.id).count(),
+        queued_files=_core.db.query(FileUnlink).filter(FileUnlink.error.is_(None)).count(),
+        state=job.state if job is not None else None,
+        error=_core_jobqueue.get_error_summary(job.error) if job is not None else None,
+       )
+
+
+_core_jobqueue.register_job_type("purge_trash", _purge_trash_job, concurrency=1, max_attempts=5)
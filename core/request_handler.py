@@ -11,6 +11,7 @@ import os as _os
 import stat as _stat
 import string as _string
 import logging as _logging
+import time as _time
 from functools import partial as _partial
 
 import flask as _flask
@@ -23,12 +24,15 @@ from core import config as _config
 from utils import utils as _utils_utils
 from utils.url import build_url_from_path_and_params as _build_url_from_path_and_params
 from collections import OrderedDict as _OrderedDict
+import collections as _collections
 
 _logg = _logging.getLogger(__name__)
 
 _basedir = "no-root-dir-set"
 
 contexts = []
+# contexts sorted by descending name length, the first one matching a path has the longest prefix
+_contexts_by_length = []
 
 BASENAME = _re.compile("([^/]*/)*([^/.]*)(.py)?")
 
@@ -71,7 +75,7 @@ class _WebHandler:
     def addPattern(self, pattern):
         p = _WebPattern(self, pattern)
         desc = u"pattern {}, module {} function {}".format(pattern, self.file.m.__name__, self.function)
-        self.file.context.pattern_to_function[p.getPattern()] = (self.f, desc)
+        self.file.context.add_pattern(p.getPattern(), self.f, desc)
         return p
 
 
@@ -174,6 +178,20 @@ def sendFile(req, path, content_type, force=0):
     req.response.headers['X-Accel-Redirect'] = _os.path.join("/{}".format(nginx_alias), _os.path.relpath(path, nginx_dir))
 
 
+def _iter_closing_session(chunks):
+    # the session was already closed after the request, the chunks reopened it
+    try:
+        for chunk in chunks:
+            yield chunk
+    finally:
+        _core.db.session.close()
+
+
+def send_stream(req, chunks):
+    """Sends the chunks (str or unicode) of an iterator as response body while they are produced"""
+    req.response.response = _flask.stream_with_context(_iter_closing_session(chunks))
+
+
 def makeSelfLink(req, params):
     params2 = req.params.copy()
     for k, v in params.items():
@@ -186,6 +204,128 @@ def makeSelfLink(req, params):
     return ret
 
 
+# characters that end the literal head of a pattern
+_REGEX_SPECIAL_CHARS = frozenset(".^$*+?{}[]()|\\")
+_REGEX_QUANTIFIERS = frozenset("*+?{")
+# python 2 re supports at most 100 groups per pattern
+_MAX_GROUPS_PER_REGEX = 99
+# features that break when a pattern is embedded in an alternation
+_UNMERGEABLE_REGEX = _re.compile(r"\\[1-9]|\(\?[iLmsux]+\)")
+
+
+def _literal_prefix(pattern):
+    """
+    Returns the literal string any path matched by `pattern` starts with.
+    The result may be shorter than the actual literal head, but never longer.
+    """
+    if "|" in pattern:
+        return ""
+    prefix = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            if i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+                c = pattern[i + 1]
+                i += 1
+            else:
+                break
+        elif c in _REGEX_SPECIAL_CHARS:
+            break
+        i += 1
+        if i < len(pattern) and pattern[i] in _REGEX_QUANTIFIERS:
+            # the last character is optional or repeated
+            break
+        prefix.append(c)
+    return "".join(prefix)
+
+
+class _RouteIndex(object):
+
+    """
+    Finds the first pattern of a context that matches a path, like trying all patterns in order.
+    A trie of the literal pattern heads selects the patterns that can match at all,
+    these candidates are combined into one alternation regex with a named group per pattern.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        self.trie = {}
+        self.always = []
+        for i, pattern in enumerate(patterns):
+            prefix = _literal_prefix(pattern.pattern)
+            if not prefix:
+                self.always.append(i)
+                continue
+            node = self.trie
+            for c in prefix:
+                node = node.setdefault(c, {})
+            node.setdefault(None, []).append(i)
+        self.matchers = {}
+
+    def _candidates(self, path):
+        candidates = list(self.always)
+        node = self.trie
+        for c in path:
+            node = node.get(c)
+            if node is None:
+                break
+            candidates.extend(node.get(None, ()))
+        candidates.sort()
+        return tuple(candidates)
+
+    def _make_matchers(self, candidates):
+        """Combines consecutive candidates into alternation regexes where possible"""
+        matchers = []
+        group = []
+        groupcount = 0
+        groupnames = set()
+
+        def flush():
+            if len(group) == 1:
+                matchers.append((None, group[0]))
+            elif group:
+                combined = "|".join("(?P<_r{}>{})".format(i, self.patterns[i].pattern) for i in group)
+                matchers.append((_re.compile(combined), None))
+            del group[:]
+
+        for i in candidates:
+            pattern = self.patterns[i]
+            if _UNMERGEABLE_REGEX.search(pattern.pattern) or pattern.groups + 1 > _MAX_GROUPS_PER_REGEX:
+                flush()
+                matchers.append((None, i))
+                groupcount = 0
+                groupnames = set()
+                continue
+            names = set(pattern.groupindex)
+            if groupcount + pattern.groups + 1 > _MAX_GROUPS_PER_REGEX or names & groupnames:
+                flush()
+                groupcount = 0
+                groupnames = set()
+            group.append(i)
+            groupcount += pattern.groups + 1
+            groupnames |= names
+        flush()
+        return matchers
+
+    def match(self, path):
+        """Returns the index of the first matching pattern or None"""
+        candidates = self._candidates(path)
+        matchers = self.matchers.get(candidates)
+        if matchers is None:
+            matchers = self.matchers[candidates] = self._make_matchers(candidates)
+        for combined, i in matchers:
+            if combined is None:
+                if self.patterns[i].match(path):
+                    return i
+            else:
+                m = combined.match(path)
+                if m:
+                    # the outer group of the matching pattern is closed last
+                    return int(m.lastgroup[2:])
+        return None
+
+
 # COMPAT: added functions
 
 
@@ -199,6 +339,16 @@ class _WebContext:
             self.root = _qualify_path(root)
         self.pattern_to_function = _OrderedDict()
         self.catchall_handler = None
+        self._route_index = None
+        self._route_calls = None
+        #: number of matched requests per route description
+        self.route_hits = _collections.Counter()
+        self.match_count = 0
+        self.match_seconds = 0.0
+
+    def add_pattern(self, pattern, function, desc):
+        self.pattern_to_function[pattern] = (function, desc)
+        self._route_index = None
 
     def addModule(self, module):
         file = _WebFile(self, module)
@@ -218,11 +368,20 @@ class _WebContext:
                     return
             return
 
-        for pattern, call in self.pattern_to_function.items():
-            if pattern.match(path):
-                function, desc = call
-                _logg.debug("Request %s matches (%s)", path, desc)
-                return lambda req: call_and_close(function, req)
+        if self._route_index is None:
+            self._route_index = _RouteIndex(self.pattern_to_function.keys())
+            self._route_calls = self.pattern_to_function.values()
+
+        start = _time.time()
+        i = self._route_index.match(path)
+        self.match_seconds += _time.time() - start
+        self.match_count += 1
+
+        if i is not None:
+            function, desc = self._route_calls[i]
+            self.route_hits[desc] += 1
+            _logg.debug("Request %s matches (%s)", path, desc)
+            return lambda req: call_and_close(function, req)
 
         # no pattern matched, use catchall handler if present
         if self.catchall_handler:
@@ -266,13 +425,11 @@ def _callhandler(handler_func, req):
 def handle_request(req):
     _flask.g.mediatum = {}
 
-    maxlen = -1
-    context = None
-    global contexts
-    for c in contexts:
-        if req.path.startswith(c.name) and len(c.name) > maxlen:
-            context = c
-            maxlen = len(context.name)
+    for context in _contexts_by_length:
+        if req.path.startswith(context.name):
+            break
+    else:
+        context = None
     if context is None:
         req.response.status_code = _httplib.NOT_FOUND
         return req
@@ -312,4 +469,16 @@ def addContext(webpath, localpath):
     global contexts
     c = _WebContext(webpath, localpath)
     contexts += [c]
+    # stable sort keeps the first added context for equal names, like the linear scan did
+    _contexts_by_length[:] = sorted(contexts, key=lambda c: -len(c.name))
     return c
+
+
+def get_route_stats():
+    """Returns the hits per route and the time spent matching paths for all contexts of this process"""
+    return [dict(
+            context=c.name,
+            match_count=c.match_count,
+            match_seconds=c.match_seconds,
+            route_hits=dict(c.route_hits),
+           ) for c in contexts]
@@ -5,17 +5,24 @@ from __future__ import division
 from __future__ import print_function
 
 import logging
+
+import backports.functools_lru_cache as _backports_functools_lru_cache
+
 from .language import parser
 from core.search.oldparser import FtsSearchParser
 from core.search.oldtonewtree import old_searchtree_to_new
 
 logg = logging.getLogger(__name__)
 
+# number of parsed queries kept per parser, search trees are immutable and can be shared
+PARSE_CACHE_SIZE = 1024
+
 
 class SearchQueryException(ValueError):
     pass
 
 
+@_backports_functools_lru_cache.lru_cache(maxsize=PARSE_CACHE_SIZE)
 def parse_searchquery(searchquery):
     try:
         searchtree = parser.parse_string(searchquery)
@@ -27,6 +34,7 @@ def parse_searchquery(searchquery):
     return searchtree
 
 
+@_backports_functools_lru_cache.lru_cache(maxsize=PARSE_CACHE_SIZE)
 def parse_searchquery_old_style(searchquery):
     old_parser = FtsSearchParser()
     try:
@@ -39,3 +47,16 @@ def parse_searchquery_old_style(searchquery):
 
     new_searchtree = old_searchtree_to_new(old_searchtree)
     return new_searchtree
+
+
+def get_parse_cache_info():
+    """Returns the hits, misses and sizes of the parse caches (as `CacheInfo` tuples) by parser name"""
+    return dict(
+        new=parse_searchquery.cache_info(),
+        old_style=parse_searchquery_old_style.cache_info(),
+    )
+
+
+def clear_parse_caches():
+    parse_searchquery.cache_clear()
+    parse_searchquery_old_style.cache_clear()
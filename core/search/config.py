@@ -13,6 +13,20 @@ Search configuration. Currently, the following language configurations can be se
 
 Default value is `simple`. Invalid search configurations are ignored.
 
+`stored_tsvectors` selects if tsvectors for the autoindex configs are stored in the node_tsvector table
+and used for searching instead of computing them from attributes and fulltexts:
+
+* none: don't store tsvectors, search with expression indexes (default)
+* all: store one tsvector per config
+* shortest: store the attribute tsvectors and only the shortest fulltext tsvector,
+  usually the one of the fulltext's language
+* detected: detect the language of attributes and fulltext of each node when they change
+  and store only the tsvector for that language. Searches match each node with its own language,
+  independent of the default search languages.
+
+After changing `stored_tsvectors`, run `bin/manage.py tsvectors rebuild`.
+Until then, searches use the expression indexes as with 'none'.
+
 `mediatum.cfg` example:
 
 [search]
@@ -20,6 +34,7 @@ default_languages=german,english
 service_languages=simple
 fulltext_autoindex_languages=german,english
 attribute_autoindex_languages=german,english,simple
+stored_tsvectors=shortest
 
 # XXX: maybe we could do that in the database so that an admin could change search parameters at runtime?
 """
@@ -37,6 +52,8 @@ from core import config
 logg = logging.getLogger(__name__)
 
 
+STORED_TSVECTORS_MODES = ("none", "all", "shortest", "detected")
+
 default_languages = None
 service_languages = None
 fulltext_autoindex_languages = None
@@ -88,6 +105,14 @@ def get_attribute_autoindex_languages():
     return attribute_autoindex_languages
 
 
+def get_stored_tsvectors_mode():
+    mode = config.get("search.stored_tsvectors", "none")
+    if mode not in STORED_TSVECTORS_MODES:
+        logg.warning("invalid value '%s' for search.stored_tsvectors, using 'none'", mode)
+        mode = "none"
+    return mode
+
+
 def get_fulltext_autoindex_languages():
     global fulltext_autoindex_languages
     if not fulltext_autoindex_languages:
@@ -0,0 +1,121 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Value counts (facets) of list attributes for the content nodes below a container.
+The values of all requested attributes are counted in a single pass over the subtree,
+optionally restricted to a search result and to the nodes the access principal may read.
+Like `count_list_values_for_all_content_children` in node_funcs.sql,
+attribute values are split at ";" and empty values are skipped.
+Counts are cached per process and attribute,
+entries are discarded when the content generation changes (see core.search.resultcache).
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import collections as _collections
+import logging as _logging
+import threading as _threading
+import time as _time
+
+import sqlalchemy as _sqlalchemy
+from sqlalchemy.dialects.postgresql import array as _array
+
+import core as _core
+import core.config as _core_config
+import core.search.resultcache as _resultcache
+from core.database.postgres.node import Node, NodeType, t_noderelation
+
+_logg = _logging.getLogger(__name__)
+
+# (base key, attribute name) -> (generation, expiry time, [(value, count), ...]), least recently used first
+_entries = _collections.OrderedDict()
+_lock = _threading.Lock()
+
+
+def _content_node_ids_query(container_id, searchtree=None, languages=None, check_access=False, user=None, ip=None, req=None):
+    query = (_core.db.query(Node.id)
+             .filter(Node.id.in_(_core.db.query(t_noderelation.c.cid).filter(t_noderelation.c.nid == container_id)))
+             .filter(Node.type.in_(_core.db.query(NodeType.name).filter(NodeType.is_container == False))))
+    if searchtree is not None:
+        from core.database.postgres.search import apply_searchtree_to_query
+        query = apply_searchtree_to_query(query, searchtree, languages)
+    if check_access:
+        query = query.filter_read_access(user=user, ip=ip, req=req)
+    return query
+
+
+def count_values(attribute_names, node_ids_query):
+    """
+    Returns a dict mapping each of `attribute_names` to its list of (value, count) tuples, ordered by value.
+    `node_ids_query` selects the ids of the nodes whose values are counted, all attributes are counted in one scan.
+    """
+    counts = {name: [] for name in attribute_names}
+    if not attribute_names:
+        return counts
+
+    attr = _sqlalchemy.select([_sqlalchemy.func.unnest(_array(list(attribute_names))).label("name")]).alias("attr")
+    value = _sqlalchemy.func.trim(_sqlalchemy.func.unnest(_sqlalchemy.func.string_to_array(
+        Node.__table__.c.attrs.op("->>")(attr.c.name), u";")))
+    values = (_sqlalchemy.select([attr.c.name, value.label("value")])
+              .where(Node.__table__.c.id.in_(node_ids_query.subquery()))
+              .alias("vals"))
+    stmt = (_sqlalchemy.select([values.c.name, values.c.value, _sqlalchemy.func.count()])
+            .where(values.c.value != u"")
+            .group_by(values.c.name, values.c.value)
+            .order_by(values.c.name, values.c.value))
+
+    for name, value, count in _core.db.session.execute(stmt):
+        counts[name].append((value, count))
+    return counts
+
+
+def get_value_counts(container_id, attribute_names, searchtree=None, languages=(), check_access=False, user=None, ip=None, req=None):
+    """
+    Returns a dict mapping each of `attribute_names` to the (value, count) tuples of the content nodes below `container_id`.
+    If `searchtree` is given, only nodes matching the search are counted.
+    If `check_access` is set, only nodes readable for the principal given by `user`, `ip` and `req` are counted.
+    Uncached attributes are counted together in a single query.
+    """
+    principal = _resultcache.make_principal(user, ip, req) if check_access else None
+    base_key = (container_id, searchtree, tuple(languages), principal)
+    generation = _resultcache.content_generation.get()
+    now = _time.time()
+
+    counts = {}
+    with _lock:
+        for name in attribute_names:
+            entry = _entries.pop((base_key, name), None)
+            if entry is not None and entry[0] == generation and entry[1] > now:
+                _entries[(base_key, name)] = entry
+                counts[name] = entry[2]
+
+    missing = [name for name in attribute_names if name not in counts]
+    if not missing:
+        return counts
+
+    _logg.debug("counting values of %s below container %s", missing, container_id)
+    node_ids_query = _content_node_ids_query(container_id, searchtree, languages, check_access, user, ip, req)
+    fetched = count_values(missing, node_ids_query)
+    counts.update(fetched)
+
+    ttl = _core_config.getint("search.facet_cache_ttl", 600)
+    size = _core_config.getint("search.facet_cache_size", 1000)
+    if size > 0:
+        with _lock:
+            for name, value_counts in fetched.iteritems():
+                _entries[(base_key, name)] = (generation, now + ttl, value_counts)
+            while len(_entries) > size:
+                _entries.popitem(last=False)
+    return counts
+
+
+def clear():
+    with _lock:
+        _entries.clear()
@@ -0,0 +1,105 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Cache for the ordered node ids of search results.
+Paging through a result and navigating between single results
+only needs a slice of the id list instead of running the search again.
+Entries are keyed by search tree, languages, container, sort fields and access principal,
+they expire after a timeout and are discarded when the content generation changes,
+which happens on every commit that changes nodes or access rules.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import collections as _collections
+import logging as _logging
+import threading as _threading
+import time as _time
+
+import core.cachegeneration as _core_cachegeneration
+import core.config as _core_config
+import core.database.postgres as _core_database_postgres
+import core.database.postgres.permission as _core_database_postgres_permission
+from core.database.postgres.node import Node
+
+_logg = _logging.getLogger(__name__)
+
+# bumped on commits that change nodes or access rules
+content_generation = _core_cachegeneration.Generation("content")
+
+_core_cachegeneration.bump_on_commit(
+        content_generation,
+        lambda obj: isinstance(obj, (
+            Node,
+            _core_database_postgres_permission.AccessRule,
+            _core_database_postgres_permission.NodeToAccessRule,
+            _core_database_postgres_permission.NodeToAccessRuleset,
+            _core_database_postgres_permission.AccessRulesetToRule,
+        )),
+    )
+
+# key -> (generation, expiry time, ids), least recently used first
+_entries = _collections.OrderedDict()
+_lock = _threading.Lock()
+
+
+def is_active():
+    return _core_config.getint("search.result_cache_size", 200) > 0
+
+
+def make_principal(user=None, ip=None, req=None):
+    """Returns a hashable access principal, built like the arguments of the access check functions"""
+    group_ids, ip, date = _core_database_postgres.build_accessfunc_arguments(user, ip, req=req)
+    if group_ids is not None:
+        group_ids = tuple(sorted(group_ids))
+    return (group_ids, ip and str(ip), date)
+
+
+def make_key(searchtree, languages, container_id, sortfields, user=None, ip=None, req=None):
+    """
+    Returns a cache key for a search result.
+    The access principal is built with `make_principal`, the other arguments must be hashable.
+    """
+    return (searchtree, tuple(languages), container_id, tuple(sortfields), make_principal(user, ip, req))
+
+
+def get_result_ids(key, id_query):
+    """
+    Returns the list of node ids for `key`, running `id_query` if the ids are not cached.
+    The first column of `id_query` must be the node id in result order.
+    Returns None if the result has more ids than `search.result_cache_max_ids`,
+    callers must use the database query then.
+    """
+    generation = content_generation.get()
+    now = _time.time()
+    with _lock:
+        entry = _entries.pop(key, None)
+        if entry is not None and entry[0] == generation and entry[1] > now:
+            _entries[key] = entry
+            return entry[2]
+
+    max_ids = _core_config.getint("search.result_cache_max_ids", 20000)
+    ids = [row[0] for row in id_query.limit(max_ids + 1)]
+    if len(ids) > max_ids:
+        _logg.debug("search result too large for result cache, more than %s ids", max_ids)
+        ids = None
+
+    ttl = _core_config.getint("search.result_cache_ttl", 300)
+    size = _core_config.getint("search.result_cache_size", 200)
+    with _lock:
+        _entries[key] = (generation, now + ttl, ids)
+        while len(_entries) > size:
+            _entries.popitem(last=False)
+    return ids
+
+
+def clear():
+    with _lock:
+        _entries.clear()
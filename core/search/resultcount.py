@@ -0,0 +1,85 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Counts of node query results, for search results and container listings.
+An exact count costs as much as fetching the whole result, so counts are cached per process,
+keyed by the compiled query and the access principal,
+and discarded when the content generation changes (see core.search.resultcache).
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import collections as _collections
+import hashlib as _hashlib
+import logging as _logging
+import threading as _threading
+import time as _time
+
+import core as _core
+import core.config as _core_config
+import core.search.resultcache as _resultcache
+
+_logg = _logging.getLogger(__name__)
+
+# key -> (generation, expiry time, count), least recently used first
+_entries = _collections.OrderedDict()
+_lock = _threading.Lock()
+
+
+def _compile(query):
+    return query.statement.compile(dialect=_core.db.session.connection().dialect)
+
+
+def _make_key(compiled, principal):
+    fingerprint = _hashlib.sha1(u"{}\n{!r}".format(compiled, sorted(compiled.params.items())).encode("utf8")).hexdigest()
+    return (fingerprint, principal)
+
+
+def get_cached_count(query, principal=None):
+    """Returns the cached count of `query` or None"""
+    key = _make_key(_compile(query), principal)
+    generation = _resultcache.content_generation.get()
+    with _lock:
+        entry = _entries.get(key)
+    if entry is not None and entry[0] == generation and entry[1] > _time.time():
+        return entry[2]
+
+
+def count_results(query, principal=None):
+    """
+    Returns the number of results of `query`.
+    `principal` must identify the access principal if the query is filtered by access,
+    see `core.search.resultcache.make_principal`.
+    """
+    key = _make_key(_compile(query), principal)
+    generation = _resultcache.content_generation.get()
+    now = _time.time()
+    with _lock:
+        entry = _entries.pop(key, None)
+        if entry is not None and entry[0] == generation and entry[1] > now:
+            _entries[key] = entry
+            return entry[2]
+
+    result = query.order_by(None).count()
+    _logg.debug("counted %s results", result)
+
+    ttl = _core_config.getint("search.count_cache_ttl", 300)
+    size = _core_config.getint("search.count_cache_size", 1000)
+    if size > 0:
+        with _lock:
+            _entries[key] = (generation, now + ttl, result)
+            while len(_entries) > size:
+                _entries.popitem(last=False)
+    return result
+
+
+def clear():
+    with _lock:
+        _entries.clear()
@@ -0,0 +1,90 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Bulk changes of the node tree.
+Adding a child to `node.children` or removing it fires the nodemapping triggers,
+which recalculate the transitive connections, inherited access rules and container child counts
+for each single mapping. The functions here stage all mapping changes in the database
+and apply them set-based at once (see `apply_mapping_changes` in noderelation_funcs.sql).
+Changes are not committed, the caller commits the transaction.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import collections as _collections
+import logging as _logging
+
+from sqlalchemy import text as _sqltext
+
+import core as _core
+import core.cachegeneration as _core_cachegeneration
+import core.search.resultcache as _resultcache
+from core.database.postgres import DB_SCHEMA_NAME
+
+_logg = _logging.getLogger(__name__)
+
+MappingChangeResult = _collections.namedtuple("MappingChangeResult", "inserted deleted affected_nodes")
+
+
+def _stage(session, op, mappings):
+    if not mappings:
+        return
+    nids, cids = zip(*mappings)
+    session.execute(
+            _sqltext("SELECT {}.stage_mapping_changes(:op, :nids, :cids)".format(DB_SCHEMA_NAME)),
+            {"op": op, "nids": list(nids), "cids": list(cids)},
+           )
+
+
+def change_mappings(removed=(), added=()):
+    """
+    Removes the mappings `removed` and adds the mappings `added`,
+    both given as iterables of (parent id, child id).
+    Raises an exception if the changes would create a cycle.
+    Node objects in the session are expired, their parents and children are reloaded on access.
+    Returns a MappingChangeResult.
+    """
+    removed = [(int(nid), int(cid)) for nid, cid in removed]
+    added = [(int(nid), int(cid)) for nid, cid in added]
+    if not (removed or added):
+        return MappingChangeResult(0, 0, 0)
+
+    session = _core.db.session
+    session.flush()
+    _stage(session, "delete", removed)
+    _stage(session, "insert", added)
+    result = MappingChangeResult(*session.execute(
+            _sqltext("SELECT * FROM {}.apply_mapping_changes()".format(DB_SCHEMA_NAME))).fetchone())
+    session.expire_all()
+    _core_cachegeneration.bump_after_commit(session, _resultcache.content_generation)
+    _logg.info("changed node mappings: %s inserted, %s deleted, %s nodes affected", *result)
+    return result
+
+
+def bulk_move(ids, src_id, dest_id):
+    """Moves the nodes `ids` from `src_id` to `dest_id`"""
+    return change_mappings(removed=((src_id, id) for id in ids), added=((dest_id, id) for id in ids))
+
+
+def bulk_copy(ids, dest_id):
+    """Adds the nodes `ids` as children of `dest_id`, keeping their other parents"""
+    return change_mappings(added=((dest_id, id) for id in ids))
+
+
+def bulk_delete(removed, trash_id=None):
+    """
+    Removes the mappings `removed` (parent id, child id).
+    If `trash_id` is given, the children are put into that trash directory.
+    """
+    removed = list(removed)
+    added = ()
+    if trash_id is not None:
+        added = ((trash_id, cid) for cid in frozenset(cid for _, cid in removed))
+    return change_mappings(removed=removed, added=added)
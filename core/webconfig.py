@@ -104,6 +104,7 @@ def initContexts():
     _request_handler.setBase(config.codebasedir)
     from core.config import resolve_filename
     tal.set_base(config.codebasedir)
+    tal.configure_program_cache(config.getint("tal.program_cache_size", 256), config.getfloat("tal.stat_ttl", 0))
     tal.add_macro_resolver(resolve_filename)
     tal.add_translator(_core_translation.translate_in_template)
     add_template_globals()
@@ -200,6 +201,9 @@ def initContexts():
     from web.services import export
     context = _request_handler.addContext("/services/export", ".")
     context.addModule(export).addHandler("request_handler").addPattern("/node/(?P<id>\d+).*")
+    from web.services import facets
+    context = _request_handler.addContext("/services/facets", ".")
+    context.addModule(facets).addHandler("request_handler").addPattern("/node/(?P<id>\d+).*")
 
     # === OAI ===
     if oai_enabled:
@@ -16,6 +16,7 @@ import urlparse as _urlparse
 
 import flask as _flask
 import lxml.etree as _lxml_etree
+import sqlalchemy as _sqlalchemy
 import sqlalchemy.orm as _sqlalchemy_orm
 import backports.functools_lru_cache as _backports_functools_lru_cache
 
@@ -27,6 +28,8 @@ import utils.date as date
 from schema.schema import getMetaType
 from core.database.postgres.node import Node
 import core.nodecache as _nodecache
+import core.nodesnapshots as _core_nodesnapshots
+import core.search.resultcache as _core_search_resultcache
 from core.users import get_guest_user
 
 logg = logging.getLogger(__name__)
@@ -115,7 +118,7 @@ def _identifier_to_node(identifier, idprefix):
         raise _OAIError("badArgument")
     if not identifier.startswith(idprefix):
         raise _OAIError("idDoesNotExist")
-    node = _core.db.query(Node).get(int(identifier[len(idprefix):]))
+    node = _core_nodesnapshots.get_node(int(identifier[len(idprefix):]))
     if not node:
         raise _OAIError("noRecordsMatch")
     if not node.has_read_access(user=get_guest_user()):
@@ -279,7 +282,7 @@ def _retrieve_nodes(setspec, date_from, date_to, metadataformat):
     return nodequery
 
 
-def _get_nids(metadataformat, fromParam, untilParam, setParam):
+def _get_nodequery(metadataformat, fromParam, untilParam, setParam):
     earliest_year = config.getint("oai.earliest_year", 1960)
     date_from = None
     date_to = None
@@ -308,8 +311,12 @@ def _get_nids(metadataformat, fromParam, untilParam, setParam):
         raise _OAIError("badArgument")
 
     nodequery = _retrieve_nodes(setParam, date_from, date_to, metadataformat)
-    nodequery = nodequery.filter(Node.subnode == False)
     # filter out nodes that are inactive or older versions of other nodes
+    return nodequery.filter(Node.subnode == False)
+
+
+def _get_nids(metadataformat, fromParam, untilParam, setParam):
+    nodequery = _get_nodequery(metadataformat, fromParam, untilParam, setParam)
     nodes = nodequery.options(_sqlalchemy_orm.load_only('id')).all()
     if not nodes:
         raise _OAIError("noRecordsMatch")
@@ -317,6 +324,119 @@ def _get_nids(metadataformat, fromParam, untilParam, setParam):
     return sorted(n.id for n in nodes)
 
 
+def _make_token_element(token, size, cursor):
+    token = _json.dumps(token)
+    token = _base64.b32encode(token).lower()
+    token_element = _lxml_etree.Element("resumptionToken", attrib=dict(
+        expirationDate = _iso8601(date.now().add(3600 * 24)),
+        completeListSize = str(size),
+        cursor = str(cursor),
+    ))
+    token_element.text = token
+    return token_element
+
+
+def _get_nodes_by_hash(token):
+    # Legacy token format, still accepted for tokens that
+    # were handed out before the keyset format was introduced.
+    # The token contains the position within the sorted list of
+    # all search results and a hash of all search results.
+    # The hash is needed to detect if the set of results
+    # changed between requests;  if that happened,
+    # we return an error as  we cannot answer the request
+    # without risking inconsistencies in the results.
+    nids = _get_nids(token["metadataPrefix"], token["from"], token["until"], token["set"])
+
+    logg.info("_get_nodes : set=%s, objects=%s, format=%s", token["set"], len(nids), token["metadataPrefix"])
+
+    new_hash = " ".join(_itertools.imap(str, nids)).encode("ascii")
+    new_hash = _base64.b64encode(_hashlib.sha512(new_hash).digest()[:8])
+
+    if token.get("hash", new_hash) != new_hash:
+        raise _OAIError("badResumptionToken")
+
+    chunksize = config.getint("oai.chunksize", 10)
+    pos = token["pos"] + chunksize
+    nodes = _core.db.query(Node).filter(Node.id.in_(nids[token["pos"]: pos])).all()
+
+    if pos < len(nids):
+        token["hash"] = new_hash
+        token["pos"] = pos
+        return nodes, _make_token_element(token, len(nids), pos)
+
+    return nodes, None
+
+
+def _result_marker(nodequery, snapshot=None):
+    """
+    Returns the number, the sum and the maximum of the node ids in `nodequery`, up to `snapshot` if given.
+    Number and sum change if nodes are removed from or added to the list.
+    """
+    if snapshot is not None:
+        nodequery = nodequery.filter(Node.id <= snapshot)
+    ids = nodequery.with_entities(Node.id).distinct().subquery()
+    return _core.db.session.query(
+            _sqlalchemy.func.count(ids.c.id),
+            _sqlalchemy.func.coalesce(_sqlalchemy.func.sum(ids.c.id), 0),
+            _sqlalchemy.func.max(ids.c.id),
+        ).one()
+
+
+def _get_nodes_by_keyset(token):
+    # The token contains the id of the last delivered node,
+    # so each page is a cheap index range scan ordered by node id.
+    # On the first page, we determine the number of results
+    # and the highest node id ("snapshot");  nodes with
+    # higher ids (i.e. nodes created after the first page was
+    # delivered) are not part of this list.
+    # To detect if the set of results changed between requests,
+    # the token contains a change marker: the number and the sum
+    # of the result ids up to the snapshot.  If a node was removed
+    # from or added to the list, the marker changes and we return an error
+    # as we cannot answer the request without risking
+    # inconsistencies in the results (completeListSize and cursor).
+    # Computing the marker reads the whole list, so it is only
+    # recomputed if the content generation (see core.search.resultcache)
+    # changed since the marker was computed.
+    nodequery = _get_nodequery(token["metadataPrefix"], token["from"], token["until"], token["set"])
+
+    generation = _core_search_resultcache.content_generation.get()
+    if "last_id" not in token:
+        size, idsum, snapshot = _result_marker(nodequery)
+        if not size:
+            raise _OAIError("noRecordsMatch")
+        token.update(last_id=0, snapshot=snapshot, size=size, cursor=0, marker=[size, idsum], generation=generation)
+    elif "marker" not in token:
+        raise _OAIError("badResumptionToken")
+    elif token.get("generation") != generation:
+        size, idsum, _ = _result_marker(nodequery, token["snapshot"])
+        if [size, idsum] != token["marker"]:
+            raise _OAIError("badResumptionToken")
+        token["generation"] = generation
+
+    logg.info("_get_nodes : set=%s, objects=%s, format=%s", token["set"], token["size"], token["metadataPrefix"])
+
+    chunksize = config.getint("oai.chunksize", 10)
+    nids = (nodequery
+            .with_entities(Node.id)
+            .filter(Node.id > token["last_id"])
+            .filter(Node.id <= token["snapshot"])
+            .distinct()
+            .order_by(Node.id)
+            .limit(chunksize)
+            .all())
+    nids = [nid for nid, in nids]
+    nodes = _core.db.query(Node).filter(Node.id.in_(nids)).order_by(Node.id).all() if nids else []
+
+    cursor = token["cursor"] + len(nids)
+    if len(nids) == chunksize and nids[-1] < token["snapshot"]:
+        token["last_id"] = nids[-1]
+        token["cursor"] = cursor
+        return nodes, _make_token_element(token, token["size"], cursor)
+
+    return nodes, None
+
+
 def _get_nodes(set_param=None, metadataPrefix=None, date_from=None, until=None, resumptionToken=None):
     # OAI permits to deliver only a subset of the results,
     # together with a so-called "resumption token" that may be
@@ -326,12 +446,8 @@ def _get_nodes(set_param=None, metadataPrefix=None, date_from=None, until=None,
     # so if the token is part of another request,
     # we can resume the response with the token string alone.
     # Besides request paramteres, the token contains the
-    # current position within the list of search results,
-    # and a hash of all search results.
-    # The hash is needed to detect if the set of results
-    # changed between requests;  if that happened,
-    # we return an error as  we cannot answer the request
-    # without risking inconsistencies in the results.
+    # current position within the list of search results
+    # (see _get_nodes_by_keyset and _get_nodes_by_hash).
     if resumptionToken:
         try:
             token =  _base64.b32decode(resumptionToken.upper())
@@ -343,7 +459,6 @@ def _get_nodes(set_param=None, metadataPrefix=None, date_from=None, until=None,
     else:
         token = {
             "metadataPrefix": metadataPrefix,
-            "pos": 0,
             "from": date_from,
             "until": until,
             "set": set_param,
@@ -352,36 +467,12 @@ def _get_nodes(set_param=None, metadataPrefix=None, date_from=None, until=None,
             logg.info('OAI: ListRecords: metadataPrefix missing')
             raise _OAIError("badArgument")
 
-    nids = _get_nids(token["metadataPrefix"], token["from"], token["until"], token["set"])
-
-    logg.info("_get_nodes : set=%s, objects=%s, format=%s", token["set"], len(nids), token["metadataPrefix"])
-
-    new_hash = " ".join(_itertools.imap(str, nids)).encode("ascii")
-    new_hash = _base64.b64encode(_hashlib.sha512(new_hash).digest()[:8])
-
-    if token.get("hash", new_hash) != new_hash:
-        raise _OAIError("badResumptionToken")
-
-    chunksize = config.getint("oai.chunksize", 10)
-    pos = token["pos"] + chunksize
-    nodes = _core.db.query(Node).filter(Node.id.in_(nids[token["pos"]: pos])).all()
-    metadataformat = token["metadataPrefix"]
-
-    if pos < len(nids):
-        token["hash"] = new_hash
-        token["pos"] = pos
-        token = _json.dumps(token)
-        token = _base64.b32encode(token).lower()
-        token_element = _lxml_etree.Element("resumptionToken", attrib=dict(
-            expirationDate = _iso8601(date.now().add(3600 * 24)),
-            completeListSize = str(len(nids)),
-            cursor = str(pos),
-        ))
-        token_element.text = token
+    if "pos" in token:
+        nodes, token_element = _get_nodes_by_hash(token)
     else:
-        token_element = None
+        nodes, token_element = _get_nodes_by_keyset(token)
 
-    return nodes, token_element, metadataformat
+    return nodes, token_element, token["metadataPrefix"]
 
 
 def _list_identifiers(idprefix, set=None, metadataPrefix=None, until=None, resumptionToken=None, **excess):
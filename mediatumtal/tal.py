@@ -5,7 +5,7 @@ from __future__ import print_function
 from __future__ import division, absolute_import
 
 from mediatumtal import talextracted
-from mediatumtal.talextracted import processTAL, str_processTAL
+from mediatumtal.talextracted import processTAL, str_processTAL, iter_processTAL
 from mediatumtal.talextracted import runTAL  # @UnusedImport
 
 
@@ -15,6 +15,10 @@ def str_getTAL(page, context, macro=None, language=None, request=None):
 def getTAL(page, context, macro=None, language=None, request=None):
     return processTAL(context, file=page, macro=macro, language=language, request=request)
 
+def iter_getTAL(page, context, macro=None, language=None, request=None, chunksize=65536):
+    """Like getTAL, but returns a generator of unicode chunks which can be passed to a streamed response"""
+    return iter_processTAL(context, file=page, macro=macro, language=language, request=request, chunksize=chunksize)
+
 def getTALstr(string, context, macro=None, language=None, mode=None):
     # processTAL doesn't support unicode template strings, let's encode it first
     if isinstance(string, unicode):
@@ -37,3 +41,10 @@ def add_macro_resolver(macroresolver):
 def add_template_globals(**kwargs):
     """Adds globals from a dict which will be available in all template contexts"""
     talextracted.template_globals.update(kwargs)
+
+
+def configure_program_cache(maxsize=None, stat_ttl=None):
+    """Sets the maximum number of cached template programs and
+    the number of seconds a template file's mtime check is skipped after the last check.
+    """
+    talextracted.program_cache.configure(maxsize, stat_ttl)
@@ -1565,8 +1565,10 @@ class TALInterpreter:
         self.tal = tal
         if tal:
             self.dispatch = self.bytecode_handlers_tal
+            self.iter_dispatch = self.iter_handlers_tal
         else:
             self.dispatch = self.bytecode_handlers
+            self.iter_dispatch = self.iter_handlers
         assert showtal in (-1, 0, 1)
         if showtal == -1:
             showtal = (not tal)
@@ -1632,6 +1634,23 @@ class TALInterpreter:
             self._stream_write("\n")
             self.col = 0
 
+    def iterate(self):
+        """Like __call__, but yields while the program is rendered (see iter_interpret),
+        so the output written so far can be passed on by the caller.
+        """
+        assert self.level == 0
+        assert self.scopeLevel == 0
+        assert self.i18nContext.parent is None
+        for _ in self.iter_interpret(self.program):
+            yield
+        assert self.level == 0
+        assert self.scopeLevel == 0
+        assert self.i18nContext.parent is None
+        if self.col > 0:
+            self._stream_write("\n")
+            self.col = 0
+        yield
+
     def interpretWithStream(self, program, stream):
         oldstream = self.stream
         self.stream = stream
@@ -1672,6 +1691,28 @@ class TALInterpreter:
         finally:
             self.level = oldlevel
 
+    def iter_interpret(self, program):
+        """Generator version of interpret.
+        Yields after each instruction with a nested block (elements, loops, conditions, macros and slots),
+        also inside of these blocks.
+        Instructions which render into a temporary stream (tal:on-error, i18n) are rendered completely.
+        """
+        oldlevel = self.level
+        self.level = oldlevel + 1
+        handlers = self.dispatch
+        iter_handlers = self.iter_dispatch
+        try:
+            for (opcode, args) in program:
+                iter_handler = iter_handlers.get(opcode)
+                if iter_handler is None:
+                    handlers[opcode](self, args)
+                    continue
+                for _ in iter_handler(self, args):
+                    yield
+                yield
+        finally:
+            self.level = oldlevel
+
     def do_version(self, version):
         assert version == TAL_VERSION
     bytecode_handlers["version"] = do_version
@@ -2177,6 +2218,129 @@ class TALInterpreter:
     bytecode_handlers_tal["<attrAction>"] = attrAction_tal
     bytecode_handlers_tal["optTag"] = do_optTag_tal
 
+    # generator versions of the handlers with nested blocks, used by iter_interpret
+
+    def iter_no_tag(self, start, program):
+        state = self.saveState()
+        self.stream = stream = self.StringIO()
+        self._stream_write = stream.write
+        self.interpret(start)
+        self.restoreOutputState(state)
+        for _ in self.iter_interpret(program):
+            yield
+
+    def iter_optTag(self, (name, cexpr, tag_ns, isend, start, program)):
+        if tag_ns and not self.showtal:
+            for _ in self.iter_no_tag(start, program):
+                yield
+            return
+
+        self.interpret(start)
+        if not isend:
+            for _ in self.iter_interpret(program):
+                yield
+            s = '</%s>' % name
+            self._stream_write(s)
+            self.col = self.col + len(s)
+
+    def iter_optTag_tal(self, stuff):
+        cexpr = stuff[1]
+        if cexpr is not None and (cexpr == '' or
+                                  self.engine.evaluateBoolean(cexpr)):
+            blocks = self.iter_no_tag(stuff[-2], stuff[-1])
+        else:
+            blocks = self.iter_optTag(stuff)
+        for _ in blocks:
+            yield
+
+    def iter_loop(self, (name, expr, block)):
+        for _ in self.iter_interpret(block):
+            yield
+
+    def iter_loop_tal(self, (name, expr, block)):
+        iterator = self.engine.setRepeat(name, expr)
+        while iterator.next():
+            for _ in self.iter_interpret(block):
+                yield
+
+    def iter_condition(self, (condition, block)):
+        if not self.tal or self.engine.evaluateBoolean(condition):
+            for _ in self.iter_interpret(block):
+                yield
+
+    def iter_defineMacro(self, (macroName, macro)):
+        macs = self.macroStack
+        if len(macs) == 1:
+            entering = macs[-1][2]
+            if not entering:
+                macs.append(None)
+                for _ in self.iter_interpret(macro):
+                    yield
+                assert macs[-1] is None
+                macs.pop()
+                return
+        for _ in self.iter_interpret(macro):
+            yield
+
+    def iter_useMacro(self, (macroName, macroExpr, compiledSlots, block)):
+        if not self.metal:
+            for _ in self.iter_interpret(block):
+                yield
+            return
+        macro = self.engine.evaluateMacro(macroExpr)
+        if macro is self.Default:
+            macro = block
+        elif not isCurrentVersion(macro):
+            raise METALError("macro %s has incompatible version %s" %
+                             (`macroName`, `getProgramVersion(macro)`),
+                             self.position)
+
+        self.pushMacro(macroName, compiledSlots)
+        prev_source = self.sourceFile
+        for _ in self.iter_interpret(macro):
+            yield
+        if self.sourceFile != prev_source:
+            self.engine.setSourceFile(prev_source)
+            self.sourceFile = prev_source
+        self.popMacro()
+
+    def iter_fillSlot(self, (slotName, block)):
+        for _ in self.iter_interpret(block):
+            yield
+
+    def iter_defineSlot(self, (slotName, block)):
+        if self.metal:
+            macs = self.macroStack
+            if macs and macs[-1] is not None:
+                macroName, slots = self.popMacro()[:2]
+                slot = slots.get(slotName)
+                if slot is not None:
+                    prev_source = self.sourceFile
+                    for _ in self.iter_interpret(slot):
+                        yield
+                    if self.sourceFile != prev_source:
+                        self.engine.setSourceFile(prev_source)
+                        self.sourceFile = prev_source
+                    self.pushMacro(macroName, slots, entering=0)
+                    return
+                self.pushMacro(macroName, slots)
+        for _ in self.iter_interpret(block):
+            yield
+
+    iter_handlers = {
+        "optTag": iter_optTag,
+        "loop": iter_loop,
+        "condition": iter_condition,
+        "defineMacro": iter_defineMacro,
+        "useMacro": iter_useMacro,
+        "fillSlot": iter_fillSlot,
+        "defineSlot": iter_defineSlot,
+    }
+
+    iter_handlers_tal = iter_handlers.copy()
+    iter_handlers_tal["optTag"] = iter_optTag_tal
+    iter_handlers_tal["loop"] = iter_loop_tal
+
 
 class FasterStringIO(StringIO):
     """Append-only version of StringIO.
@@ -2344,6 +2508,9 @@ import re
 import sys
 import stat
 import os
+import time
+import threading
+import collections
 import traceback
 
 class _Default:
@@ -2355,6 +2522,58 @@ name_match = re.compile(r"(?s)(%s):(.*)\Z" % NAME_RE).match
 class CompilerError(Exception):
     pass
 
+
+def _split_path(expr):
+    expr = expr.strip()
+    pos = expr.rfind("/")
+    if pos > 0:
+        return expr[0:pos], expr[pos+1:]
+    return expr, None
+
+
+class CompiledExpression(str):
+    """TALES expression as returned by AthanaTALEngine.compile().
+    It still is the string "$expression$", but carries the expression type,
+    the code object of python: and request: expressions
+    and the (variable, attribute) split of path expressions.
+    """
+
+    def __new__(cls, expression):
+        if isinstance(expression, unicode):
+            self = str.__new__(cls, "$%s$" % expression.encode("utf8"))
+        else:
+            self = str.__new__(cls, "$%s$" % expression)
+        m = name_match(expression)
+        if m:
+            self.type, self.expr = m.group(1, 2)
+        else:
+            self.type = "path"
+            self.expr = expression
+        self.code = self.path = self.negated = None
+        if self.type in ("python", "request"):
+            try:
+                # eval() strips leading blanks, compile() doesn't
+                self.code = compile(self.expr.lstrip(" \t"), "<TALES expression>", "eval")
+            except SyntaxError:
+                # evaluate() falls back to eval() which reports the error
+                pass
+        elif self.type in ("path", "var", "global", "local"):
+            self.path = _split_path(self.expr)
+        elif self.type == "not":
+            self.negated = compile_expression(self.expr)
+        return self
+
+
+compiled_expressions = {}
+
+def compile_expression(expr):
+    """Returns the CompiledExpression for `expr`, cached per expression string"""
+    compiled = compiled_expressions.get(expr)
+    if compiled is None:
+        compiled = compiled_expressions[expr] = CompiledExpression(expr)
+    return compiled
+
+
 class AthanaTALEngine:
 
     position = None
@@ -2376,15 +2595,17 @@ class AthanaTALEngine:
         self.language = language
         self.request = request
 
+    def _get_file_mode(self, file):
+        ext = os.path.splitext(file)[1]
+        if ext.lower() in (".html", ".htm"):
+            return "html"
+        return "xml"
+
     def compilefile(self, file, mode=None):
         assert mode in ("html", "xml", None)
 #         file =  join_paths(GLOBAL_ROOT_DIR,join_paths(self.webcontext.root, file))
         if mode is None:
-            ext = os.path.splitext(file)[1]
-            if ext.lower() in (".html", ".htm"):
-                mode = "html"
-            else:
-                mode = "xml"
+            mode = self._get_file_mode(file)
         if mode == "html":
             p = HTMLTALParser(TALGenerator(self))
         else:
@@ -2405,7 +2626,7 @@ class AthanaTALEngine:
         self.position = position
 
     def compile(self, expr):
-        return "$%s$" % expr
+        return compile_expression(expr)
 
     def uncompile(self, expression):
         assert expression.startswith("$") and expression.endswith("$"), expression
@@ -2427,25 +2648,22 @@ class AthanaTALEngine:
         self.globals[name] = value
 
     def evaluate(self, expression):
-        assert expression.startswith("$") and expression.endswith("$"), expression
-        expression = expression[1:-1]
-        m = name_match(expression)
-        if m:
-            type, expr = m.group(1, 2)
-        else:
-            type = "path"
-            expr = expression
+        if not isinstance(expression, CompiledExpression):
+            assert expression.startswith("$") and expression.endswith("$"), expression
+            expression = compile_expression(expression[1:-1])
+        type = expression.type
+        expr = expression.expr
         if type in ("string", "str"):
             return expr
         if type in ("path", "var", "global", "local"):
-            return self.evaluatePathOrVar(expr)
+            return self._evaluatePath(*expression.path)
         if type == "not":
-            return not self.evaluate("$" + expr + "$")
+            return not self.evaluate(expression.negated)
         if type == "exists":
             return self.locals.has_key(expr) or self.globals.has_key(expr)
         if type == "request":
             try:
-                return eval(expr, {}, self.request.params)
+                return eval(expression.code or expr, {}, self.request.params)
             except NameError:
                 return None
             except Exception as e:
@@ -2453,7 +2671,7 @@ class AthanaTALEngine:
                 raise TALESError("evaluation error in %s" % `expr`)
         if type == "python":
             try:
-                return eval(expr, self.globals, self.locals)
+                return eval(expression.code or expr, self.globals, self.locals)
             except Exception as e:
                 logg.exception("exception in TAL python evaluation:")
                 logg.error("trace for exception:")
@@ -2468,13 +2686,9 @@ class AthanaTALEngine:
         raise TALESError("unrecognized expression: " + `expression`)
 
     def evaluatePathOrVar(self, expr):
-        expr = expr.strip()
-        _expr=expr
-        _f=None
-        if expr.rfind("/")>0:
-            pos=expr.rfind("/")
-            _expr = expr[0:pos]
-            _f = expr[pos+1:]
+        return self._evaluatePath(*_split_path(expr))
+
+    def _evaluatePath(self, _expr, _f):
         if _expr in self.locals:
             if _f:
                 return getattr(self.locals[_expr],_f)
@@ -2515,7 +2729,7 @@ class AthanaTALEngine:
         if not file:
             macro = self.macros[localName]
         else:
-            program, macros = self.compilefile(file)
+            program, macros = program_cache.get(file, self._get_file_mode(file))
             macro = macros.get(localName)
             if not macro:
                 raise TALESError("macro %s not found in file %s" %
@@ -2617,12 +2831,77 @@ class Iterator:
 
 VARIABLE = re.compile(r'\$(?:(%s)|\{(%s)\})' % (NAME_RE, NAME_RE))
 
-parsed_files = {}
 parsed_strings = {}
 
 template_globals = {}
 
-def runTAL(writer, context=None, string=None, file=None, macro=None, language=None, request=None, mode=None):
+
+class ProgramCache(object):
+    """Process-wide cache for programs compiled from template files.
+    Entries are keyed by resolved file path and parser mode.
+    A cached program is only used if the file's mtime didn't change;
+    if `stat_ttl` is greater than 0, the mtime is checked at most once
+    per `stat_ttl` seconds for each entry.
+    If the cache holds more than `maxsize` entries,
+    the least recently used entry is dropped.
+    """
+
+    def __init__(self, maxsize=256, stat_ttl=0):
+        self.maxsize = maxsize
+        self.stat_ttl = stat_ttl
+        self.hits = self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, maxsize=None, stat_ttl=None):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if stat_ttl is not None:
+                self.stat_ttl = stat_ttl
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, file, mode):
+        """Returns (program, macros) for `file`, compiled in `mode` ("html" or "xml")"""
+        key = (file, mode)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            program, macros, mtime, checked = entry
+            if self.stat_ttl <= 0 or now - checked >= self.stat_ttl:
+                if os.stat(file)[stat.ST_MTIME] != mtime:
+                    entry = None
+                else:
+                    checked = now
+        if entry is None:
+            self.misses += 1
+            mtime = os.stat(file)[stat.ST_MTIME]
+            if mode == "html":
+                talparser = HTMLTALParser(TALGenerator(AthanaTALEngine()))
+            else:
+                talparser = TALParser(TALGenerator(AthanaTALEngine()))
+            talparser.parseFile(file)
+            program, macros = talparser.getCode()
+            checked = now
+        else:
+            self.hits += 1
+        with self._lock:
+            self._entries[key] = (program, macros, mtime, checked)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return program, macros
+
+
+program_cache = ProgramCache()
+
+
+def _make_interpreter(writer, context=None, string=None, file=None, macro=None, language=None, request=None, mode=None):
 
     if file:
         file = getMacroFile(file)
@@ -2634,67 +2913,104 @@ def runTAL(writer, context=None, string=None, file=None, macro=None, language=No
         if string in parsed_strings:
             program,macros = parsed_strings[string]
         else:
-            program,macros = None,None
-    elif file and not string:
-        if file in parsed_files:
-            (program,macros,mtime) = parsed_files[file]
-            mtime_file = os.stat(file)[stat.ST_MTIME]
-            if mtime != mtime_file:
-                program,macros = None,None
-                mtime = mtime_file
-        else:
-            program,macros,mtime = None,None,None
-
-    if not (program and macros):
-        if file and file.endswith("xml") or mode=="xml":
-            talparser = TALParser(TALGenerator(AthanaTALEngine()))
-        else:
-            talparser = HTMLTALParser(TALGenerator(AthanaTALEngine()))
-        if string:
+            if mode=="xml":
+                talparser = TALParser(TALGenerator(AthanaTALEngine()))
+            else:
+                talparser = HTMLTALParser(TALGenerator(AthanaTALEngine()))
             talparser.parseString(string)
             (program, macros) = talparser.getCode()
             parsed_strings[string] = (program,macros)
+    elif file and not string:
+        if file.endswith("xml") or mode=="xml":
+            program,macros = program_cache.get(file, "xml")
         else:
-            talparser.parseFile(file)
-            (program, macros) = talparser.getCode()
-            parsed_files[file] = (program,macros,mtime)
+            program,macros = program_cache.get(file, "html")
 
     if macro and macro in macros:
         program = macros[macro]
     engine = AthanaTALEngine(macros, context, language=language, request=request)
-    TALInterpreter(program, macros, engine, writer, wrap=0)()
+    return TALInterpreter(program, macros, engine, writer, wrap=0)
+
+
+def runTAL(writer, context=None, string=None, file=None, macro=None, language=None, request=None, mode=None):
+    _make_interpreter(writer, context, string, file, macro, language, request, mode)()
+
+
+def iter_runTAL(writer, context=None, string=None, file=None, macro=None, language=None, request=None, mode=None, chunksize=65536):
+    """Generator version of runTAL for writers with a `pop()` method (StrWriter, UnicodeWriter).
+    The output is yielded in chunks of at least `chunksize` characters (the last chunk may be smaller).
+    Chunks are passed on while elements, loops and macros are rendered,
+    so they may end in the middle of an element.
+    """
+    interpreter = _make_interpreter(writer, context, string, file, macro, language, request, mode)
+    for _ in interpreter.iterate():
+        if writer.size >= chunksize:
+            yield writer.pop()
+    chunk = writer.pop()
+    if chunk:
+        yield chunk
+
+
+class StrWriter(object):
+    """Collects utf8 encoded output in a list and joins it on demand"""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, text):
+        if isinstance(text, unicode):
+            text = text.encode("utf-8")
+        self.chunks.append(text)
+        self.size += len(text)
+
+    def pop(self):
+        """Returns the output written since the last call and clears the buffer"""
+        text = "".join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return text
+
+    def getvalue(self):
+        return "".join(self.chunks)
+
+
+class UnicodeWriter(StrWriter):
+    """Collects unicode output in a list and joins it on demand"""
+
+    def write(self, text):
+        if isinstance(text, str):
+            text = text.decode("utf8")
+        self.chunks.append(text)
+        self.size += len(text)
+
+    def pop(self):
+        text = u"".join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return text
+
+    def getvalue(self):
+        return u"".join(self.chunks)
+
 
 def str_processTAL(context=None, string=None, file=None, macro=None, language=None, request=None, mode=None):
-    class STRWriter:
-        def __init__(self):
-            self.string = ""
-        def write(self,text):
-            if type(text) == type(u''):
-                self.string += text.encode("utf-8")
-            else:
-                self.string += text
-        def getvalue(self):
-            return self.string
-    wr = STRWriter()
+    wr = StrWriter()
     runTAL(wr, context, string=string, file=file, macro=macro, language=language, request=request, mode=mode)
     return wr.getvalue()
 
 def processTAL(context=None, string=None, file=None, macro=None, language=None, request=None, mode=None):
-    class UnicodeWriter:
-        def __init__(self):
-            self.string = u""
-        def write(self,text):
-            if isinstance(text, str):
-                text = text.decode("utf8")
-            self.string += text
-        def getvalue(self):
-            return self.string
-
     wr = UnicodeWriter()
     context.update(template_globals)
     runTAL(wr, context, string=string, file=file, macro=macro, language=language, request=request, mode=mode)
     return wr.getvalue()
 
+def iter_processTAL(context=None, string=None, file=None, macro=None, language=None, request=None, mode=None, chunksize=65536):
+    """Like processTAL, but yields the output in unicode chunks (see iter_runTAL)"""
+    context.update(template_globals)
+    return iter_runTAL(UnicodeWriter(), context, string=string, file=file, macro=macro, language=language,
+                       request=request, mode=mode, chunksize=chunksize)
+
 
 class MyWriter:
     def write(self,s):
@@ -12,23 +12,23 @@ from itertools import imap as map
 from itertools import ifilter as filter
 range = xrange
 
-import operator as _operator
-
-import sqlalchemy as _sqlalchemy
-
-import core as _core
-import core.database.postgres as _database__postgres
+import core.search.facets as _core_search_facets
 
 
 def count_list_values_for_all_content_children(collection_id, attribute_name):
     """
     returns an iterator of tuples (attribute-value, count) for a given attribute_name
-    below a collection
+    below a collection, served from the facet cache (see `core.search.facets`)
     :param collection_id:
     :param attribute_name:
     :return:
     """
-    func_call = _database__postgres.mediatumfunc.count_list_values_for_all_content_children(collection_id, attribute_name)
-    stmt = _sqlalchemy.sql.select([_sqlalchemy.sql.text("*")], from_obj=func_call)
-    res = _core.db.session.execute(stmt)
-    return map(_operator.itemgetter(0,1), res.fetchall())
+    return iter(_core_search_facets.get_value_counts(collection_id, (attribute_name,))[attribute_name])
+
+
+def prefetch_list_values_for_all_content_children(collection_id, attribute_names):
+    """
+    counts the values of all `attribute_names` below a collection in one query,
+    so that following calls of `count_list_values_for_all_content_children` are answered from the cache
+    """
+    _core_search_facets.get_value_counts(collection_id, tuple(attribute_names))
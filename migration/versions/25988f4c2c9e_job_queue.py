@@ -0,0 +1,49 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""add table for Job model
+
+Revision ID: 25988f4c2c9e
+Revises: 7073621e4777
+Create Date: 2026-10-18 11:02:17.304112
+
+"""
+
+# revision identifiers, used by Alembic.
+from __future__ import division
+from __future__ import print_function
+
+revision = '25988f4c2c9e'
+down_revision = u'7073621e4777'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('type', sa.Unicode(length=64), nullable=False),
+    sa.Column('node_id', sa.Integer(), nullable=True),
+    sa.Column('state', sa.Unicode(length=16), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_after', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('worker', sa.Unicode(length=255), nullable=True),
+    sa.Column('error', sa.UnicodeText(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['node_id'], [u'mediatum.node.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    schema='mediatum'
+    )
+    op.create_index('ix_job_queued', 'job', ['type', 'run_after'], unique=False, schema='mediatum',
+                    postgresql_where=sa.text("state = 'queued'"))
+    op.create_index('ix_job_node_id', 'job', ['node_id'], unique=False, schema='mediatum')
+
+
+def downgrade():
+    op.drop_table('job', schema='mediatum')
@@ -0,0 +1,70 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""allow bulk imports to defer the stored tsvector trigger
+
+Revision ID: 3f1c6d2a9b57
+Revises: d4cec160a9e8
+Create Date: 2026-10-18 15:41:09.518203
+
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import os as _os
+import sys as _sys
+import textwrap as _textwrap
+
+_sys.path.append(_os.path.abspath(_os.path.join(_os.path.dirname(__file__), "../..")))
+
+import alembic as _alembic
+
+import core as _core
+import core.init as _core_init
+_core_init.basic_init()
+
+# revision identifiers, used by Alembic.
+revision = '3f1c6d2a9b57'
+down_revision = u'd4cec160a9e8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    _core.db.create_functions(_core.db.session)
+
+
+def downgrade():
+    _alembic.op.execute(_textwrap.dedent(r"""
+        CREATE OR REPLACE FUNCTION mediatum.on_node_update_tsvectors() RETURNS trigger
+            LANGUAGE plpgsql
+            SET search_path = mediatum
+            VOLATILE
+            AS $$
+        DECLARE
+            sources text[] = '{}';
+        BEGIN
+            IF get_stored_tsvectors_mode() = 'none' THEN
+                RETURN NULL;
+            END IF;
+
+            IF TG_OP = 'INSERT' OR OLD.attrs IS DISTINCT FROM NEW.attrs THEN
+                sources = sources || 'attrs'::text;
+            END IF;
+
+            IF TG_OP = 'INSERT' OR OLD.fulltext IS DISTINCT FROM NEW.fulltext THEN
+                sources = sources || 'fulltext'::text;
+            END IF;
+
+            IF cardinality(sources) > 0 THEN
+                PERFORM refresh_node_tsvectors(ARRAY[NEW.id], sources);
+            END IF;
+        RETURN NULL;
+        END;
+        $$;
+    """))
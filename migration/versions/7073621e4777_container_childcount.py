@@ -0,0 +1,97 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""replace container_info by container_childcount
+
+Revision ID: 7073621e4777
+Revises: 190fd45cc2b0
+Create Date: 2026-10-18 10:12:31.482109
+
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import os as _os
+import sys as _sys
+import textwrap as _textwrap
+
+_sys.path.append(_os.path.abspath(_os.path.join(_os.path.dirname(__file__), "../..")))
+
+import alembic as _alembic
+
+import core as _core
+import core.init as _core_init
+_core_init.basic_init()
+
+# revision identifiers, used by Alembic.
+revision = '7073621e4777'
+down_revision = u'190fd45cc2b0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    _alembic.op.execute("DROP MATERIALIZED VIEW IF EXISTS container_info")
+    _alembic.op.execute(_textwrap.dedent("""
+        CREATE TABLE container_childcount (
+            nid integer NOT NULL PRIMARY KEY REFERENCES node(id) ON DELETE CASCADE,
+            count integer NOT NULL
+        )
+    """))
+    _core.db.create_functions(_core.db.session)
+    _alembic.op.execute("SELECT rebuild_container_childcount()")
+
+
+def downgrade():
+    _alembic.op.execute("DROP TRIGGER IF EXISTS node_update_childcount ON node")
+    _alembic.op.execute("DROP TRIGGER IF EXISTS node_delete_childcount ON node")
+    # still called by the mapping triggers
+    _alembic.op.execute(_textwrap.dedent("""
+        CREATE OR REPLACE FUNCTION update_container_childcount(parent_id integer, child_id integer, sign integer) RETURNS void
+            LANGUAGE plpgsql
+            SET search_path = mediatum
+            AS $f$
+        BEGIN
+        END;
+        $f$;
+    """))
+    for func in (
+            "update_container_childcount_of_ancestors(integer, integer)",
+            "on_node_update_childcount()",
+            "on_node_delete_childcount()",
+            "rebuild_container_childcount()",
+            "content_ids_in_subtree(integer)",
+            ):
+        _alembic.op.execute("DROP FUNCTION IF EXISTS {} CASCADE".format(func))
+    _alembic.op.execute("DROP TABLE container_childcount")
+    _alembic.op.execute(_textwrap.dedent("""
+        CREATE MATERIALIZED VIEW container_info AS
+        SELECT
+            id AS nid
+            ,(SELECT count(*) FROM node JOIN noderelation nr ON (id=cid)
+              WHERE nid=no.id
+              AND subnode=false
+              AND type IN (SELECT name FROM nodetype WHERE is_container=false)) AS count_content_children_for_all_subcontainers
+        FROM node no WHERE no.type IN (SELECT name FROM nodetype WHERE is_container=true);
+
+        CREATE UNIQUE INDEX ON container_info (nid);
+
+        CREATE OR REPLACE FUNCTION count_content_children_for_all_subcontainers(container_id integer)
+            RETURNS integer
+            LANGUAGE plpgsql
+            SET search_path = mediatum
+            IMMUTABLE
+            AS $f$
+        DECLARE
+            cc integer;
+        BEGIN
+            SELECT count_content_children_for_all_subcontainers INTO cc FROM container_info WHERE nid=container_id;
+            RETURN cc;
+        END;
+        $f$;
+    """))
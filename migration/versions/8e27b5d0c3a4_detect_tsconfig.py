@@ -0,0 +1,73 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""add stored tsvectors mode 'detected' with per-node language detection
+
+Revision ID: 8e27b5d0c3a4
+Revises: 3f1c6d2a9b57
+Create Date: 2026-10-18 16:22:37.104958
+
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import os as _os
+import sys as _sys
+import textwrap as _textwrap
+
+_sys.path.append(_os.path.abspath(_os.path.join(_os.path.dirname(__file__), "../..")))
+
+import alembic as _alembic
+
+import core as _core
+import core.init as _core_init
+_core_init.basic_init()
+
+# revision identifiers, used by Alembic.
+revision = '8e27b5d0c3a4'
+down_revision = u'3f1c6d2a9b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    _core.db.create_functions(_core.db.session)
+
+
+def downgrade():
+    _alembic.op.execute(_textwrap.dedent(r"""
+        CREATE OR REPLACE FUNCTION mediatum._node_tsvectors(_nids integer[], _sources text[], _mode text)
+            RETURNS TABLE (nid integer, source text, config text, tsvec tsvector)
+            LANGUAGE sql
+            SET search_path = mediatum
+            STABLE
+            AS $$
+            SELECT q.nid, 'attrs', q.config, q.tsvec
+            FROM (SELECT n.id AS nid, l AS config, jsonb_object_values_to_tsvector(l::regconfig, n.attrs) AS tsvec
+                  FROM node n, unnest(get_attribute_autoindex_languages()) l
+                  WHERE (_nids IS NULL OR n.id = ANY(_nids))) q
+            WHERE 'attrs' = ANY(_sources)
+            AND _mode != 'none'
+            AND length(q.tsvec) > 0
+
+            UNION ALL
+
+            -- in 'shortest' mode, keep only the tsvector of the language that stems best
+            (SELECT DISTINCT ON (q.nid, CASE WHEN _mode = 'shortest' THEN NULL ELSE q.config END)
+                    q.nid, 'fulltext', q.config, q.tsvec
+             FROM (SELECT n.id AS nid, l AS config, to_tsvector_safe(l::regconfig, n.fulltext) AS tsvec
+                   FROM node n, unnest(get_fulltext_autoindex_languages()) l
+                   WHERE (_nids IS NULL OR n.id = ANY(_nids))
+                   AND n.fulltext IS NOT NULL) q
+             WHERE 'fulltext' = ANY(_sources)
+             AND _mode != 'none'
+             AND q.tsvec IS NOT NULL
+             ORDER BY q.nid, CASE WHEN _mode = 'shortest' THEN NULL ELSE q.config END, length(q.tsvec));
+        $$;
+    """))
+    _alembic.op.execute("DROP FUNCTION IF EXISTS mediatum.detect_tsconfig(text[], text)")
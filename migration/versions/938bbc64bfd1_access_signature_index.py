@@ -0,0 +1,75 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""add access signature index for read and data rules
+
+Revision ID: 938bbc64bfd1
+Revises: 25988f4c2c9e
+Create Date: 2026-10-18 12:21:45.118305
+
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import os as _os
+import sys as _sys
+import textwrap as _textwrap
+
+_sys.path.append(_os.path.abspath(_os.path.join(_os.path.dirname(__file__), "../..")))
+
+import alembic as _alembic
+
+import core as _core
+import core.init as _core_init
+_core_init.basic_init()
+
+# revision identifiers, used by Alembic.
+revision = '938bbc64bfd1'
+down_revision = u'25988f4c2c9e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    _alembic.op.execute(_textwrap.dedent("""
+        CREATE TABLE access_signature (
+            id serial PRIMARY KEY,
+            ruletype text NOT NULL,
+            rule_ids integer[] NOT NULL,
+            inverts boolean[] NOT NULL,
+            UNIQUE (ruletype, rule_ids, inverts)
+        )
+    """))
+    _alembic.op.execute(_textwrap.dedent("""
+        CREATE TABLE node_to_access_signature (
+            nid integer NOT NULL REFERENCES node(id) ON DELETE CASCADE,
+            ruletype text NOT NULL,
+            signature_id integer NOT NULL REFERENCES access_signature(id) ON DELETE CASCADE,
+            PRIMARY KEY (nid, ruletype)
+        )
+    """))
+    _alembic.op.execute("CREATE INDEX ix_node_to_access_signature_lookup "
+                        "ON node_to_access_signature (ruletype, signature_id, nid)")
+    _core.db.create_functions(_core.db.session)
+    _alembic.op.execute("SELECT rebuild_access_signatures()")
+
+
+def downgrade():
+    for trigger in ("insert", "update", "delete"):
+        _alembic.op.execute("DROP TRIGGER IF EXISTS node_to_access_rule_{}_signature ON node_to_access_rule".format(trigger))
+    for func in (
+            "on_node_to_access_rule_change_signature()",
+            "integrity_check_access_signatures()",
+            "accessible_access_signatures(text, integer[], inet, date)",
+            "rebuild_access_signatures()",
+            "update_access_signatures(integer[])",
+            "_node_access_signatures(integer[])",
+            ):
+        _alembic.op.execute("DROP FUNCTION IF EXISTS {} CASCADE".format(func))
+    _alembic.op.execute("DROP TABLE node_to_access_signature")
+    _alembic.op.execute("DROP TABLE access_signature")
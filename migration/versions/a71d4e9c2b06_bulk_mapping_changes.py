@@ -0,0 +1,47 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""add functions for staged bulk node mapping changes
+
+Revision ID: a71d4e9c2b06
+Revises: 8e27b5d0c3a4
+Create Date: 2026-10-18 17:05:12.630418
+
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import os as _os
+import sys as _sys
+
+_sys.path.append(_os.path.abspath(_os.path.join(_os.path.dirname(__file__), "../..")))
+
+import alembic as _alembic
+
+import core as _core
+import core.init as _core_init
+_core_init.basic_init()
+
+# revision identifiers, used by Alembic.
+revision = 'a71d4e9c2b06'
+down_revision = u'8e27b5d0c3a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    _core.db.create_functions(_core.db.session)
+
+
+def downgrade():
+    for func in (
+            "apply_mapping_changes()",
+            "stage_mapping_changes(text, integer[], integer[])",
+            "update_inherited_access_rules_for_nodes(integer[])",
+            ):
+        _alembic.op.execute("DROP FUNCTION IF EXISTS mediatum.{}".format(func))
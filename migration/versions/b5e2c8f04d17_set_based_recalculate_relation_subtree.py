@@ -0,0 +1,87 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""recalculate the connections of a subtree set-based
+
+Revision ID: b5e2c8f04d17
+Revises: a71d4e9c2b06
+Create Date: 2026-10-18 17:48:03.215770
+
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import os as _os
+import sys as _sys
+import textwrap as _textwrap
+
+_sys.path.append(_os.path.abspath(_os.path.join(_os.path.dirname(__file__), "../..")))
+
+import alembic as _alembic
+
+import core as _core
+import core.init as _core_init
+_core_init.basic_init()
+
+# revision identifiers, used by Alembic.
+revision = 'b5e2c8f04d17'
+down_revision = u'a71d4e9c2b06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    _core.db.create_functions(_core.db.session)
+
+
+def downgrade():
+    # recalculate_relations() is kept, apply_mapping_changes() uses it
+    _alembic.op.execute(_textwrap.dedent(r"""
+        CREATE OR REPLACE FUNCTION mediatum.recalculate_relation_subtree(root_id integer, OUT inserted integer, OUT deleted integer, OUT affected_relations integer) RETURNS record
+            LANGUAGE plpgsql
+            SET search_path = mediatum
+            AS $f$
+        DECLARE
+            rel RECORD;
+            ins integer;
+            del integer;
+        BEGIN
+
+        deleted := 0;
+        inserted := 0;
+        affected_relations := 0;
+
+        -- check all connections to children of root
+        FOR rel IN SELECT cid, distance FROM noderelation WHERE nid = root_id LOOP
+
+            -- only delete tuples belonging to paths which could go through root_id
+            DELETE FROM noderelation nr
+            WHERE nr.cid = rel.cid
+            AND nr.distance > rel.distance
+            ;
+            GET DIAGNOSTICS del = ROW_COUNT;
+
+            INSERT INTO noderelation
+            SELECT DISTINCT * FROM transitive_closure_for_node(rel.cid)
+            WHERE distance > rel.distance
+            ;
+            GET DIAGNOSTICS ins = ROW_COUNT;
+
+            inserted := inserted + ins;
+            deleted := deleted + del;
+            affected_relations := affected_relations + 1;
+
+        END LOOP;
+
+        FOR rel IN SELECT cid, max(distance) AS distance FROM noderelation WHERE nid = root_id GROUP BY cid ORDER BY max(distance) LOOP
+            PERFORM update_inherited_access_rules_for_node(rel.cid);
+        END LOOP;
+
+        END;
+        $f$;
+    """))
@@ -0,0 +1,108 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""propagate inherited access rules set-based
+
+Revision ID: c9a3e6f1d482
+Revises: b5e2c8f04d17
+Create Date: 2026-10-18 18:31:44.902113
+
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import os as _os
+import sys as _sys
+import textwrap as _textwrap
+
+_sys.path.append(_os.path.abspath(_os.path.join(_os.path.dirname(__file__), "../..")))
+
+import alembic as _alembic
+
+import core as _core
+import core.init as _core_init
+_core_init.basic_init()
+
+# revision identifiers, used by Alembic.
+revision = 'c9a3e6f1d482'
+down_revision = u'b5e2c8f04d17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    _core.db.create_functions(_core.db.session)
+
+
+def downgrade():
+    _alembic.op.execute(_textwrap.dedent(r"""
+        CREATE OR REPLACE FUNCTION mediatum._update_children_inherited_rules(node_id integer, ruletype_ text)
+            RETURNS void
+            LANGUAGE plpgsql
+            SET search_path TO mediatum
+            VOLATILE
+        AS $f$
+        DECLARE
+            childrel record;
+            rec node_to_access_rule;
+        BEGIN
+            IF ruletype_ IN ('read', 'data') THEN
+                IF NOT EXISTS (SELECT FROM node_to_access_rule WHERE node_to_access_rule.nid=node_id AND node_to_access_rule.ruletype=ruletype_) THEN
+                    INSERT INTO node_to_access_rule SELECT * FROM _inherited_access_rules_read_type(node_id, ruletype_);
+                END IF;
+                FOR childrel IN SELECT cid, max(distance) AS distance FROM noderelation WHERE noderelation.nid=node_id GROUP BY cid ORDER BY max(distance) LOOP
+                    -- ignore nodes that have their own access rules
+                    IF NOT EXISTS (SELECT FROM node_to_access_rule WHERE node_to_access_rule.nid=childrel.cid AND node_to_access_rule.ruletype=ruletype_ AND NOT node_to_access_rule.inherited) THEN
+                        DELETE            FROM node_to_access_rule WHERE node_to_access_rule.nid=childrel.cid AND node_to_access_rule.ruletype=ruletype_ AND node_to_access_rule.inherited;
+                        INSERT INTO node_to_access_rule SELECT * from _inherited_access_rules_read_type(childrel.cid, ruletype_);
+                    END IF;
+                END LOOP;
+            ELSE
+                -- if a not-inherited rule got deleted, we might have to add its inherited
+                -- pendant which was previously barred from being part of the rules
+                INSERT INTO node_to_access_rule (SELECT * from inherited_access_rules_write(node_id) EXCEPT SELECT nid, rule_id, ruletype, invert, true, blocking FROM node_to_access_rule WHERE nid=node_id);
+                FOR childrel IN SELECT cid, max(distance) AS distance FROM noderelation WHERE noderelation.nid=node_id GROUP BY cid ORDER BY max(distance) LOOP
+                    DELETE FROM node_to_access_rule WHERE node_to_access_rule.nid=childrel.cid AND node_to_access_rule.ruletype=ruletype_ AND node_to_access_rule.inherited;
+                    INSERT INTO node_to_access_rule
+                        SELECT * from inherited_access_rules_write(childrel.cid) AS rules
+                        WHERE NOT EXISTS (
+                            SELECT FROM node_to_access_rule WHERE
+                                    node_to_access_rule.nid=rules.nid
+                                AND node_to_access_rule.rule_id=rules.rule_id
+                                AND node_to_access_rule.invert=rules.invert
+                                AND node_to_access_rule.ruletype=ruletype_
+                           )
+                       ;
+                END LOOP;
+            END IF;
+        END;
+        $f$;
+
+
+        CREATE OR REPLACE FUNCTION mediatum.update_inherited_access_rules_for_nodes(node_ids integer[])
+            RETURNS void
+            LANGUAGE plpgsql
+            SET search_path TO mediatum
+            VOLATILE
+        AS $f$
+        DECLARE
+            rel record;
+        BEGIN
+            FOR rel IN SELECT u.id, coalesce(max(nr.distance), 0) AS depth
+                       FROM unnest(node_ids) AS u(id)
+                       LEFT JOIN noderelation nr ON nr.cid = u.id
+                       GROUP BY u.id
+                       ORDER BY depth LOOP
+                PERFORM update_inherited_access_rules_for_node(rel.id);
+            END LOOP;
+        END;
+        $f$;
+
+
+        DROP FUNCTION IF EXISTS mediatum._update_inherited_rules_for_nodes(integer[], text);
+    """))
@@ -0,0 +1,97 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""add tables for background trash purge, delete_nodes set-based
+
+Revision ID: d2f7a9c31e85
+Revises: c9a3e6f1d482
+Create Date: 2026-10-18 19:12:06.418230
+
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import os as _os
+import sys as _sys
+import textwrap as _textwrap
+
+_sys.path.append(_os.path.abspath(_os.path.join(_os.path.dirname(__file__), "../..")))
+
+import alembic as _alembic
+import sqlalchemy as _sa
+
+import core as _core
+import core.init as _core_init
+_core_init.basic_init()
+
+# revision identifiers, used by Alembic.
+revision = 'd2f7a9c31e85'
+down_revision = u'c9a3e6f1d482'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    _alembic.op.create_table('node_purge',
+    _sa.Column('nid', _sa.Integer(), nullable=False),
+    _sa.Column('trash_id', _sa.Integer(), nullable=False),
+    _sa.Column('created_at', _sa.DateTime(), nullable=True),
+    _sa.ForeignKeyConstraint(['nid'], [u'mediatum.node.id'], ondelete='CASCADE'),
+    _sa.ForeignKeyConstraint(['trash_id'], [u'mediatum.node.id'], ondelete='CASCADE'),
+    _sa.PrimaryKeyConstraint('nid'),
+    schema='mediatum'
+    )
+    _alembic.op.create_index('ix_node_purge_trash_id', 'node_purge', ['trash_id'], unique=False, schema='mediatum')
+    _alembic.op.create_table('file_unlink',
+    _sa.Column('id', _sa.Integer(), nullable=False),
+    _sa.Column('path', _sa.Unicode(length=4096), nullable=False),
+    _sa.Column('error', _sa.UnicodeText(), nullable=True),
+    _sa.Column('created_at', _sa.DateTime(), nullable=True),
+    _sa.PrimaryKeyConstraint('id'),
+    schema='mediatum'
+    )
+    _core.db.create_functions(_core.db.session)
+
+
+def downgrade():
+    _alembic.op.drop_table('file_unlink', schema='mediatum')
+    _alembic.op.drop_table('node_purge', schema='mediatum')
+    _alembic.op.execute(_textwrap.dedent(r"""
+        CREATE OR REPLACE FUNCTION mediatum.delete_nodes(node_ids integer[], recursive bool = false) RETURNS integer
+            LANGUAGE plpgsql
+            SET search_path = mediatum
+            AS $f$
+        DECLARE
+            deleted_nodes integer;
+            subtree_ids integer[];
+            ids_to_delete integer[];
+        BEGIN
+
+            IF recursive THEN
+                SELECT array_agg(cid) INTO subtree_ids FROM noderelation WHERE nid IN (SELECT unnest(node_ids));
+                ids_to_delete = array_cat(subtree_ids, node_ids);
+                SET CONSTRAINTS ALL DEFERRED;
+            ELSE
+                ids_to_delete = node_ids;
+            END IF;
+
+            WITH del_rel AS
+               (DELETE FROM nodemapping
+                WHERE cid IN (SELECT unnest(ids_to_delete))
+                RETURNING cid AS id),
+
+            del_node AS
+                (DELETE FROM node
+                WHERE id IN (SELECT * FROM del_rel)
+                RETURNING *)
+
+            SELECT count(*) INTO deleted_nodes FROM del_node;
+            RETURN deleted_nodes;
+        END;
+        $f$;
+        """))
@@ -0,0 +1,65 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""add table node_tsvector for stored search tsvectors
+
+Revision ID: d4cec160a9e8
+Revises: 938bbc64bfd1
+Create Date: 2026-10-18 13:05:52.640871
+
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import os as _os
+import sys as _sys
+import textwrap as _textwrap
+
+_sys.path.append(_os.path.abspath(_os.path.join(_os.path.dirname(__file__), "../..")))
+
+import alembic as _alembic
+
+import core as _core
+import core.init as _core_init
+_core_init.basic_init()
+
+# revision identifiers, used by Alembic.
+revision = 'd4cec160a9e8'
+down_revision = u'938bbc64bfd1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    _alembic.op.execute(_textwrap.dedent("""
+        CREATE TABLE node_tsvector (
+            nid integer NOT NULL REFERENCES node(id) ON DELETE CASCADE,
+            source text NOT NULL,
+            config text NOT NULL,
+            tsvec tsvector NOT NULL,
+            PRIMARY KEY (nid, source, config)
+        )
+    """))
+    _alembic.op.execute("CREATE INDEX ix_node_tsvector_attrs ON node_tsvector USING gin (tsvec) WHERE source = 'attrs'")
+    _alembic.op.execute("CREATE INDEX ix_node_tsvector_fulltext ON node_tsvector USING gin (tsvec) WHERE source = 'fulltext'")
+    _core.db.create_functions(_core.db.session)
+    # fills the table only if search.stored_tsvectors is set
+    _alembic.op.execute("SELECT rebuild_node_tsvectors()")
+
+
+def downgrade():
+    _alembic.op.execute("DROP TRIGGER IF EXISTS update_node_tsvectors ON node")
+    for func in (
+            "on_node_update_tsvectors()",
+            "rebuild_node_tsvectors()",
+            "refresh_node_tsvectors(integer[], text[])",
+            "_node_tsvectors(integer[], text[], text)",
+            "get_stored_tsvectors_mode()",
+            ):
+        _alembic.op.execute("DROP FUNCTION IF EXISTS {} CASCADE".format(func))
+    _alembic.op.execute("DROP TABLE node_tsvector")
@@ -0,0 +1,54 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""add triggers notifying node changes for the node snapshot cache
+
+Revision ID: e8b41c7d2f90
+Revises: d2f7a9c31e85
+Create Date: 2026-10-18 19:47:21.530618
+
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import os as _os
+import sys as _sys
+import textwrap as _textwrap
+
+_sys.path.append(_os.path.abspath(_os.path.join(_os.path.dirname(__file__), "../..")))
+
+import alembic as _alembic
+
+import core as _core
+import core.init as _core_init
+_core_init.basic_init()
+
+# revision identifiers, used by Alembic.
+revision = 'e8b41c7d2f90'
+down_revision = u'd2f7a9c31e85'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    _core.db.create_functions(_core.db.session)
+
+
+def downgrade():
+    _alembic.op.execute(_textwrap.dedent(r"""
+        DROP TRIGGER IF EXISTS node_update_notify ON mediatum.node;
+        DROP TRIGGER IF EXISTS node_delete_notify ON mediatum.node;
+        DROP TRIGGER IF EXISTS node_to_file_insert_notify ON mediatum.node_to_file;
+        DROP TRIGGER IF EXISTS node_to_file_update_notify ON mediatum.node_to_file;
+        DROP TRIGGER IF EXISTS node_to_file_delete_notify ON mediatum.node_to_file;
+        DROP TRIGGER IF EXISTS file_update_notify ON mediatum.file;
+        DROP TRIGGER IF EXISTS noderelation_insert_notify ON mediatum.noderelation;
+        DROP TRIGGER IF EXISTS noderelation_delete_notify ON mediatum.noderelation;
+        DROP FUNCTION IF EXISTS mediatum.on_node_change_notify();
+        DROP FUNCTION IF EXISTS mediatum.notify_node_change(integer[]);
+        """))
@@ -0,0 +1,72 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""record the mode node_tsvector was rebuilt for
+
+Revision ID: f3a85d6e1c27
+Revises: e8b41c7d2f90
+Create Date: 2026-10-19 09:14:52.207731
+
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from itertools import imap as map
+from itertools import ifilter as filter
+range = xrange
+
+import os as _os
+import sys as _sys
+import textwrap as _textwrap
+
+_sys.path.append(_os.path.abspath(_os.path.join(_os.path.dirname(__file__), "../..")))
+
+import alembic as _alembic
+
+import core as _core
+import core.init as _core_init
+_core_init.basic_init()
+
+# revision identifiers, used by Alembic.
+revision = 'f3a85d6e1c27'
+down_revision = u'e8b41c7d2f90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    _core.db.create_functions(_core.db.session)
+    # a populated node_tsvector was built for the current mode
+    _alembic.op.execute(_textwrap.dedent(r"""
+        INSERT INTO mediatum.setting (key, value)
+        SELECT 'search.stored_tsvectors_built', value FROM mediatum.setting
+        WHERE key = 'search.stored_tsvectors'
+        AND value #>> '{}' != 'none'
+        AND EXISTS (SELECT FROM mediatum.node_tsvector)
+        ON CONFLICT (key) DO NOTHING;
+        """))
+
+
+def downgrade():
+    _alembic.op.execute(_textwrap.dedent(r"""
+        DELETE FROM mediatum.setting WHERE key = 'search.stored_tsvectors_built';
+
+        CREATE OR REPLACE FUNCTION mediatum.rebuild_node_tsvectors() RETURNS integer
+            LANGUAGE plpgsql
+            SET search_path = mediatum
+            VOLATILE
+            AS $$
+        DECLARE
+            rows integer;
+        BEGIN
+            TRUNCATE node_tsvector;
+
+            INSERT INTO node_tsvector (nid, source, config, tsvec)
+            SELECT * FROM _node_tsvectors(NULL, '{attrs,fulltext}', get_stored_tsvectors_mode());
+
+            GET DIAGNOSTICS rows = ROW_COUNT;
+            RETURN rows;
+        END;
+        $$;
+        """))
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Bulk (re)generation of thumbnails, image formats and PDF fulltexts.
+The file conversions and the extraction of image metadata run in a process pool,
+the database is only touched by the calling process.
+Paths and convert options come from the helpers of contenttypes.image and contenttypes.document,
+which are shared with the postprocessing of the nodes.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import logging
+import multiprocessing
+import os
+import time
+
+import core as _core
+import contenttypes.document as _contenttypes_document
+import contenttypes.image as _contenttypes_image
+from core.database.postgres.file import File
+from core.database.postgres.node import Node, t_noderelation
+from utils.search import import_node_fulltext
+from utils.utils import isnewer
+
+logg = logging.getLogger(__name__)
+
+DERIVATIVE_NODETYPES = (u"image", u"document")
+
+
+def _convert_image(src, dest, options, force):
+    if not force and isnewer(dest, src):
+        return False
+    _contenttypes_image.convert_image(src, dest, *options)
+    return True
+
+
+def _make_thumbnail(src, dest, force):
+    if not force and isnewer(dest, src):
+        return False
+    if os.path.exists(dest):
+        os.remove(dest)
+    _contenttypes_image.make_thumbnail_image(src, dest)
+    return True
+
+
+def _image_derivatives(spec, force):
+    generated = False
+    for mimetype, dest, options in spec["formats"]:
+        if dest != spec["original"]:
+            generated |= _convert_image(spec["original"], dest, options, force)
+    generated |= _make_thumbnail(spec["processing_file"], spec["thumbnail"], force)
+    processing_file = spec["processing_file"]
+    metadata = _contenttypes_image.extract_image_metadata(processing_file, os.path.getsize(processing_file))
+    return generated, metadata
+
+
+def _document_derivatives(spec, force):
+    doc, thumbnail, fulltext = spec["document"], spec["thumbnail"], spec["fulltext"]
+    if not force and isnewer(thumbnail, doc) and isnewer(fulltext, doc):
+        return False, None
+    return True, _contenttypes_document._process_pdf(doc, thumbnail, fulltext)
+
+
+_derivative_funcs = {
+    u"image": _image_derivatives,
+    u"document": _document_derivatives,
+}
+
+
+def _run_task(task):
+    """Runs in a pool process, must not use the database"""
+    node_id, nodetype, spec, force = task
+    try:
+        generated, result = _derivative_funcs[nodetype](spec, force)
+    except Exception as e:
+        logg.exception("generating derivatives for node %s failed", node_id)
+        return node_id, "failed", unicode(e)
+    return node_id, "generated" if generated else "skipped", result
+
+
+def _image_spec(node):
+    files = node.files.all()
+    originals = filter(lambda f: f.filetype == u"original", files)
+    if len(originals) != 1:
+        return None
+    original = originals[0].abspath
+    original_mimetype = originals[0].mimetype
+    formats = []
+    for mimetype in _contenttypes_image.Image.IMAGE_FORMATS_FOR_MIMETYPE[original_mimetype]:
+        if mimetype == original_mimetype:
+            formats.append((mimetype, original, ()))
+        else:
+            formats.append((mimetype,
+                            _contenttypes_image.get_image_format_path(original, mimetype),
+                            tuple(_contenttypes_image.get_convert_options(original_mimetype))))
+    processing_mimetype = _contenttypes_image.get_processing_mimetype(original_mimetype)
+    processing_file = next((dest for mimetype, dest, _ in formats if mimetype == processing_mimetype), original)
+    return dict(
+        original=original,
+        formats=formats,
+        processing_file=processing_file,
+        thumbnail=_contenttypes_image.get_thumbnail_path(processing_file),
+    )
+
+
+def _document_spec(node):
+    docs = node.files.filter_by(filetype=u"document").all()
+    if len(docs) != 1:
+        return None
+    thumbnail, fulltext = _contenttypes_document.get_derivative_paths(docs[0].abspath)
+    return dict(
+        document=docs[0].abspath,
+        thumbnail=thumbnail,
+        fulltext=fulltext,
+    )
+
+
+def _set_file(node, filetype, mimetype, abspath, keep=()):
+    """Makes `abspath` the only file of `node` with `filetype` and `mimetype`"""
+    old_files = node.files.filter_by(filetype=filetype, mimetype=mimetype).all()
+    if len(old_files) == 1 and old_files[0].abspath == abspath:
+        return
+    for old in old_files:
+        node.files.remove(old)
+        if old.abspath != abspath and old.abspath not in keep:
+            old.unlink()
+    node.files.append(File(abspath, filetype, mimetype))
+
+
+def _apply_image(node, spec, metadata):
+    for mimetype, dest, _ in spec["formats"]:
+        _set_file(node, u"image", mimetype, dest, keep=(spec["original"],))
+    _set_file(node, u"thumbnail", u"image/jpeg", spec["thumbnail"], keep=(spec["original"],))
+    for key, value in metadata.iteritems():
+        node.set(key, value)
+
+
+def _apply_document(node, spec, pdfinfo):
+    _set_file(node, u"thumbnail", u"image/jpeg", spec["thumbnail"])
+    _set_file(node, u"fulltext", u"text/plain", spec["fulltext"])
+    if pdfinfo is None:
+        return
+    node._set_pdf_attributes(pdfinfo)
+    import_node_fulltext(node, overwrite=True)
+
+
+_spec_funcs = {
+    u"image": (_image_spec, _apply_image),
+    u"document": (_document_spec, _apply_document),
+}
+
+
+def select_node_ids(nodetypes=DERIVATIVE_NODETYPES, schema=None, subtree_id=None):
+    """Returns the ids of all nodes of `nodetypes`, optionally restricted to a schema and the subtree below `subtree_id`"""
+    query = _core.db.query(Node.id).filter(Node.type.in_(nodetypes))
+    if schema is not None:
+        query = query.filter(Node.schema == schema)
+    if subtree_id is not None:
+        query = query.filter(Node.id.in_(_core.db.query(t_noderelation.c.cid).filter(t_noderelation.c.nid == subtree_id)))
+    return [nid for nid, in query.order_by(Node.id)]
+
+
+def generate_derivatives(node_ids, processes=None, batchsize=100, force=False):
+    """
+    (Re)generates thumbnails, image formats and PDF fulltexts for all nodes in `node_ids`.
+    Outputs that are newer than their source file are skipped unless `force` is set.
+    Changes are committed after each batch of `batchsize` nodes.
+    Returns a Counter with the number of generated, skipped and failed nodes.
+    """
+    stats = collections.Counter()
+    start_time = time.time()
+    pool = multiprocessing.Pool(processes)
+    try:
+        for batch_start in range(0, len(node_ids), batchsize):
+            batch = node_ids[batch_start:batch_start + batchsize]
+            nodes = {node.id: node for node in _core.db.query(Node).filter(Node.id.in_(batch))}
+            specs = {}
+            tasks = []
+            for node in nodes.itervalues():
+                spec_func, _ = _spec_funcs[node.type]
+                spec = spec_func(node)
+                if spec is None:
+                    stats["skipped"] += 1
+                    continue
+                specs[node.id] = spec
+                tasks.append((node.id, node.type, spec, force))
+
+            for node_id, status, result in pool.imap_unordered(_run_task, tasks):
+                stats[status] += 1
+                if status == "failed":
+                    logg.warning("node %s: %s", node_id, result)
+                    continue
+                node = nodes[node_id]
+                _, apply_func = _spec_funcs[node.type]
+                apply_func(node, specs[node_id], result)
+
+            _core.db.session.commit()
+            elapsed = time.time() - start_time
+            done = batch_start + len(batch)
+            logg.info("%s/%s nodes done (%s generated, %s skipped, %s failed), %.1f nodes/s",
+                      done, len(node_ids), stats["generated"], stats["skipped"], stats["failed"], done / elapsed)
+    finally:
+        pool.close()
+        pool.join()
+    return stats
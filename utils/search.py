@@ -6,11 +6,18 @@
 from __future__ import division
 from __future__ import print_function
 
+import bisect
 import logging
+import multiprocessing
+import os
+import time
+
 from sqlalchemy import func as sqlfunc
+from sqlalchemy import text as sqltext
 
 import core as _core
-from core.database.postgres.file import File
+from core.database.postgres import DB_SCHEMA_NAME
+from core.database.postgres.file import File, NodeToFile
 from contenttypes import Data
 
 logg = logging.getLogger(__name__)
@@ -67,3 +74,167 @@ def import_fulltexts(overwrite=False, mod_n=None, mod_i=None):
             import_count += 1
 
     return import_count
+
+
+# escapes for the text format of COPY
+_COPY_ESCAPES = {ord(u"\\"): u"\\\\", ord(u"\t"): u"\\t", ord(u"\n"): u"\\n", ord(u"\r"): u"\\r", 0: u" "}
+_COPY_READ_SIZE = 1024 * 1024
+
+
+class _FulltextCopyReader(object):
+    """
+    File-like object that feeds fulltext files to COPY in the text format, one row (nid, seq, fulltext, valid) per file.
+    Files are streamed in chunks. As a row cannot be taken back once it is sent,
+    files that cannot be decoded are marked as invalid at the end of their row.
+    """
+
+    def __init__(self, files):
+        self._chunks = self._iter_chunks(files)
+        self._buffer = b""
+
+    def _iter_chunks(self, files):
+        for seq, (nid, fi) in enumerate(files):
+            if not fi.exists:
+                logg.warning("missing fulltext for node %s from %s", nid, fi.path)
+                continue
+            yield u"{}\t{}\t".format(nid, seq).encode("utf8")
+            valid = u"t"
+            try:
+                with fi.open() as f:
+                    for chunk in iter(lambda: f.read(_COPY_READ_SIZE), u""):
+                        yield chunk.translate(_COPY_ESCAPES).encode("utf8")
+            except UnicodeDecodeError:
+                logg.info("decoding error for node %s from %s", nid, fi.path)
+                valid = u"f"
+            yield u"\t{}\n".format(valid).encode("utf8")
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _import_fulltext_range(first_id, last_id, overwrite):
+    """
+    Imports the fulltexts of the nodes with ids from `first_id` to `last_id` in one transaction:
+    the files are copied into a temporary table and node.fulltext is updated with a single statement.
+    The row trigger for stored tsvectors is deferred and the tsvectors of the range are refreshed at once afterwards.
+    Returns the number of updated nodes.
+    """
+    session = _core.db.session
+    nodes = _core.db.query(Data.id).filter(Data.id.between(first_id, last_id))
+    if not overwrite:
+        nodes = nodes.filter_by(fulltext=None)
+    files = (_core.db.query(NodeToFile.nid, File)
+             .join(File, File.id == NodeToFile.file_id)
+             .filter(NodeToFile.nid.in_(nodes.subquery()))
+             .filter(File.filetype == u"fulltext")
+             .order_by(NodeToFile.nid, File.id))
+
+    session.execute("SELECT set_config('mediatum.defer_tsvectors', 'on', true)")
+    session.execute("CREATE TEMPORARY TABLE fulltext_import (nid integer, seq integer, fulltext text, valid boolean) ON COMMIT DROP")
+    cursor = session.connection().connection.cursor()
+    cursor.copy_expert("COPY fulltext_import (nid, seq, fulltext, valid) FROM STDIN", _FulltextCopyReader(files.all()))
+
+    nids = [nid for nid, in session.execute(sqltext("""
+        UPDATE {schema}.node SET fulltext = i.fulltext
+        FROM (SELECT nid, string_agg(fulltext, E'\\n---\\n' ORDER BY seq) AS fulltext
+              FROM fulltext_import
+              WHERE valid
+              GROUP BY nid) i
+        WHERE node.id = i.nid
+        RETURNING node.id""".format(schema=DB_SCHEMA_NAME)))]
+    if nids:
+        session.execute(sqltext("SELECT {}.refresh_node_tsvectors(:nids, '{{fulltext}}')".format(DB_SCHEMA_NAME)), {"nids": nids})
+    session.commit()
+    return len(nids)
+
+
+def _run_import_task(task):
+    """Runs in a pool process"""
+    first_id, last_id, overwrite = task
+    try:
+        return first_id, last_id, _import_fulltext_range(first_id, last_id, overwrite), None
+    except Exception as e:
+        logg.exception("importing fulltexts for nodes %s to %s failed", first_id, last_id)
+        _core.db.session.rollback()
+        return first_id, last_id, 0, unicode(e)
+
+
+def _read_done_ranges(state_file):
+    """Returns the sorted and merged (first id, last id) tuples of the ranges listed in `state_file`"""
+    if state_file is None or not os.path.exists(state_file):
+        return []
+    with open(state_file) as f:
+        ranges = sorted(tuple(int(x) for x in line.split()) for line in f if line.strip())
+    merged = []
+    for first, last in ranges:
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(last, merged[-1][1]))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def _in_ranges(nid, ranges, firsts):
+    pos = bisect.bisect_right(firsts, nid) - 1
+    return pos >= 0 and nid <= ranges[pos][1]
+
+
+def import_fulltexts_parallel(overwrite=False, processes=None, batchsize=500, state_file=None):
+    """
+    Imports the fulltexts of all data nodes with a pool of `processes` workers (default: number of CPUs).
+    Each worker imports an id range of `batchsize` nodes per transaction, see `_import_fulltext_range`.
+    Finished ranges are appended to `state_file` if given,
+    a later run with the same state file skips them, so an interrupted import can be resumed.
+    Without `overwrite`, nodes that already have a fulltext are skipped anyway.
+    Returns the number of imported nodes and the list of failed ranges.
+    """
+    nodes = _core.db.query(Data.id).filter(Data.files.any(File.filetype == "fulltext")).order_by(Data.id)
+    if not overwrite:
+        nodes = nodes.filter_by(fulltext=None)
+
+    done_ranges = _read_done_ranges(state_file)
+    done_firsts = [first for first, _ in done_ranges]
+    node_ids = [nid for nid, in nodes if not _in_ranges(nid, done_ranges, done_firsts)]
+    tasks = [(batch[0], batch[-1], overwrite) for batch in
+             (node_ids[start:start + batchsize] for start in range(0, len(node_ids), batchsize))]
+    logg.info("importing fulltexts for %s nodes in %s batches, %s batches done before",
+              len(node_ids), len(tasks), len(done_ranges))
+
+    # pool processes must open their own database connections
+    _core.db.session.close()
+    _core.db.engine.dispose()
+
+    import_count = 0
+    done_count = 0
+    failed = []
+    start_time = time.time()
+    state = open(state_file, "a") if state_file is not None else None
+    pool = multiprocessing.Pool(processes)
+    try:
+        for first_id, last_id, count, error in pool.imap_unordered(_run_import_task, tasks):
+            if error is not None:
+                failed.append((first_id, last_id))
+                continue
+            import_count += count
+            done_count += 1
+            if state is not None:
+                state.write("{} {}\n".format(first_id, last_id))
+                state.flush()
+            elapsed = time.time() - start_time
+            logg.info("%s/%s batches done (%s failed), %s fulltexts imported, %.1f batches/min",
+                      done_count, len(tasks), len(failed), import_count, done_count * 60 / elapsed)
+    finally:
+        pool.close()
+        pool.join()
+        if state is not None:
+            state.close()
+
+    return import_count, failed
@@ -596,6 +596,32 @@ function addNewContainer(parent_node, type){ /* add new container */
 }
 
 
+function waitForPurge(id){ // poll until the background purge of the trash is finished or failed
+    $.getJSON('/edit/edit_action?action=purgestatus', function (status) {
+        var node = $('#hometree').fancytree('getTree').getNodeByKey(id);
+        var finished = status.nodes == 0 && status.state != 'queued' && status.state != 'running';
+        if (finished || status.state == 'failed') {
+            if (node) {
+                node.setTitle(node.data.title_before_purge || node.title);
+                delete node.data.title_before_purge;
+            }
+            if (status.state == 'failed') {
+                alert('clearing the trash failed, ' + status.nodes + ' objects are left:\n' + (status.error || 'unknown error'));
+            }
+            loadEditArea(id);
+            return;
+        }
+        if (node) {
+            node.data.title_before_purge = node.data.title_before_purge || node.title;
+            // queued_files counts the files of all purges waiting to be deleted from disk
+            node.setTitle(node.data.title_before_purge + ' (' + status.nodes + ' objects, ' +
+                          status.queued_files + ' files queued)');
+        }
+        setTimeout(function () { waitForPurge(id); }, 2000);
+    });
+}
+
+
 function questionOperation(type){
 
     consoledb.group('edit: edit.html: questionOperation('+type+')');
@@ -645,6 +671,7 @@ function questionOperation(type){
                 activenode.toggleExpanded();
             }
             loadEditArea(key_to_clear);
+            waitForPurge(key_to_clear);
             consoledb.groupEnd('edit: edit.html: questionOperation('+type+')');
 
             return false;
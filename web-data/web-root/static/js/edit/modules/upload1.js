@@ -95,9 +95,50 @@ function closeFormPluploadWidgetFile(id) { // close upload form
     return reloadPage(id);
 }
 
+function waitForJobs(id, jobs, done, failed, retries){ // poll until the postprocessing jobs of new nodes are finished
+    failed = failed || [];
+    retries = retries || 0;
+    var finish = function () {
+        if (failed.length > 0) {
+            alert('postprocessing failed:\n' + failed.join('\n'));
+        }
+        done();
+    };
+    if (jobs.length == 0) {
+        finish();
+        return;
+    }
+    $.getJSON(`/edit/edit_content?action=jobstatus&id=${id}&jobs=${jobs.join(',')}`, function (states) {
+        var pending = jobs.filter(function (job) {
+            return states[job] && (states[job].state == 'queued' || states[job].state == 'running');
+        });
+        jobs.forEach(function (job) {
+            if (states[job] && states[job].state == 'failed') {
+                failed.push('job ' + job + ': ' + (states[job].error || 'unknown error'));
+            }
+        });
+        $('#divStatus').html('postprocessing / ' + pending.length + (failed.length > 0 ? ' / failed ' + failed.length : ''));
+        if (pending.length == 0) {
+            finish();
+        } else {
+            setTimeout(function () { waitForJobs(id, pending, done, failed); }, 2000);
+        }
+    }).fail(function () {
+        // retry a few times, then give up waiting, the jobs keep running in the worker
+        if (retries < 5) {
+            setTimeout(function () { waitForJobs(id, jobs, done, failed, retries + 1); }, 2000);
+        } else {
+            failed.push('could not get the state of ' + jobs.length + ' postprocessing jobs');
+            finish();
+        }
+    });
+}
+
 function createObjectsPluploadFile(id){ // build object out of files
     console.group('edit.modules: upload.html createObjectsPluploadFile');
 
+    var jobs = [];
+
     $('#uploader_start').attr('aria-disabled','true');  // not functional ?
 
     number_files = all_files = $('#uploaderfile_filelist').children().length;
@@ -128,6 +169,7 @@ function createObjectsPluploadFile(id){ // build object out of files
             success: function (data) {
                 ajax_response = data;
                 console.log('createObjects');
+                jobs = jobs.concat(data.jobs);
                 curr_file = $('#uploaderfile_filelist').children().slice(all_files-number_files).first()
                 var err = 0;
                 if (data.errornodes.length>0){
@@ -172,12 +214,14 @@ function createObjectsPluploadFile(id){ // build object out of files
 
     }) // $.each
     if (err_files == 0) {
-        console.log('going to call closeFormFile()');
-        closeFormPluploadWidgetFile();
-        console.log('after called: closeFormFile()');
-        console.log('going to call loadEditArea(id), id:'+id);
-        parent.loadEditArea(id);
-        console.log('after called loadEditArea(id), id:'+id);
+        waitForJobs(id, jobs, function () {
+            console.log('going to call closeFormFile()');
+            closeFormPluploadWidgetFile();
+            console.log('after called: closeFormFile()');
+            console.log('going to call loadEditArea(id), id:'+id);
+            parent.loadEditArea(id);
+            console.log('after called loadEditArea(id), id:'+id);
+        });
     } else {
         // $('#error_dummy')[0].textContent='';
         // throw "some files cannot be created";
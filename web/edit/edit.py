@@ -9,7 +9,6 @@ import httplib as _httplib
 import itertools as _itertools
 import json
 import operator as _operator
-import os
 import time
 
 import mediatumtal.tal as _tal
@@ -17,7 +16,9 @@ import mediatumtal.tal as _tal
 import core as _core
 import core.csrfform as _core_csrfform
 import core.nodecache as _core_nodecache
+import core.purge as _core_purge
 import core.translation as _core_translation
+import core.tree as _core_tree
 import web.edit.edit_common as _web_edit_edit_common
 import core.systemtypes as _core_systemtypes
 import utils.utils as _utils_utils
@@ -531,8 +532,13 @@ def action(req):
         req.response.mimetype = "application/json"
         req.response.set_data(json.dumps(dict(changednodes=changednodes), indent=4, ensure_ascii=False))
         return
+    elif action == "purgestatus":
+        req.response.status_code = _httplib.OK
+        req.response.mimetype = "application/json"
+        req.response.set_data(json.dumps(_core_purge.get_purge_progress(trashdir)))
+        return
     else:
-        # all 'action's except 'getlabels' require a base dir (src)
+        # all 'action's except 'getlabels' and 'purgestatus' require a base dir (src)
         # but expanding of a subdir in the edit-tree via fancytree has
         # not a srcnodeid, so no action is necessary
         srcnodeid = req.values.get("srcnodeid")
@@ -637,26 +643,19 @@ def action(req):
 
     # try:
     if action == "clear_trash":
-        for n in trashdir.children:
-            # if trashdir is it's sole parent, remove file from disk
-            # attn: this will not touch files from children of deleted
-            # containers
-            if len(n.parents) == 1:
-                logg.info("%s going to remove files from disk for node %s (%s, %s)", user.login_name, n.id, n.name, n.type)
-                for f in n.files:
-                    # dangerous ??? check this
-                    f_path = f.abspath
-                    if os.path.exists(f_path):
-                        logg.info("%s going to remove file %r from disk", user.login_name, f_path)
-                        os.remove(f_path)
-            trashdir.children.remove(n)
-            _core.db.session.commit()
-            dest = trashdir
+        # the children are only marked here, the nodes and their files are purged in the background, see core.purge
+        _core_purge.purge_trash(trashdir)
+        _core.db.session.commit()
+        dest = trashdir
         changednodes[trashdir.id] = trashdir
         _parent_descr = [(p.name, p.id, p.type) for p in trashdir_parents]
         logg.info("%s cleared trash folder with id %s, child of %s", user.login_name, trashdir.id, _parent_descr)
         # return
     else:
+        # mapping changes are collected and applied at once after the loop, see core.tree
+        removed = []
+        added = []
+        denied = False
         for id in idlist:
             obj = _core.db.query(Node).get(id)
             mysrc = srcnode
@@ -665,6 +664,7 @@ def action(req):
                 mysrc = obj.parents[0]
 
             if action == "delete":
+                obj_removed = []
                 if obj.has_write_access():
                     parentids = _itertools.chain.from_iterable(
                         _core.db.query(_core_database_postgres_node.t_nodemapping.c.nid).filter(
@@ -674,7 +674,7 @@ def action(req):
                         srcnode = _core.db.query(Node).get(nid)
                         if srcnode is trashdir or not srcnode.has_write_access():
                             continue
-                        srcnode.children.remove(obj)
+                        obj_removed.append((nid, obj.id))
                         changednodes[nid] = srcnode
                         logg.info(
                             "%s moved to trash bin %s (%s, %s) from %s (%s, %s)",
@@ -686,10 +686,9 @@ def action(req):
                             srcnode.name,
                             srcnode.type,
                         )
-                if changednodes:
-                    trashdir.children.append(obj)
+                if obj_removed:
+                    removed.extend(obj_removed)
                     changednodes[trashdir.id] = trashdir
-                    _core.db.session.commit()
                 else:
                     logg.info("%s has no write access", user.login_name)
                     req.response.set_data(
@@ -710,11 +709,10 @@ def action(req):
                             isinstance(dest, Container):
                     if not dest.is_descendant_of(obj):
                         if action == "move":
-                            mysrc.children.remove(obj)
+                            removed.append((mysrc.id, obj.id))
                             changednodes[mysrc.id] = mysrc  # getLabel(mysrc)
-                        dest.children.append(obj)
+                        added.append((dest.id, obj.id))
                         changednodes[dest.id] = dest  # getLabel(dest)
-                        _core.db.session.commit()
 
                         logg.info(
                             "%s %s %r (%s, %s) from %s (%s, %s) to %s (%s, %s)",
@@ -733,7 +731,16 @@ def action(req):
                     else:
                         logg.error("%s could not %s %s from %s to %s", user.login_name, action, obj.id, mysrc.id, dest.id)
                 else:
-                    return
+                    denied = True
+                    break
+
+        if action == "delete":
+            _core_tree.bulk_delete(removed, trashdir.id)
+        else:
+            _core_tree.change_mappings(removed=removed, added=added)
+        _core.db.session.commit()
+        if denied:
+            return
 
     if action in ["move", "copy", "delete", "clear_trash"]:
         for nid in changednodes:
@@ -26,6 +26,7 @@ import mediatumtal.tal as _tal
 
 import core as _core
 import core.csrfform as _core_csrfform
+import core.jobqueue as _core_jobqueue
 import core.translation as _core_translation
 import schema as _schema
 import schema.citeproc as _
@@ -96,10 +97,17 @@ def getContent(req, ids):
             req.response.set_data(json.dumps({'state': state}, ensure_ascii=False))
             return None
 
+        if req.values['action'] == "jobstatus":  # poll postprocessing of created nodes
+            job_ids = [int(i) for i in req.values.get("jobs", "").split(",") if i.isdigit()]
+            req.response.mimetype = "application/json"
+            req.response.set_data(json.dumps(_core_jobqueue.get_job_states(job_ids, parent=basenode)))
+            return None
+
         if req.values['action'] == "buildnode":  # create nodes
             newnodes = []
             errornodes = []
             basenodefiles_processed = []
+            jobs = []
 
             for filename in req.values['files'].split('|'):
                 mimetype = _utils_utils.getMimeType(filename)
@@ -148,7 +156,10 @@ def getContent(req, ids):
                     cloned_file.filetype = content_class.get_upload_filetype()
                     node.files.append(cloned_file)
                     try:
-                        node.event_files_changed()
+                        job = _core_jobqueue.run_or_enqueue("files_changed", node)
+                        if job is not None:
+                            _core.db.session.flush()
+                            jobs.append(job.id)
                     except Exception as e:
                         msgerr = unicode(e)
                         with _utils_utils.suppress(_core_translation.MessageIdNotFound, warn=False):
@@ -193,6 +204,7 @@ def getContent(req, ids):
                         state=state,
                         newnodes=newnodes,
                         errornodes=errornodes,
+                        jobs=jobs,
                         new_tree_labels=(dict(
                             id=basenode.id,
                             label=_web_edit_edit_common.get_edit_label(basenode, lang=language),
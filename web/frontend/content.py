@@ -18,6 +18,8 @@ import contenttypes.data as _
 import core as _core
 import core.database.postgres.node as _
 import core.nodecache as _
+import core.search.resultcache as _core_search_resultcache
+import core.search.resultcount as _core_search_resultcount
 import core.translation as _core_translation
 from core import config
 from core import styles
@@ -224,9 +226,12 @@ DEFAULT_FULL_STYLE_NAME = "full_standard"
 
 class ContentList(ContentBase):
 
-    def __init__(self, node_query, container, paths, words=None):
+    def __init__(self, node_query, container, paths, words=None, result_cache_key=None):
 
         self.node_query = node_query
+        # ordered result ids from core.search.resultcache, None if the result is not cached
+        self.result_cache_key = result_cache_key
+        self.result_ids = None
         self.nodes = None
         self.container = container
         self.paths = paths
@@ -237,6 +242,8 @@ class ContentList(ContentBase):
         self.after = None
         self.lang = None
         self._num = -1
+        # number of nodes in the list, see core.search.resultcount
+        self.count = None
         self.content = None
         self.liststyle_name = None
         self.collection = (container.get_self_or_first_ancestor(_contenttypes.container.Collection)
@@ -256,21 +263,33 @@ class ContentList(ContentBase):
     def logo(self):
         return CollectionLogo(self.collection)
 
+    def _count_principal(self):
+        # the access principal of the current request
+        return _core_search_resultcache.make_principal()
+
     @property
     def has_elements(self):
         if self._num > 0:
             return True
         if self.nodes is not None:
             return len(self.nodes) > 0
+        if self.result_ids is not None:
+            return len(self.result_ids) > 0
+        count = self.count
+        if count is None:
+            count = _core_search_resultcount.get_cached_count(self.node_query, self._count_principal())
+        if count is not None:
+            return count > 0
         return self.node_query.first() is not None
 
     @property
     def num(self):
         if self._num == -1:
-            if self.nodes is not None:
-                self._num = self.nodes.count()
+            if self.result_ids is not None:
+                self.count = len(self.result_ids)
             else:
-                self._num = self.node_query.count()
+                self.count = _core_search_resultcount.count_results(self.node_query, self._count_principal())
+            self._num = self.count
         return self._num
 
     def length(self):
@@ -359,13 +378,17 @@ class ContentList(ContentBase):
                 default_sortfield = self.collection.get(u"sortfield")
             self.sortfields[0] = default_sortfield if default_sortfield else u"-node.id"
 
+        if self.result_cache_key is not None:
+            key = _core_search_resultcache.make_key(*self.result_cache_key, sortfields=self.sortfields.items(), req=req)
+            self.result_ids = _core_search_resultcache.get_result_ids(key, self._result_id_query())
+
         liststyle = req.args.get("liststyle")
         if not liststyle:
             liststyle = self.collection.get("style", "list")
         self.liststyle = get_list_style(liststyle)
 
         self.nodes_per_page_from_req = _web_common_pagination.get_nodes_per_page(req.args.get("nodes_per_page"), None, False)
-        self.nodes_per_page = self.node_query.count() if self.nodes_per_page_from_req == "all" else self.nodes_per_page_from_req
+        self.nodes_per_page = self.num if self.nodes_per_page_from_req == "all" else self.nodes_per_page_from_req
 
         self.nav_params = {k: v for k, v in req.args.items()
                            if k not in ("before", "after", "style", "sortfield", "page", "nodes_per_page")}
@@ -414,6 +437,30 @@ class ContentList(ContentBase):
             return styles.list_styles.values()
 
 
+    def _result_id_query(self):
+        sortfields_to_comp = prepare_sortfields(None, self.sortfields)
+        nodeclass = self.node_query._find_nodeclass()
+        q_ids = apply_order_by_for_sortfields(self.node_query.with_entities(nodeclass.id), sortfields_to_comp)
+        # distinct adds the sort expressions to the selected columns, the id stays first
+        return q_ids.distinct()
+
+    def _cached_neighbour_id(self, nav):
+        """Returns the id of the node to show for `nav` from the cached result ids, None if not available"""
+        ids = self.result_ids
+        if not ids:
+            return None
+        if nav == "first":
+            return ids[0]
+        if nav == "last":
+            return ids[-1]
+        try:
+            pos = ids.index(int(self.show_id))
+        except ValueError:
+            return None
+        pos += 1 if nav == "next" else -1
+        if 0 <= pos < len(ids):
+            return ids[pos]
+
     def _single_result(self):
         # 5 cases (show_id, nav):
         # (None, "first") => show first node in result
@@ -433,7 +480,14 @@ class ContentList(ContentBase):
 
         nav = self.result_nav
 
-        if nav:
+        if nav and self.result_ids is not None and nav in ("first", "last", "next", "prev"):
+            new_id = self._cached_neighbour_id(nav)
+            new_node = _get_accessible_node(new_id) if new_id is not None else None
+            if new_node:
+                show_node = new_node
+                self.show_id = show_node.id
+
+        elif nav:
             if nav in ("next", "prev"):
                 # we want to display the node _after_ or _before_ `show_node`
                 sortfields_to_comp = prepare_sortfields(show_node, self.sortfields)
@@ -461,6 +515,27 @@ class ContentList(ContentBase):
 
         return ContentNode(show_node, self.paths, 0, 0, self.words)
 
+    def _cached_page_nodes(self, nodes_per_page):
+        """
+        Returns the nodes of the page from the cached result ids, in the order of `_page_nav_prev_next`.
+        Returns None if the page cannot be determined from the ids.
+        """
+        ids = self.result_ids
+        if self.after or self.before:
+            try:
+                pos = ids.index(self.after or self.before)
+            except ValueError:
+                return None
+            if self.before:
+                page_ids = ids[max(pos - nodes_per_page - 1, 0):pos][::-1]
+            else:
+                page_ids = ids[pos + 1:pos + nodes_per_page + 2]
+        else:
+            page_ids = ids[:nodes_per_page + 1]
+
+        nodes = {n.id: n for n in _core.db.query(Node).filter(Node.id.in_(page_ids)).prefetch_attrs()}
+        return [nodes[nid] for nid in page_ids if nid in nodes]
+
     def _page_nav_prev_next(self):
         q_nodes = self.node_query
         nodes_per_page = self.nodes_per_page
@@ -468,18 +543,24 @@ class ContentList(ContentBase):
         # self.before set <=> moving to previous page
         # nothing set <=> first page
 
-        if self.after or self.before:
-            assert not (self.after and self.before)
-            comp_node = _core.db.query(Node).get(self.after or self.before)
-            sortfields_to_comp = prepare_sortfields(comp_node, self.sortfields)
-            position_cond = _position_filter(sortfields_to_comp, self.before)
-            q_nodes = q_nodes.filter(position_cond)
-        else:
-            # first page
-            sortfields_to_comp = prepare_sortfields(None, self.sortfields)
+        nodes = None
+        if self.result_ids is not None:
+            nodes = self._cached_page_nodes(nodes_per_page)
+
+        if nodes is None:
+            if self.after or self.before:
+                assert not (self.after and self.before)
+                comp_node = _core.db.query(Node).get(self.after or self.before)
+                sortfields_to_comp = prepare_sortfields(comp_node, self.sortfields)
+                position_cond = _position_filter(sortfields_to_comp, self.before)
+                q_nodes = q_nodes.filter(position_cond)
+            else:
+                # first page
+                sortfields_to_comp = prepare_sortfields(None, self.sortfields)
 
-        q_nodes = apply_order_by_for_sortfields(q_nodes, sortfields_to_comp, self.before)
-        
+            q_nodes = apply_order_by_for_sortfields(q_nodes, sortfields_to_comp, self.before)
+            # we fetch one more to see if more nodes are available (on the next page)
+            nodes = q_nodes.distinct().limit(nodes_per_page+1).prefetch_attrs().all()
 
         ctx = {
             "nav": self,
@@ -487,8 +568,6 @@ class ContentList(ContentBase):
             "after": None
         }
 
-        # we fetch one more to see if more nodes are available (on the next page)
-        nodes = q_nodes.distinct().limit(nodes_per_page+1).prefetch_attrs().all()
         self.nodes = nodes
 
         if len(nodes) > nodes_per_page:
@@ -14,7 +14,7 @@ import urlparse as _urlparse
 
 import flask as _flask
 
-import core as _core
+import core.nodesnapshots as _core_nodesnapshots
 from core.database.postgres.node import Node
 from contenttypes import Content
 from utils.utils import getMimeType, get_filesize
@@ -71,7 +71,7 @@ def get_node_or_version(nid, version_id=None, nodeclass=Node):
     if nid is None:
         return None
 
-    node = _core.db.query(nodeclass).get(nid)
+    node = _core_nodesnapshots.get_node(nid, nodeclass)
 
     version = None
 
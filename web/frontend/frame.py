@@ -30,6 +30,7 @@ from utils.compat import iteritems
 from utils.utils import Link
 from utils.url import build_url_from_path_and_params
 from schema.searchmask import SearchMask
+import metadata.common_list as _common_list
 import core.nodecache as _nodecache
 from core.nodecache import get_collections_node
 from web import frontend as _web_frontend
@@ -100,6 +101,8 @@ class Searchlet(object):
         if not extendedfields and "query" in req.args:
             self.values[0] = req.args["query"]
         else:
+            # the value counts of all list fields are fetched in one query for all search fields
+            list_field_names = set()
             for pos in extendedfields:
                 searchmaskitem_argname = "field" + str(pos)
                 searchmaskitem_id = req.args.get(searchmaskitem_argname, type=int)
@@ -120,6 +123,12 @@ class Searchlet(object):
                 if value:
                     self.values[pos] = value
 
+                if field is not None and field.getFieldtype() in ("list", "ilist"):
+                    list_field_names.add(field.getName())
+
+            if list_field_names:
+                _common_list.prefetch_list_values_for_all_content_children(self.container.id, list_field_names)
+
     def hasExtendedSearch(self):
         return self.searchmask is not None
 
@@ -263,24 +272,16 @@ def _make_navtree_entries(language, container):
         _core.db.query(_node.t_noderelation.c.nid).filter(
             _node.t_noderelation.c.cid == container.id,
             ).union(_sqlalchemy.select([_sqlalchemy.sql.expression.literal(container.id)])).subquery())
-    if config.getboolean("database.use_cached_childcount"):
-        count_content_children_for_all_subcontainers = _sqlalchemy.func.count_content_children_for_all_subcontainers(Node.id)
-    else:
-        content_alias = _orm.aliased(_contenttypes.Content)
-        noderelation_alias = _orm.aliased(_node.t_noderelation)
-        count_content_children_for_all_subcontainers_dir = (
-            _core.db.query(_sqlalchemy.func.count(content_alias.id.distinct())).filter(
-                content_alias.id == noderelation_alias.c.cid,
-                ).filter(noderelation_alias.c.nid == Container.id).filter(content_alias.subnode == False))
-        count_content_children_for_all_subcontainers = _sqlalchemy.case(
-                ((
-                    Container.type.in_(
-                        frozenset(n.__name__.lower() for n in Directory.get_all_subclasses() if n.show_childcount)
-                       ),
-                    count_content_children_for_all_subcontainers_dir.as_scalar(),
-                ),),
-                else_=_sqlalchemy.literal_column("1"),
-            )
+    # content counts are maintained incrementally in container_childcount
+    count_content_children_for_all_subcontainers = _sqlalchemy.case(
+            ((
+                Container.type.in_(
+                    frozenset(n.__name__.lower() for n in Directory.get_all_subclasses() if n.show_childcount)
+                   ),
+                _sqlalchemy.func.count_content_children_for_all_subcontainers(Container.id),
+            ),),
+            else_=_sqlalchemy.literal_column("1"),
+        )
     # the main query lists all container nodes that are
     # the child of any of the "opened" containers (see above);
     # this will permit us to show unfolded containers, i.e.,
@@ -9,9 +9,11 @@ import logging
 
 import core as _core
 import core.database.postgres.search as _
+import core.search.resultcache as _core_search_resultcache
 import core.translation as _core_translation
 import utils.date as date
 from core.search import SearchQueryException
+from core.search.config import get_default_search_languages
 from core import webconfig
 from utils.strings import ensure_unicode_returned
 from contenttypes.container import Container
@@ -76,13 +78,18 @@ def search(searchtype, searchquery, readable_query, paths, req, container_id = N
     def filter_dbquery_results(dbquery):
         return dbquery.filter_read_access()
 
+    languages = get_default_search_languages()
     try:
-        result = _core.database.postgres.search.search(container, searchquery, filter_dbquery=filter_dbquery_results)
+        searchtree = container._parse_searchquery(searchquery)
+        result = _core.database.postgres.search.search(
+            container, searchtree, languages, filter_dbquery=filter_dbquery_results)
     except SearchQueryException as e:
         # query parsing went wrong or the search backend complained about something
         return NoSearchResult(readable_query, container, readable_query, error=True)
 
-    content_list = ContentList(result, container, paths, words=readable_query)
+    # the sort fields are added by the content list
+    result_cache_key = (searchtree, languages, container.id) if _core_search_resultcache.is_active() else None
+    content_list = ContentList(result, container, paths, words=readable_query, result_cache_key=result_cache_key)
     try:
         content_list.feedback(req)
     except Exception as e:
@@ -10,6 +10,7 @@ import functools as _functools
 import json
 import httplib as _httplib
 import gzip as _gzip
+import itertools as _itertools
 import logging
 import re as _re
 import sys as _sys
@@ -20,6 +21,8 @@ import flask as _flask
 from sqlalchemy.orm import undefer, joinedload
 
 import core as _core
+import core.nodesnapshots as _core_nodesnapshots
+import core.request_handler as _core_request_handler
 from core.users import get_guest_user
 from core import config, search
 from core.database.postgres.node import Node
@@ -48,6 +51,8 @@ logg = logging.getLogger(__name__)
 
 SEND_TIMETABLE = False
 DEFAULT_NODEQUERY_LIMIT = config.getint("services.default_limit", 1000)
+# number of nodes fetched from the database at once when streaming a response
+STREAM_CHUNKSIZE = 200
 
 
 def add_mask_xml(xmlroot, node, mask_name, language):
@@ -93,6 +98,16 @@ def _add_timetable_to_xmldoc(xmlroot, timetable):
     xml_allsteps.set("unit", "sec.")
 
 
+def _create_xml_response(d):
+    xmlroot = etree.Element("response")
+    xmlroot.set("status", d["status"])
+    xmlroot.set("retrievaldate", d["retrievaldate"])
+    xmlroot.set("oauthuser", d.get("oauthuser", ""))
+    xmlroot.set("username", d.get("username", ""))
+    xmlroot.set("userid", unicode(d.get("userid", "")))
+    return xmlroot
+
+
 def struct2xml(path, qualifier, query_string, host_url, params, d, send_timetable=SEND_TIMETABLE):
 
     atime = time.time()
@@ -104,12 +119,7 @@ def struct2xml(path, qualifier, query_string, host_url, params, d, send_timetabl
     mask = params.get('mask', 'default').lower()
     # we ignore the maskcache parameter
 
-    xmlroot = etree.Element("response")
-    xmlroot.set("status", d["status"])
-    xmlroot.set("retrievaldate", d["retrievaldate"])
-    xmlroot.set("oauthuser", d.get("oauthuser", ""))
-    xmlroot.set("username", d.get("username", ""))
-    xmlroot.set("userid", unicode(d.get("userid", "")))
+    xmlroot = _create_xml_response(d)
 
     language = params.get('lang', '')
 
@@ -181,6 +191,40 @@ def struct2xml(path, qualifier, query_string, host_url, params, d, send_timetabl
     return xmlstr
 
 
+def iter_struct2xml(path, qualifier, query_string, host_url, params, d):
+    """Streaming variant of struct2xml for node lists, `d['nodelist']` is an iterator over the nodes"""
+    mask = params.get('mask', 'default').lower()
+    language = params.get('lang', '')
+
+    xmlroot = _create_xml_response(d)
+    xmlroot.set("servicereactivity", d["dataready"])
+    xml_nodelist = create_xml_nodelist(xmlroot)
+    xml_nodelist.set("start", unicode(d["nodelist_start"]))
+    xml_nodelist.set("count", unicode(d["nodelist_limit"]))
+    if d["nodelist_count"] is not None:
+        xml_nodelist.set("actual_count", unicode(d["nodelist_count"]))
+    # forces separate start and end tags, the nodes are sent in between
+    xml_nodelist.text = "\n"
+    xml_listinfo = etree.SubElement(xmlroot, "listinfo")
+    xml_listinfo.set("sortfield", d["sortfield"])
+    xml_listinfo.set("sortdirection", d["sortdirection"])
+
+    head, tail = etree.tostring(xmlroot, xml_declaration=True, pretty_print=True, encoding="utf8").split("</nodelist>")
+    yield head
+
+    for n in d['nodelist']:
+        xmlnode = add_node_to_xmldoc(
+                n,
+                create_xml_nodelist(),
+                max_depth=0,
+                attribute_name_filter=attribute_name_filter,
+            )
+        add_mask_xml(xmlnode, n, mask, language)
+        yield etree.tostring(xmlnode, xml_declaration=False, pretty_print=True, encoding="utf8")
+
+    yield "</nodelist>" + tail
+
+
 def struct2template_test(path, qualifier, query_string, host_url, params, d, send_timetable=SEND_TIMETABLE):
     nodelist = d['nodelist']
 
@@ -250,7 +294,26 @@ def struct2json(path, qualifier, query_string, host_url, params, d, send_timetab
     return s
 
 
-def struct2csv(path, qualifier, query_string, host_url, params, d, sep=u';', string_delimiter=u'"'):
+def iter_struct2json(path, qualifier, query_string, host_url, params, d, send_timetable=SEND_TIMETABLE):
+    """Streaming variant of struct2json, `d['nodelist']` is an iterator over the nodes"""
+    head = {k: v for k, v in d.iteritems() if k not in ('nodelist', 'nodequery')}
+    if 'add_shortlist' not in params:
+        head['result_shortlist'] = []
+    if not send_timetable:
+        del head['timetable']
+
+    s = json.dumps(head, indent=4, encoding="UTF-8")
+    # reopen the object to append the nodelist
+    yield s[:-len("\n}")] + ',\n    "nodelist": ['
+
+    for i, n in enumerate(d['nodelist']):
+        descriptor = jsonnode.buildNodeDescriptor(params, n, children="send_children" in params)
+        yield ("," if i else "") + "\n" + json.dumps(descriptor, indent=4, encoding="UTF-8")
+
+    yield "\n    ]\n}"
+
+
+def _get_csv_row_joiner(params, sep=u';', string_delimiter=u'"'):
     # delimiter and separator can be transferred by the query
     # this dictionary decodes the characters that would disturb in the url
     trans = {
@@ -295,6 +358,44 @@ def struct2csv(path, qualifier, query_string, host_url, params, d, sep=u';', str
                 res = res[0:-len(sep)]
         return res
 
+    return join_row
+
+
+def _get_csv_attr_header(params, d, keys):
+    if 'csvattrs' in params:
+        keys = set(attr.strip() for attr in params['csvattrs'].split(','))
+
+    sorted_tuples = sorted([(x.lower(), x) for x in list(keys)])
+    attr_header = [x[1] for x in sorted_tuples]
+
+    # sortfields shall appear early (after id, type and name of the node) of the csv table
+    if 'sfields' in d.keys() and d['sfields']:
+        for sfield in d['sfields']:
+            if sfield in attr_header:
+                attr_header.remove(sfield)
+        sfield_header = []
+        for sfield in d['sfields']:
+            if sfield not in ['node.id', 'node.name', 'node.type']:
+                sfield_header.append(sfield)
+        attr_header = sfield_header + attr_header
+
+    # filter attribute names
+    return filter(attribute_name_filter, attr_header)
+
+
+def _get_csv_row(i, node_id, node_type, node_name, attributes, attr_header):
+    row = [unicode(i), node_id, node_type, node_name]
+    for attr in attr_header:
+        if attr in ['node.orderpos']:
+            row.append(_core.db.query(Node).get(node_id).orderpos)
+        else:
+            row.append(attributes.setdefault(attr, u''))
+    return row
+
+
+def struct2csv(path, qualifier, query_string, host_url, params, d, sep=u';', string_delimiter=u'"'):
+    join_row = _get_csv_row_joiner(params, sep, string_delimiter)
+
     r = u''
 
     if d['status'].lower() == 'fail':
@@ -306,9 +407,6 @@ def struct2csv(path, qualifier, query_string, host_url, params, d, sep=u';', str
     rd = {}
     keys = set()
     csv_nodelist = d['nodelist']
-    csvattrs = []
-    if 'csvattrs' in params:
-        csvattrs = [attr.strip() for attr in params['csvattrs'].split(',')]
 
     for i, n in enumerate(csv_nodelist):
         rd[i] = {}
@@ -320,25 +418,7 @@ def struct2csv(path, qualifier, query_string, host_url, params, d, sep=u';', str
         rd_i['attributes'] = attrs
         keys = keys.union(attrs.keys())
 
-    if csvattrs:
-        keys = set(csvattrs)
-
-    sorted_tuples = sorted([(x.lower(), x) for x in list(keys)])
-    attr_header = [x[1] for x in sorted_tuples]
-
-    # sortfields shall appear early (after id, type and name of the node) of the csv table
-    if 'sfields' in d.keys() and d['sfields']:
-        for sfield in d['sfields']:
-            if sfield in attr_header:
-                attr_header.remove(sfield)
-        sfield_header = []
-        for sfield in d['sfields']:
-            if sfield not in ['node.id', 'node.name', 'node.type']:
-                sfield_header.append(sfield)
-        attr_header = sfield_header + attr_header
-
-    # filter attribute names
-    attr_header = filter(attribute_name_filter, attr_header)
+    attr_header = _get_csv_attr_header(params, d, keys)
 
     header = [u'count', u'id', u'type', u'name'] + attr_header
     r = join_row(header) + u'\r\n'
@@ -347,13 +427,7 @@ def struct2csv(path, qualifier, query_string, host_url, params, d, sep=u';', str
 
     for i, n in enumerate(csv_nodelist):
         rd_i = rd[i]
-        row = [unicode(i), rd_i['id'], rd_i['type'], rd_i['name']]
-        rd_i_attributes = rd_i['attributes']
-        for attr in attr_header:
-            if attr in ['node.orderpos']:
-                row.append(_core.db.query(Node).get(rd_i['id']).orderpos)
-            else:
-                row.append(rd_i_attributes.setdefault(attr, u''))
+        row = _get_csv_row(i, rd_i['id'], rd_i['type'], rd_i['name'], rd_i['attributes'], attr_header)
         r_row = join_row(row) + u'\r\n'
         r_a += array('u', r_row)
     r = r_a.tounicode()
@@ -364,6 +438,27 @@ def struct2csv(path, qualifier, query_string, host_url, params, d, sep=u';', str
         return r.encode("utf8")
 
 
+def iter_struct2csv(path, qualifier, query_string, host_url, params, d):
+    """Streaming variant of struct2csv, `d['nodelist']` is an iterator over the nodes of the query `d['nodequery']`"""
+    join_row = _get_csv_row_joiner(params)
+
+    keys = ()
+    if 'csvattrs' not in params:
+        # collect the attribute names in the database instead of keeping all nodes in memory
+        subquery = d['nodequery'].subquery()
+        attributes = subquery.c.attributes if "attributes" in subquery.c else subquery.c.attrs
+        keys = [k for k, in _core.db.query(sql.func.jsonb_object_keys(attributes)).distinct()]
+
+    attr_header = _get_csv_attr_header(params, d, keys)
+
+    header = join_row([u'count', u'id', u'type', u'name'] + attr_header) + u'\r\n'
+    yield header.encode("utf_8_sig" if 'bom' in params else "utf8")
+
+    for i, n in enumerate(d['nodelist']):
+        row = _get_csv_row(i, unicode(n.id), n.type + "/" + n.schema, n.name, dict(n.attributes), attr_header)
+        yield (join_row(row) + u'\r\n').encode("utf8")
+
+
 def struct2rss(path, qualifier, query_string, host_url, params, struct):
     nodelist = struct['nodelist']
     language = params.get('lang', 'en')
@@ -499,6 +594,14 @@ supported_formats = [
     [['rss'], struct2rss, 'application/rss+xml'],
 ]
 
+# formats that can be sent while the nodes are fetched, see parameter 'stream'.
+# The node count is unknown if the nodes don't fit into the first batch: actual_count is left out, nodelist_count is null.
+streaming_formats = {
+    'xml': (iter_struct2xml, 'text/xml'),
+    'json': (iter_struct2json, 'application/json'),
+    'csv': (iter_struct2csv, 'text/plain'),
+}
+
 
 def _handle_oauth(res, path, params, timetable):
     atime = time.time()
@@ -584,7 +687,12 @@ def get_node_data_struct(
         qualifier,
         fetch_files=False,
         csv=False,
+        stream=False,
     ):
+    """
+    If `stream` is True, the nodelist of children, allchildren and parents
+    is an unexecuted query that fetches the nodes in chunks of STREAM_CHUNKSIZE.
+    """
     res = _prepare_response()
     timetable = res["timetable"]
 
@@ -622,7 +730,7 @@ def get_node_data_struct(
     csv_allchildren = csv and allchildren
 
     # check node existence
-    node = _core.db.query(Node).get(id)
+    node = _core_nodesnapshots.get_node(id)
     if node is None:
         return _client_error_response(404, u"node not found")
 
@@ -735,7 +843,10 @@ def get_node_data_struct(
     else:
         nodequery = nodequery.distinct().options(undefer(Node.attrs))
 
-    if fetch_files:
+    stream = stream and qualifier in ("children", "allchildren", "parents")
+
+    # eager loading of collections cannot be combined with yield_per
+    if fetch_files and not stream:
         nodequery = nodequery.options(joinedload(Node.file_objects))
 
     if qualifier in ("children", "allchildren", "parents"):
@@ -753,11 +864,21 @@ def get_node_data_struct(
         atime = time.time()
 
         try:
-            nodelist = nodequery.all()
+            if stream:
+                # run the query and fetch the first batch here, so database errors (e.g. the search timeout)
+                # are answered with an error response instead of breaking off the streamed response
+                nodes = iter(nodequery.yield_per(STREAM_CHUNKSIZE))
+                first_nodes = list(_itertools.islice(nodes, STREAM_CHUNKSIZE))
+                nodelist = _itertools.chain(first_nodes, nodes)
+                # counting would run the whole query before the first byte is sent,
+                # the count is only known if all nodes are in the first batch
+                node_count = len(first_nodes) if len(first_nodes) < STREAM_CHUNKSIZE else None
+            else:
+                nodelist = nodequery.all()
+                node_count = len(nodelist)
         except Exception as e:
             return _client_error_response(400, "the database failed with the message: {}".format(str(e)))
 
-        node_count = len(nodelist)
         timetable.append(['fetching nodes from db returned {} results'.format(node_count), time.time() - atime])
         atime = time.time()
     else:
@@ -767,7 +888,7 @@ def get_node_data_struct(
         limit = 1
 
     i0 = int(params.get('i0', '0'))
-    i1 = int(params.get('i1', node_count))
+    i1 = int(params.get('i1', node_count or 0))
 
     def attr_list(node, sfields):
         r = []
@@ -775,7 +896,8 @@ def get_node_data_struct(
             r.append([sfield, node.get(sfield)])
         return r
 
-    if 'add_shortlist' in params:
+    # the shortlist would need all nodes in memory
+    if 'add_shortlist' in params and not stream:
         if sortfield:
             result_shortlist = [[i, x.id, x.name, x.type, attr_list(x, sfields)] for i, x in enumerate(nodelist)][i0:i1]
             timetable.append(['build result_shortlist for %d nodes and %d sortfields' %
@@ -810,6 +932,9 @@ def get_node_data_struct(
     res['nodelist_start'] = offset
     res['nodelist_limit'] = limit
     res['nodelist_count'] = node_count
+    if stream:
+        # needed besides the node iterator by iter_struct2csv
+        res['nodequery'] = nodequery
     res['path'] = path
     res['status'] = 'ok'
     res['html_response_code'] = '200'  # ok
@@ -819,6 +944,52 @@ def get_node_data_struct(
     return res
 
 
+def _get_content_type(params, res_format, default_content_type):
+    if res_format == 'json' and 'jsoncallback' in params:
+        # the return value of this kind of call must be interpreted as javascript,
+        # so we must set the mimetype or browsers will complain
+        content_type = "application/javascript"
+    else:
+        # XXX: clients can override the content_type by setting the mimetype param
+        # XXX: this is ugly, but we keep it for compatibility
+        content_type = params.get('mimetype', default_content_type)
+
+    # append correct charset if client didn't force another value
+    # it doesn't make sense to set it in the client to a different charset than utf8, but it was possible in the past...
+    if "charset=" not in content_type:
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+def _iter_compressed(chunks, wbits):
+    compressor = _gzip.zlib.compressobj(9, _gzip.zlib.DEFLATED, wbits)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _write_streamed_response(path, query_string, host_url, params, qualifier, res_format, d):
+    iter_format, default_content_type = streaming_formats[res_format]
+    chunks = iter_format(path, qualifier, query_string, host_url, params, d)
+    if res_format == 'json' and 'jsoncallback' in params:
+        chunks = _itertools.chain(("{}(".format(params['jsoncallback']),), chunks, (")",))
+    content_type = _get_content_type(params, res_format, default_content_type)
+
+    chunks = (modify_tex(chunk.decode("utf8"), 'strip').encode("utf8") for chunk in chunks)
+
+    # zlib format for deflate, gzip header and trailer for gzip
+    if 'deflate' in params:
+        chunks = _iter_compressed(chunks, _gzip.zlib.MAX_WBITS)
+    elif 'gzip' in params:
+        chunks = _iter_compressed(chunks, 16 + _gzip.zlib.MAX_WBITS)
+
+    d['timetable'].append(["streaming '{}', content type='{}'".format(res_format, content_type), 0.0])
+
+    return d['html_response_code'], chunks, d, content_type
+
+
 def _write_formatted_response(path, query_string, host_url, params, id, qualifier):
     atime = time.time()
 
@@ -829,6 +1000,7 @@ def _write_formatted_response(path, query_string, host_url, params, id, qualifie
         del _p['_']
 
     res_format = params.get('format', 'xml').lower()
+    stream = 'stream' in params and res_format in streaming_formats
 
     d = get_node_data_struct(
             path,
@@ -837,11 +1009,15 @@ def _write_formatted_response(path, query_string, host_url, params, id, qualifie
             qualifier,
             # XXX: hack because we want all files for the XML format only
             fetch_files=res_format=="xml",
-            csv=res_format==u'csv'
+            csv=res_format==u'csv',
+            stream=stream,
         )
 
     d.setdefault('timetable', [])
 
+    if stream and d['status'] == 'ok' and qualifier in ("children", "allchildren", "parents"):
+        return _write_streamed_response(path, query_string, host_url, params, qualifier, res_format, d)
+
     for supported_format in supported_formats:
         if res_format not in supported_format[0]:
             continue
@@ -849,18 +1025,7 @@ def _write_formatted_response(path, query_string, host_url, params, id, qualifie
         s = supported_format[1](path, qualifier, query_string, host_url, params, d)
         if res_format == 'json' and 'jsoncallback' in params:
             s = "{}({})".format(params['jsoncallback'], s)
-            # the return value of this kind of call must be interpreted as javascript,
-            # so we must set the mimetype or browsers will complain
-            content_type = "application/javascript"
-        else:
-            # XXX: clients can override the content_type by setting the mimetype param
-            # XXX: this is ugly, but we keep it for compatibility
-            content_type = params.get('mimetype', supported_format[2])
-
-        # append correct charset if client didn't force another value
-        # it doesn't make sense to set it in the client to a different charset than utf8, but it was possible in the past...
-        if "charset=" not in content_type:
-            content_type += "; charset=utf-8"
+        content_type = _get_content_type(params, res_format, supported_format[2])
 
         d['timetable'].append(["formatted for '{}'".format(res_format), time.time() - atime])
         atime = time.time()
@@ -962,9 +1127,13 @@ def request_handler(req):
         req.response.content_encoding = "deflate"
     elif 'gzip' in req.values:
         req.response.content_encoding = "gzip"
-    req.response.set_data(s)
+    streamed = not isinstance(s, str)
+    if streamed:
+        _core_request_handler.send_stream(req, s)
+    else:
+        req.response.set_data(s)
+        req.response.content_length = len(s)
     req.response.content_type = content_type
-    req.response.content_length = len(s)
     if config.getboolean("services.allow_cross_origin", False):
         req.response.headers['Access-Control-Allow-Origin'] = '*'
 
@@ -980,7 +1149,7 @@ def request_handler(req):
     except:
         pass
 
-    bytes_sent = len(s)
+    bytes_sent = "streamed" if streamed else len(s)
     s = "services {} '{}' ({}): {} for {} bytes. ({}, {}, {}) - (user-agent: {})".format(
             req.remote_addr,
             ustr(response_code),
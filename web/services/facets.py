@@ -0,0 +1,94 @@
+# Copyright (C) since 2007, Technical University of Munich (TUM) and mediaTUM authors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+JSON service for the value counts (facets) of list attributes below a container:
+
+    /services/facets/node/<id>?attrs=<attr>[,<attr>...][&q=<search query>]
+
+All attributes are counted in one pass over the content nodes of the subtree,
+restricted to the nodes readable for the session user and to the result of the optional search query
+(old style search language, like the export service).
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import json
+import logging
+import re as _re
+
+import core as _core
+import core.config as _core_config
+import core.search as _core_search
+import core.search.facets as _core_search_facets
+import core.database.postgres.search as _postgres_search
+from core.database.postgres.node import Node
+from core.nodecache import get_collections_node, get_home_root_node
+from core.search.config import get_service_search_languages
+from core.users import user_from_session
+
+logg = logging.getLogger(__name__)
+
+
+def _write_json(req, status_code, data):
+    s = json.dumps(data, indent=4, encoding="UTF-8")
+    req.response.set_data(s)
+    req.response.content_length = len(s)
+    req.response.content_type = "application/json; charset=utf-8"
+    req.response.status_code = status_code
+    if _core_config.getboolean("services.allow_cross_origin", False):
+        req.response.headers['Access-Control-Allow-Origin'] = '*'
+    return status_code
+
+
+def _error(req, status_code, error_msg):
+    return _write_json(req, status_code, dict(status="fail", errormessage=error_msg))
+
+
+def request_handler(req):
+    matched = _re.match("/node/(?P<id>\d+)/?$", req.mediatum_contextfree_path)
+    if not matched:
+        return _error(req, 400, u"invalid path")
+
+    attribute_names = [a.strip() for a in req.values.get("attrs", u"").split(",") if a.strip()]
+    if not attribute_names:
+        return _error(req, 400, u"parameter attrs missing")
+    max_attributes = _core_config.getint("services.facets_max_attributes", 20)
+    if len(attribute_names) > max_attributes:
+        return _error(req, 400, u"too many attributes, at most {} are allowed".format(max_attributes))
+
+    user = user_from_session()
+    node = _core.db.query(Node).get(int(matched.group("id")))
+    if node is None:
+        return _error(req, 404, u"node not found")
+    if not (node.has_read_access(user=user)
+            and (node.is_descendant_of(get_collections_node()) or node.is_descendant_of(get_home_root_node()))):
+        return _error(req, 403, u"forbidden")
+
+    searchtree = None
+    languages = ()
+    searchquery = req.values.get("q", u"")
+    if searchquery:
+        try:
+            searchtree = _core_search.parse_searchquery_old_style(searchquery)
+        except _core_search.SearchQueryException as e:
+            return _error(req, 400, unicode(e))
+        languages = get_service_search_languages()
+        _postgres_search.set_session_timeout(_core_config.getint('search.timeout_services', 600))
+
+    counts = _core_search_facets.get_value_counts(
+            node.id,
+            attribute_names,
+            searchtree=searchtree,
+            languages=languages,
+            check_access=True,
+            user=user,
+            req=req,
+           )
+
+    return _write_json(req, 200, dict(
+            status="ok",
+            id=node.id,
+            facets={name: [dict(value=value, count=count) for value, count in counts[name]] for name in attribute_names},
+           ))
@@ -5,7 +5,6 @@ from __future__ import division
 from __future__ import print_function
 
 import logging
-import flask as _flask
 
 import contenttypes as _contenttypes
 import contenttypes.data as _
@@ -78,12 +77,7 @@ def buildNodeDescriptor(params, node, indent=None, written=None, children=True,
         pass
     elif attrspec == 'default_mask' or attrspec not in ['none', 'all']:
         language = params.get('lang', '')
-        lookup_key = _contenttypes.data.make_lookup_key(node, language=language, labels=False)
-        if lookup_key not in _flask.g.mediatum.get('maskcache', {}):
-            # fill cache
-            node.show_node_text(labels=False, language=language)
-
-        mask_id, field_descriptors = _contenttypes.data.get_maskcache_entry(lookup_key)
+        mask, field_descriptors = _contenttypes.data.get_mask_field_descriptors(node, language=language, labels=False)
 
         try:
             for field_descriptor in field_descriptors: